@@ -0,0 +1,390 @@
+import os
+import re
+import time
+import threading
+
+import numpy as np
+import pyautogui
+import mss
+
+from box_refiner import to_grayscale
+from response_parser import SENTENCE_PATTERN
+
+# Action kinds
+CLICK = "click"
+DOUBLE_CLICK = "double_click"
+RIGHT_CLICK = "right_click"
+TYPE = "type"
+HOTKEY = "hotkey"
+SCROLL = "scroll"
+DRAG = "drag"
+
+# Pointer motion: seconds per move (instant jumps straight to the target)
+MOTION_PROFILES = {
+    "instant": 0.0,
+    "fast": 0.12,
+    "smooth": 0.5,  # The old fixed half second, easy to follow by eye
+}
+DEFAULT_MOTION = os.getenv("ACTION_MOTION", "fast")
+TYPE_INTERVAL = 0.01  # Seconds between typed characters
+SCROLL_CLICKS = 5  # Wheel clicks per scroll step
+
+# Verification by frame difference
+DIFF_STEP = 4  # Only every DIFF_STEP-th pixel in each direction is compared
+DIFF_LEVEL = 12  # Gray levels a pixel must change by to count
+CHANGE_FRACTION = 0.0002  # Fraction of compared pixels that must change
+SETTLE_POLL = 0.03  # Seconds between frames while waiting for the screen to settle
+SETTLE_TIMEOUT = 1.5  # Longest wait for the screen to stop changing
+NO_CHANGE_TIMEOUT = 0.6  # An action with no visible effect by then is unverified
+
+# Instructions in model responses
+POINTER_VERB_PATTERN = re.compile(r"\b(double[- ]?click|right[- ]?click|click|tap|press|select|choose|open|drag)\b",
+                                  re.IGNORECASE)
+TYPE_PATTERN = re.compile(r"\b(?:type|enter|write)\s+(?:in\s+)?[\"'“‘]([^\"'”’]+)[\"'”’]", re.IGNORECASE)
+KEY_NAME = r"(?:cmd|command|ctrl|control|alt|option|shift|win|super|enter|return|tab|esc|escape|space|delete|backspace|up|down|left|right|f\d{1,2}|[a-z0-9])"
+HOTKEY_PATTERN = re.compile(rf"\bpress\s+(?:the\s+)?({KEY_NAME}(?:\s*[+-]\s*{KEY_NAME})*)(?:\s+key)?\b(?!\s*(?:icon|button|\[))",
+                            re.IGNORECASE)
+SCROLL_PATTERN = re.compile(r"\bscroll\s+(up|down)\b", re.IGNORECASE)
+KEY_ALIASES = {"cmd": "command", "control": "ctrl", "return": "enter", "escape": "esc", "super": "win"}
+
+class Action:
+    """One step of an action plan, in screen coordinates"""
+    __slots__ = ('kind', 'x', 'y', 'end_x', 'end_y', 'text', 'keys', 'amount', 'description')
+
+    def __init__(self, kind, x=None, y=None, end_x=None, end_y=None, text=None, keys=None, amount=None,
+                 description=None):
+        self.kind = kind
+        self.x = x
+        self.y = y
+        self.end_x = end_x  # Drag target
+        self.end_y = end_y
+        self.text = text  # Text to type
+        self.keys = keys  # Hotkey, e.g. ["command", "space"]
+        self.amount = amount  # Scroll wheel clicks, positive is up
+        self.description = description
+
+    def __repr__(self):
+        details = {name: getattr(self, name) for name in self.__slots__[1:-1] if getattr(self, name) is not None}
+        return f"Action({self.kind!r}, {details})"
+
+class StepResult:
+    """How one action went: ok (performed), changed (verified by a frame difference) and its time"""
+    __slots__ = ('action', 'ok', 'changed', 'elapsed_ms', 'settle_ms', 'error')
+
+    def __init__(self, action, ok, changed=None, elapsed_ms=0.0, settle_ms=0.0, error=None):
+        self.action = action
+        self.ok = ok
+        self.changed = changed  # None when not verified
+        self.elapsed_ms = elapsed_ms
+        self.settle_ms = settle_ms
+        self.error = error
+
+class PlanResult:
+    """Outcome of playing an action plan"""
+    def __init__(self):
+        self.steps = []
+        self.aborted = False  # The pyautogui failsafe was triggered, or the stop event set
+        self.last_frame = None  # Downsampled frame after the last settled step
+        self.total_ms = 0.0
+
+    @property
+    def completed(self):
+        return not self.aborted and all(step.ok and step.changed is not False for step in self.steps)
+
+# --- Parsing ---
+
+def _center(box):
+    return box['x'] + box['width'] / 2, box['y'] + box['height'] / 2
+
+def _hotkey_keys(text):
+    return [KEY_ALIASES.get(key, key) for key in re.split(r"\s*[+-]\s*", text.strip().lower())]
+
+def parse_action_plan(response, boxes):
+    """
+    Actions described by a model response, in order
+
+    boxes are the parsed highlight boxes (see response_parser), in screen
+    coordinates. Pointer instructions ("click", "double-click", "drag ... to")
+    act on the boxes of their own sentence; typing, hotkeys and scrolling
+    need no box. Instructions without a target are left out.
+    """
+    actions = []
+    for sentence in SENTENCE_PATTERN.finditer(response):
+        start, end = sentence.span()
+        sentence_boxes = [box for box in boxes if 'span' in box and start <= box['span'][0] < end]
+        unused = list(sentence_boxes)
+
+        def take_box(position):
+            for box in unused:
+                if box['span'][0] >= position:
+                    unused.remove(box)
+                    return box
+            return unused.pop(0) if unused else None
+
+        events = []
+        hotkey_spans = []
+        for match in HOTKEY_PATTERN.finditer(response, start, end):
+            events.append((match.start(), HOTKEY, match))
+            hotkey_spans.append(match.span())
+        for match in TYPE_PATTERN.finditer(response, start, end):
+            events.append((match.start(), TYPE, match))
+        for match in SCROLL_PATTERN.finditer(response, start, end):
+            events.append((match.start(), SCROLL, match))
+        for match in POINTER_VERB_PATTERN.finditer(response, start, end):
+            if not any(low <= match.start() < high for low, high in hotkey_spans):
+                events.append((match.start(), CLICK, match))
+        events.sort(key=lambda event: event[0])
+
+        text = response[start:end].strip()
+        for position, kind, match in events:
+            if kind == HOTKEY:
+                actions.append(Action(HOTKEY, keys=_hotkey_keys(match.group(1)), description=text))
+            elif kind == TYPE:
+                target = take_box(position) if unused else None
+                if target:
+                    x, y = _center(target)
+                    actions.append(Action(CLICK, x=x, y=y, description=text))
+                actions.append(Action(TYPE, text=match.group(1), description=text))
+            elif kind == SCROLL:
+                target = take_box(position) if unused else None
+                x, y = _center(target) if target else (None, None)
+                direction = 1 if match.group(1).lower() == "up" else -1
+                actions.append(Action(SCROLL, x=x, y=y, amount=direction * SCROLL_CLICKS, description=text))
+            else:
+                verb = re.sub(r"[- ]", "", match.group(1).lower())
+                target = take_box(position)
+                if target is None:
+                    continue
+                x, y = _center(target)
+                if verb == "drag":
+                    destination = take_box(position)
+                    if destination is None:
+                        continue
+                    end_x, end_y = _center(destination)
+                    actions.append(Action(DRAG, x=x, y=y, end_x=end_x, end_y=end_y, description=text))
+                else:
+                    kind = DOUBLE_CLICK if verb == "doubleclick" else RIGHT_CLICK if verb == "rightclick" else CLICK
+                    actions.append(Action(kind, x=x, y=y, description=text))
+    return actions
+
+def structured_action_plan(step, boxes):
+    """
+    Actions of a structured response (see response_parser.parse_structured_response)
+    boxes are its boxes in screen coordinates, in the order the step uses them
+    """
+    kind, text = step['action']['kind'], step['action']['text']
+    description = step['step_text']
+    centers = [_center(box) for box in boxes]
+    if kind in (CLICK, DOUBLE_CLICK, RIGHT_CLICK):
+        return [Action(kind, x=centers[0][0], y=centers[0][1], description=description)] if centers else []
+    if kind == DRAG:
+        if len(centers) < 2:
+            return []
+        (x, y), (end_x, end_y) = centers[:2]
+        return [Action(DRAG, x=x, y=y, end_x=end_x, end_y=end_y, description=description)]
+    if kind == TYPE and text:
+        actions = [Action(CLICK, x=centers[0][0], y=centers[0][1], description=description)] if centers else []
+        return actions + [Action(TYPE, text=text, description=description)]
+    if kind == HOTKEY and text:
+        return [Action(HOTKEY, keys=_hotkey_keys(text), description=description)]
+    if kind == SCROLL:
+        x, y = centers[0] if centers else (None, None)
+        direction = 1 if text.strip().lower() == "up" else -1
+        return [Action(SCROLL, x=x, y=y, amount=direction * SCROLL_CLICKS, description=description)]
+    return []
+
+# --- Playback ---
+
+def perform_action(action, driver=pyautogui, motion=None):
+    """Perform one action with the given input driver (pyautogui by default)"""
+    duration = MOTION_PROFILES.get(motion or DEFAULT_MOTION, MOTION_PROFILES["fast"])
+    if action.x is not None and action.kind != TYPE and action.kind != HOTKEY:
+        if duration > 0:
+            driver.moveTo(action.x, action.y, duration=duration, tween=driver.easeOutQuad, _pause=False)
+        else:
+            driver.moveTo(action.x, action.y, _pause=False)
+
+    if action.kind == CLICK:
+        driver.click(_pause=False)
+    elif action.kind == DOUBLE_CLICK:
+        driver.doubleClick(_pause=False)
+    elif action.kind == RIGHT_CLICK:
+        driver.rightClick(_pause=False)
+    elif action.kind == TYPE:
+        driver.write(action.text, interval=TYPE_INTERVAL, _pause=False)
+    elif action.kind == HOTKEY:
+        if len(action.keys) == 1:
+            driver.press(action.keys[0], _pause=False)
+        else:
+            driver.hotkey(*action.keys, _pause=False)
+    elif action.kind == SCROLL:
+        driver.scroll(action.amount, _pause=False)
+    elif action.kind == DRAG:
+        driver.dragTo(action.end_x, action.end_y, duration=max(duration, 0.2), button='left', _pause=False)
+    else:
+        raise ValueError(f"Unknown action: {action.kind}")
+
+class DiffFrameCapture:
+    """
+    Downsampled grayscale frames of one monitor, for frame differences.
+
+    mss handles can't be shared between threads, so each thread grabs
+    through its own, opened on its first frame and reused for every poll
+    until release() (the engine releases it at the end of each plan).
+    """
+    def __init__(self):
+        self.local = threading.local()
+
+    def _sct(self):
+        sct = getattr(self.local, 'sct', None)
+        if sct is None:
+            sct = self.local.sct = mss.mss()
+        return sct
+
+    def monitor_at(self, x, y):
+        """mss index of the monitor containing a screen point (the primary monitor if none does)"""
+        for index, monitor in enumerate(self._sct().monitors[1:], 1):
+            if (monitor['left'] <= x < monitor['left'] + monitor['width'] and
+                    monitor['top'] <= y < monitor['top'] + monitor['height']):
+                return index
+        return 1
+
+    def __call__(self, monitor=None):
+        sct = self._sct()
+        shot = sct.grab(sct.monitors[monitor or 1])
+        pixels = np.frombuffer(shot.bgra, dtype=np.uint8).reshape(shot.height, shot.width, 4)
+        return to_grayscale(pixels[::DIFF_STEP, ::DIFF_STEP]).astype(np.int16)
+
+    def release(self):
+        """Close the calling thread's mss handle"""
+        sct = getattr(self.local, 'sct', None)
+        if sct is not None:
+            self.local.sct = None
+            sct.close()
+
+def frame_changed(before, after):
+    """Whether two diff frames differ by more than noise"""
+    if before is None or after is None or before.shape != after.shape:
+        return True
+    changed = np.count_nonzero(np.abs(after - before) > DIFF_LEVEL)
+    return changed > CHANGE_FRACTION * before.size
+
+class ActionEngine:
+    """
+    Plays action plans back with verification.
+
+    Each action is performed with the configured motion profile and without
+    pyautogui's fixed pause; instead the engine polls cheap downsampled
+    frames until the screen has visibly reacted and then stopped changing.
+    A step with no visible effect is unverified and, by default, stops the
+    plan, since later steps usually depend on it. Moving the mouse into a
+    screen corner (the pyautogui failsafe) aborts the whole plan.
+
+    Frames come from the monitor an action points at, so actions on a
+    secondary monitor are verified there; capture(monitor) takes an mss
+    monitor index (None for the primary one).
+    """
+    def __init__(self, driver=pyautogui, capture=None, motion=None, stop_on_unverified=True,
+                 settle_timeout=SETTLE_TIMEOUT, no_change_timeout=NO_CHANGE_TIMEOUT, on_step=None):
+        self.driver = driver
+        self.capture = capture or DiffFrameCapture()
+        self.motion = motion or DEFAULT_MOTION
+        self.stop_on_unverified = stop_on_unverified
+        self.settle_timeout = settle_timeout
+        self.no_change_timeout = no_change_timeout
+        self.on_step = on_step  # Called with (action, StepResult) after every step
+
+    def wait_for_settle(self, before, monitor=None, stop_event=None):
+        """
+        Poll frames of a monitor until the screen changed from before and then held still
+        (or stop_event is set). Returns (changed, frame, seconds waited)
+        """
+        started = time.perf_counter()
+        previous = before
+        changed = False
+        frame = before
+        while True:
+            if stop_event is None:
+                time.sleep(SETTLE_POLL)
+            elif stop_event.wait(SETTLE_POLL):
+                return changed, frame, time.perf_counter() - started
+            frame = self.capture(monitor)
+            waited = time.perf_counter() - started
+            if frame_changed(before, frame):
+                if changed and not frame_changed(previous, frame):
+                    return True, frame, waited  # Changed, then stable for one poll
+                changed = True
+            elif not changed and waited >= self.no_change_timeout:
+                return False, frame, waited
+            if waited >= self.settle_timeout:
+                return changed, frame, waited
+            previous = frame
+
+    def _monitor_for(self, action, current):
+        """Monitor whose frames show an action's effect: the one under its point, else the current one"""
+        monitor_at = getattr(self.capture, 'monitor_at', None)
+        if action.x is None or monitor_at is None:
+            return current
+        return monitor_at(action.x, action.y)
+
+    def run(self, plan, verify=True, before=None, transform=None, stop_event=None):
+        """
+        Play a list of Actions; returns a PlanResult
+        transform is the CoordinateTransform of the frame the plan was made from; its
+        monitor is watched for actions without a point (typing, hotkeys). Setting
+        stop_event aborts the plan, also while waiting for the screen to settle.
+        """
+        try:
+            return self._run(plan, verify, before, transform, stop_event)
+        finally:
+            release = getattr(self.capture, 'release', None)
+            if release:
+                release()
+
+    def _run(self, plan, verify, before, transform, stop_event):
+        result = PlanResult()
+        started = time.perf_counter()
+        monitor = transform.monitor if transform is not None and transform.monitor else None
+        if plan:
+            monitor = self._monitor_for(plan[0], monitor)
+        frame = before if before is not None or not verify else self.capture(monitor)
+        for action in plan:
+            if stop_event is not None and stop_event.is_set():
+                result.aborted = True
+                break
+            step_started = time.perf_counter()
+            target = self._monitor_for(action, monitor)
+            if verify and target != monitor:
+                frame = self.capture(target)  # The action shows up on another monitor
+            monitor = target
+            try:
+                perform_action(action, self.driver, self.motion)
+            except self.driver.FailSafeException:
+                print("Action plan aborted by the failsafe")
+                result.aborted = True
+                break
+            except Exception as e:
+                print(f"Error performing {action}: {e}")
+                result.steps.append(StepResult(action, False, error=str(e),
+                                               elapsed_ms=(time.perf_counter() - step_started) * 1000))
+                break
+
+            step = StepResult(action, True)
+            if verify:
+                step.changed, frame, waited = self.wait_for_settle(frame, monitor, stop_event)
+                step.settle_ms = waited * 1000
+            step.elapsed_ms = (time.perf_counter() - step_started) * 1000
+            result.steps.append(step)
+            print(f"--- {action.kind} in {step.elapsed_ms:.0f}ms (settled in {step.settle_ms:.0f}ms, "
+                  f"changed: {step.changed}) ---")
+            if self.on_step:
+                self.on_step(action, step)
+            if stop_event is not None and stop_event.is_set():
+                result.aborted = True
+                break
+            if step.changed is False and self.stop_on_unverified:
+                print(f"No visible effect from {action}, stopping the plan")
+                break
+        result.last_frame = frame
+        result.total_ms = (time.perf_counter() - started) * 1000
+        return result
@@ -0,0 +1,142 @@
+import os
+import re
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Default cache limits
+MEMORY_LIMIT_BYTES = 16 * 1024 * 1024  # 16 MB of segments kept in memory
+DISK_LIMIT_BYTES = 200 * 1024 * 1024  # 200 MB of segments kept on disk
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "ai-assistant", "tts")
+
+def normalize_text(text):
+    """Normalize text for cache keys (case and whitespace don't change the audio)"""
+    return re.sub(r'\s+', ' ', text).strip().lower()
+
+class AudioCache:
+    """
+    Content-addressed cache of synthesized speech segments.
+
+    Segments are keyed by (normalized text, voice, speed) and kept both in
+    memory and on disk, each with its own size limit and least-recently-used
+    eviction. Disk entries survive restarts, so repeated phrases never need
+    to be synthesized twice.
+    """
+    def __init__(self, cache_dir=None, memory_limit=MEMORY_LIMIT_BYTES, disk_limit=DISK_LIMIT_BYTES):
+        self.cache_dir = cache_dir or os.getenv("TTS_CACHE_DIR", DEFAULT_CACHE_DIR)
+        self.memory_limit = memory_limit
+        self.disk_limit = disk_limit
+        self.memory = OrderedDict()  # Key -> audio bytes, least recently used first
+        self.memory_bytes = 0
+        self.disk = OrderedDict()  # Key -> file size, least recently used first
+        self.disk_bytes = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._load_disk_index()
+
+    def _load_disk_index(self):
+        """Index existing disk entries, oldest access first"""
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            entries = []
+            for file_name in os.listdir(self.cache_dir):
+                if file_name.endswith(".pcm"):
+                    stat = os.stat(os.path.join(self.cache_dir, file_name))
+                    entries.append((stat.st_mtime, file_name[:-4], stat.st_size))
+        except OSError as e:
+            print(f"Audio cache directory unavailable, using memory only: {e}")
+            self.cache_dir = None
+            return
+        for _, key, size in sorted(entries):
+            self.disk[key] = size
+            self.disk_bytes += size
+
+    @staticmethod
+    def make_key(text, voice, speed):
+        return hashlib.sha256(f"{voice}|{speed}|{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pcm")
+
+    def get(self, text, voice, speed):
+        """Return cached audio for the text, or None"""
+        key = self.make_key(text, voice, speed)
+        with self.lock:
+            audio = self.memory.get(key)
+            if audio is not None:
+                self.memory.move_to_end(key)
+                self.hits += 1
+                return audio
+            if key not in self.disk:
+                self.misses += 1
+                return None
+
+        try:
+            path = self._path(key)
+            with open(path, "rb") as f:
+                audio = f.read()
+            os.utime(path)  # Record the access for LRU order across restarts
+        except OSError:
+            with self.lock:
+                self.disk_bytes -= self.disk.pop(key, 0)
+                self.misses += 1
+            return None
+
+        with self.lock:
+            if key in self.disk:
+                self.disk.move_to_end(key)
+            self._store_in_memory(key, audio)
+            self.hits += 1
+        return audio
+
+    def put(self, text, voice, speed, audio):
+        """Store synthesized audio for the text"""
+        key = self.make_key(text, voice, speed)
+        with self.lock:
+            self._store_in_memory(key, audio)
+            if self.cache_dir is None or key in self.disk:
+                return
+
+        try:
+            temp_path = self._path(key) + ".tmp"
+            with open(temp_path, "wb") as f:
+                f.write(audio)
+            os.replace(temp_path, self._path(key))
+        except OSError as e:
+            print(f"Error writing audio cache entry: {e}")
+            return
+
+        with self.lock:
+            self.disk[key] = len(audio)
+            self.disk_bytes += len(audio)
+            self._evict_disk()
+
+    def _store_in_memory(self, key, audio):
+        if len(audio) > self.memory_limit:
+            return
+        if key in self.memory:
+            self.memory_bytes -= len(self.memory.pop(key))
+        self.memory[key] = audio
+        self.memory_bytes += len(audio)
+        while self.memory_bytes > self.memory_limit:
+            _, evicted = self.memory.popitem(last=False)
+            self.memory_bytes -= len(evicted)
+
+    def _evict_disk(self):
+        while self.disk_bytes > self.disk_limit and self.disk:
+            key, size = self.disk.popitem(last=False)
+            self.disk_bytes -= size
+            try:
+                os.unlink(self._path(key))
+            except OSError:
+                pass
+
+# Shared cache instance
+_audio_cache = None
+
+def get_audio_cache():
+    global _audio_cache
+    if _audio_cache is None:
+        _audio_cache = AudioCache()
+    return _audio_cache
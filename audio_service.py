@@ -0,0 +1,221 @@
+import time
+import atexit
+import threading
+from collections import deque
+
+from audio_stream import STREAM_SAMPLE_RATE, FRAME_SAMPLES
+
+# Output format of the shared mixer (matches OpenAI "pcm" speech: 24 kHz 16-bit mono)
+PLAYBACK_SAMPLE_RATE = 24000
+
+class RecordingSession:
+    """One recording on the shared input stream. Read frames with read(), then close()."""
+    def __init__(self, service, stream):
+        self.service = service
+        self.stream = stream
+        self.active = True
+
+    def read(self, frame_samples=FRAME_SAMPLES):
+        """Read one frame of 16-bit mono PCM"""
+        return self.stream.read(frame_samples, exception_on_overflow=False)
+
+    def close(self):
+        """End the session (the stream is paused, not closed)"""
+        if self.active:
+            self.active = False
+            self.service._end_recording(self)
+
+class PlaybackHandle:
+    """
+    Handle for one response's audio on the shared mixer.
+    Once a newer handle is started this one is preempted and its audio is dropped.
+    """
+    def __init__(self, service, generation):
+        self.service = service
+        self.generation = generation
+
+    @property
+    def active(self):
+        return self.service.playback_generation == self.generation
+
+    def enqueue(self, pcm_bytes):
+        """Queue a PCM segment (ignored once preempted)"""
+        if self.active:
+            self.service._enqueue(pcm_bytes, self.generation)
+
+    def stop(self):
+        """Stop this handle's playback if it is still the current one"""
+        if self.active:
+            self.service.stop_playback()
+
+    def is_busy(self):
+        return self.active and self.service.is_playing()
+
+class AudioService:
+    """
+    Long-lived owner of the audio devices.
+
+    Creating a PyAudio instance (device enumeration) and initializing the
+    pygame mixer each cost hundreds of milliseconds, so both are done once:
+    the service keeps one input stream (paused between recordings) and one
+    mixer channel with gapless queueing, hands out recording sessions and
+    playback handles, and lets new playback preempt the old.
+    """
+    def __init__(self, input_rate=STREAM_SAMPLE_RATE, output_rate=PLAYBACK_SAMPLE_RATE):
+        self.input_rate = input_rate
+        self.output_rate = output_rate
+        self.lock = threading.RLock()
+
+        # Input side
+        self.pyaudio = None
+        self.input_stream = None
+        self.recording = None
+
+        # Output side
+        self.pygame = None
+        self.channel = None
+        self.pending = deque()  # (generation, Sound) waiting for the channel's queue slot
+        self.condition = threading.Condition(self.lock)
+        self.playback_generation = 0
+        self.feeder_thread = None
+        self.running = True
+
+    # --- Recording ---
+
+    def start_recording(self):
+        """Start a recording session, ending any session still open"""
+        with self.lock:
+            if self.recording:
+                self.recording.close()
+            if self.input_stream is None:
+                import pyaudio
+                self.pyaudio = pyaudio.PyAudio()
+                self.input_stream = self.pyaudio.open(format=pyaudio.paInt16,
+                                                      channels=1,
+                                                      rate=self.input_rate,
+                                                      frames_per_buffer=FRAME_SAMPLES,
+                                                      input=True,
+                                                      start=False)
+            self.input_stream.start_stream()
+            self.recording = RecordingSession(self, self.input_stream)
+            return self.recording
+
+    def _end_recording(self, session):
+        with self.lock:
+            if self.recording is session:
+                self.recording = None
+                try:
+                    self.input_stream.stop_stream()
+                except Exception as e:
+                    print(f"Error pausing input stream: {e}")
+
+    # --- Playback ---
+
+    def _ensure_mixer(self):
+        if self.channel is not None:
+            return
+        import pygame
+        if not pygame.mixer.get_init():
+            pygame.mixer.init(frequency=self.output_rate, size=-16, channels=1)
+        self.pygame = pygame
+        self.channel = pygame.mixer.Channel(0)
+        self.feeder_thread = threading.Thread(target=self._feed_loop, daemon=True)
+        self.feeder_thread.start()
+
+    def begin_playback(self):
+        """Start a new playback, preempting whatever is playing now"""
+        with self.lock:
+            self.stop_playback()
+            return PlaybackHandle(self, self.playback_generation)
+
+    def stop_playback(self):
+        """Stop current playback and drop queued audio"""
+        with self.lock:
+            self.playback_generation += 1
+            self.pending.clear()
+            if self.channel is not None:
+                self.channel.stop()
+            if self.pygame is not None and self.pygame.mixer.get_init():
+                self.pygame.mixer.music.stop()
+
+    def _enqueue(self, pcm_bytes, generation):
+        with self.condition:
+            if generation != self.playback_generation:
+                return
+            self._ensure_mixer()
+            self.pending.append((generation, self.pygame.mixer.Sound(buffer=pcm_bytes)))
+            self.condition.notify()
+
+    def _feed_loop(self):
+        """Keep the channel's single queue slot filled so segments play back to back"""
+        while self.running:
+            with self.condition:
+                while self.running and not self.pending:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                entry = self.pending[0]
+            # The queue slot frees up when the current sound ends
+            while self.running and self.channel.get_queue() is not None:
+                time.sleep(0.005)
+            with self.condition:
+                if self.pending and self.pending[0] is entry and entry[0] == self.playback_generation:
+                    self.pending.popleft()
+                    self.channel.queue(entry[1])  # Plays immediately if the channel is idle
+
+    def play_file(self, file_path):
+        """Play an audio file (e.g. MP3) to the end, preempting other playback"""
+        handle = self.begin_playback()
+        with self.lock:
+            self._ensure_mixer()
+            self.pygame.mixer.music.load(file_path)
+            self.pygame.mixer.music.play()
+        while handle.active and self.pygame.mixer.music.get_busy():
+            time.sleep(0.05)
+        return handle
+
+    def is_playing(self):
+        with self.lock:
+            if self.pending:
+                return True
+            if self.channel is not None and self.channel.get_busy():
+                return True
+            return self.pygame is not None and self.pygame.mixer.get_init() and self.pygame.mixer.music.get_busy()
+
+    # --- Lifecycle ---
+
+    def shutdown(self):
+        """Release the audio devices"""
+        with self.condition:
+            if not self.running:
+                return
+            self.running = False
+            self.condition.notify_all()
+        with self.lock:
+            if self.recording:
+                self.recording.close()
+            if self.input_stream is not None:
+                try:
+                    self.input_stream.close()
+                except Exception as e:
+                    print(f"Error closing input stream: {e}")
+                self.input_stream = None
+            if self.pyaudio is not None:
+                self.pyaudio.terminate()
+                self.pyaudio = None
+            if self.pygame is not None and self.pygame.mixer.get_init():
+                self.pending.clear()
+                self.pygame.mixer.quit()
+            self.channel = None
+
+# Singleton instance for easy import
+_audio_service = None
+_audio_service_lock = threading.Lock()
+
+def get_audio_service():
+    global _audio_service
+    with _audio_service_lock:
+        if _audio_service is None:
+            _audio_service = AudioService()
+            atexit.register(_audio_service.shutdown)
+        return _audio_service
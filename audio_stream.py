@@ -0,0 +1,215 @@
+import io
+import math
+import wave
+import threading
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Streaming capture format: 16 kHz mono 16-bit, processed in fixed 30 ms frames
+STREAM_SAMPLE_RATE = 16000
+STREAM_SAMPLE_WIDTH = 2  # Bytes per sample (paInt16)
+FRAME_MS = 30
+FRAME_SAMPLES = STREAM_SAMPLE_RATE * FRAME_MS // 1000  # 480 samples per frame
+
+# Sample rate the old whole-file recordings used, for upload size comparisons
+LEGACY_SAMPLE_RATE = 44100
+
+class EnergyVAD:
+    """
+    Energy-based voice activity detector with an adaptive noise floor.
+    A frame is speech when its RMS is well above the running background level.
+    """
+    def __init__(self, min_threshold=300, noise_ratio=3.0, adapt_rate=0.05):
+        self.min_threshold = min_threshold
+        self.noise_ratio = noise_ratio
+        self.adapt_rate = adapt_rate
+        self.noise_floor = min_threshold / noise_ratio
+
+    def is_speech(self, frame):
+        samples = array('h')
+        samples.frombytes(frame)
+        if not samples:
+            return False
+        rms = math.sqrt(sum(sample * sample for sample in samples) / len(samples))
+        speech = rms > max(self.min_threshold, self.noise_floor * self.noise_ratio)
+        if not speech:
+            # Only background frames move the noise floor
+            self.noise_floor += self.adapt_rate * (rms - self.noise_floor)
+        return speech
+
+class WebRtcVAD:
+    """Voice activity detector backed by the optional webrtcvad package"""
+    def __init__(self, aggressiveness=2):
+        import webrtcvad
+        self.vad = webrtcvad.Vad(aggressiveness)
+
+    def is_speech(self, frame):
+        return self.vad.is_speech(frame, STREAM_SAMPLE_RATE)
+
+def create_vad():
+    """Use WebRTC VAD when installed, otherwise the energy detector"""
+    try:
+        return WebRtcVAD()
+    except ImportError:
+        return EnergyVAD()
+
+def encode_segment(pcm_bytes):
+    """
+    Encode a 16 kHz mono PCM segment for upload
+    Returns (audio_bytes, file_name). Uses FLAC when soundfile is installed, WAV otherwise.
+    """
+    try:
+        import soundfile
+        samples = array('h')
+        samples.frombytes(pcm_bytes)
+        output = io.BytesIO()
+        soundfile.write(output, samples, STREAM_SAMPLE_RATE, format='FLAC', subtype='PCM_16')
+        return output.getvalue(), "speech.flac"
+    except ImportError:
+        output = io.BytesIO()
+        wf = wave.open(output, 'wb')
+        wf.setnchannels(1)
+        wf.setsampwidth(STREAM_SAMPLE_WIDTH)
+        wf.setframerate(STREAM_SAMPLE_RATE)
+        wf.writeframes(pcm_bytes)
+        wf.close()
+        return output.getvalue(), "speech.wav"
+
+class StreamingRecorder:
+    """
+    Splits a live 16 kHz mono stream into speech segments.
+
+    Frames are fed one at a time with add_frame(). Leading silence is dropped,
+    each segment is handed to on_segment as soon as the speaker pauses, and
+    recording ends by itself after a longer trailing silence.
+    """
+    def __init__(self, on_segment, vad=None, start_frames=3, pre_roll_ms=300, trailing_pad_ms=200,
+                 segment_pause_ms=700, end_silence_ms=1500, no_speech_timeout_s=8, max_duration_s=60):
+        self.on_segment = on_segment
+        self.vad = vad or create_vad()
+        self.start_frames = start_frames  # Consecutive speech frames needed to start a segment
+        self.pre_roll = deque(maxlen=max(1, pre_roll_ms // FRAME_MS))
+        self.trailing_pad_frames = trailing_pad_ms // FRAME_MS
+        self.segment_pause_frames = segment_pause_ms // FRAME_MS
+        self.end_silence_frames = end_silence_ms // FRAME_MS
+        self.no_speech_timeout_frames = no_speech_timeout_s * 1000 // FRAME_MS
+        self.max_frames = max_duration_s * 1000 // FRAME_MS
+
+        self.current = None  # Frames of the segment being recorded, None between segments
+        self.speech_run = 0
+        self.silence_frames = 0
+        self.total_frames = 0
+        self.speech_started = False
+        self.finished = False
+
+    def add_frame(self, frame):
+        """Process one frame. Returns False once recording should stop."""
+        if self.finished:
+            return False
+        self.total_frames += 1
+        speech = self.vad.is_speech(frame)
+
+        if speech:
+            self.silence_frames = 0
+        else:
+            self.silence_frames += 1
+
+        if self.current is None:
+            self.pre_roll.append(frame)
+            self.speech_run = self.speech_run + 1 if speech else 0
+            if self.speech_run >= self.start_frames:
+                # Start a segment, keeping a little audio from before the speech onset
+                self.current = list(self.pre_roll)
+                self.pre_roll.clear()
+                self.speech_started = True
+        else:
+            self.current.append(frame)
+            if self.silence_frames >= self.segment_pause_frames:
+                self._flush_segment()
+
+        if self.speech_started and self.silence_frames >= self.end_silence_frames:
+            self.finish()
+        elif not self.speech_started and self.total_frames >= self.no_speech_timeout_frames:
+            self.finish()
+        elif self.total_frames >= self.max_frames:
+            self.finish()
+        return not self.finished
+
+    def _flush_segment(self):
+        """Hand the current segment to the callback, trimming trailing silence"""
+        if not self.current:
+            self.current = None
+            return
+        trim = max(0, min(self.silence_frames, len(self.current)) - self.trailing_pad_frames)
+        frames = self.current[:len(self.current) - trim] if trim else self.current
+        self.current = None
+        self.speech_run = 0
+        self.on_segment(b''.join(frames))
+
+    def finish(self):
+        """Stop recording and flush any segment in progress"""
+        if self.current is not None:
+            self._flush_segment()
+        self.finished = True
+
+    @property
+    def recorded_seconds(self):
+        return self.total_frames * FRAME_MS / 1000
+
+class StreamingTranscriber:
+    """
+    Transcribes speech segments in the background while recording continues.
+
+    Segments are encoded and sent to transcribe_fn(audio_bytes, file_name, prompt,
+    audio_seconds) one at a time, in order; each request gets the text so far as
+    a prompt so the backend keeps context across segment boundaries, and the
+    segment length so a backend can be picked for it.
+    """
+    def __init__(self, transcribe_fn):
+        self.transcribe_fn = transcribe_fn
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.futures = []
+        self.texts = []
+        self.lock = threading.Lock()
+        self.raw_bytes = 0
+        self.uploaded_bytes = 0
+
+    def submit(self, pcm_bytes):
+        """Queue a PCM segment for transcription"""
+        self.raw_bytes += len(pcm_bytes)
+        self.futures.append(self.executor.submit(self._transcribe, pcm_bytes))
+
+    def _transcribe(self, pcm_bytes):
+        audio_bytes, file_name = encode_segment(pcm_bytes)
+        with self.lock:
+            self.uploaded_bytes += len(audio_bytes)
+            prompt = " ".join(self.texts) or None
+        audio_seconds = len(pcm_bytes) / (STREAM_SAMPLE_RATE * STREAM_SAMPLE_WIDTH)
+        text = self.transcribe_fn(audio_bytes, file_name, prompt, audio_seconds)
+        if text:
+            with self.lock:
+                self.texts.append(text.strip())
+
+    def partial_text(self):
+        """Text of the segments transcribed so far (or None), without waiting for pending ones"""
+        with self.lock:
+            return " ".join(self.texts).strip() or None
+
+    def finish(self, timeout=None):
+        """Wait for pending segments and return the full transcription (or None)"""
+        for future in self.futures:
+            try:
+                future.result(timeout=timeout)
+            except Exception as e:
+                print(f"Error transcribing segment: {e}")
+        self.executor.shutdown(wait=False)
+        text = " ".join(self.texts).strip()
+        return text or None
+
+    def upload_savings(self, recorded_seconds):
+        """Fraction of upload saved compared to a whole 44.1 kHz WAV of the recording"""
+        legacy_bytes = recorded_seconds * LEGACY_SAMPLE_RATE * STREAM_SAMPLE_WIDTH
+        if not legacy_bytes:
+            return 0.0
+        return 1.0 - self.uploaded_bytes / legacy_bytes
@@ -0,0 +1,206 @@
+import time
+import threading
+
+from response_parser import parse_highlight_boxes, is_task_complete, parse_structured_response, structured_boxes
+from box_refiner import refine_boxes
+from action_engine import parse_action_plan, structured_action_plan
+
+MAX_STEPS = 10  # Step budget of one task
+MAX_FAILED_STEPS = 2  # Consecutive steps without a visible effect before giving up
+FAILSAFE_POLL = 0.05  # Seconds between failsafe checks while the loop runs
+
+# Request sent for every step after the first
+FOLLOW_UP_PROMPT = """{task}
+
+Steps already performed:
+{history}
+
+Look at the screenshot and give the single next step, or say the task is complete."""
+
+# Loop outcomes
+COMPLETE = "complete"
+BUDGET_EXHAUSTED = "budget_exhausted"
+ABORTED = "aborted"  # The pyautogui failsafe (mouse in a screen corner)
+STUCK = "stuck"  # No actionable step, or steps without effect
+STOPPED = "stopped"
+FAILED = "failed"
+
+class LoopResult:
+    """Outcome of an autonomous run: status, per-step timings (ms) and total time"""
+    def __init__(self):
+        self.status = None
+        self.steps = []  # Dicts of step, response, actions, capture/model/parse/act/settle/total ms
+        self.total_ms = 0.0
+
+    def format(self):
+        lines = [f"{self.status} after {len(self.steps)} step(s) in {self.total_ms / 1000:.2f}s"]
+        for step in self.steps:
+            lines.append(f"  step {step['step']}: {step['actions']} action(s), capture={step['capture']:.0f}ms "
+                         f"model={step['model']:.0f}ms parse={step['parse']:.1f}ms act={step['act']:.0f}ms "
+                         f"(settle={step['settle']:.0f}ms) total={step['total']:.0f}ms")
+        return "\n".join(lines)
+
+class AutonomousLoop:
+    """
+    Runs a task without waiting for the user between steps.
+
+    Each step captures the screen, asks the model for the next step, parses
+    its boxes and actions and plays them with the ActionEngine. The engine
+    returns as soon as the screen has reacted and settled (by frame
+    difference), and the next capture starts right away, so there are no
+    fixed delays between steps. The loop ends when the model says the task
+    is complete, the step budget is spent, steps stop having an effect, or
+    the mouse is moved into a screen corner (the pyautogui failsafe). A
+    watcher thread checks the failsafe throughout, so a run is aborted
+    within FAILSAFE_POLL even while waiting for the model or the screen.
+
+    capture() returns (image_url, pixels, transform): pixels (BGRA array or
+    None) are used to snap boxes, and the CoordinateTransform places the
+    frame on the desktop. model(prompt, image_url) returns the response text,
+    free text or structured output (see response_parser.parse_structured_response).
+    """
+    def __init__(self, capture, model, engine, max_steps=MAX_STEPS, on_step=None):
+        self.capture = capture
+        self.model = model
+        self.engine = engine
+        self.max_steps = max_steps
+        self.on_step = on_step  # Called with each step's dict
+        self.stop_event = threading.Event()
+        self.failsafe_hit = False
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _failsafe_triggered(self):
+        try:
+            check = getattr(self.engine.driver, "failSafeCheck", None)
+            if check:
+                check()
+        except self.engine.driver.FailSafeException:
+            return True
+        return False
+
+    def _watch_failsafe(self, done):
+        """Stop the run as soon as the failsafe triggers (on a watcher thread, until done is set)"""
+        while not done.wait(FAILSAFE_POLL):
+            if self._failsafe_triggered():
+                print("Autonomous run aborted by the failsafe")
+                self.failsafe_hit = True
+                self.stop_event.set()
+                return
+
+    def _call_model(self, prompt, image_url):
+        """Call the model on a worker thread; returns None if the run is stopped before it answers"""
+        outcome = {}
+        answered = threading.Event()
+
+        def call():
+            try:
+                outcome['response'] = self.model(prompt, image_url)
+            except Exception as e:
+                outcome['error'] = e
+            finally:
+                answered.set()
+
+        threading.Thread(target=call, daemon=True).start()
+        while not answered.wait(FAILSAFE_POLL):
+            if self.stop_event.is_set():
+                return None  # The late answer is dropped
+        if 'error' in outcome:
+            raise outcome['error']
+        return outcome['response']
+
+    def _stopped_status(self):
+        return ABORTED if self.failsafe_hit else STOPPED
+
+    def run(self, task):
+        self.failsafe_hit = False
+        done = threading.Event()
+        threading.Thread(target=self._watch_failsafe, args=(done,), daemon=True).start()
+        try:
+            return self._run(task)
+        finally:
+            done.set()
+
+    def _run(self, task):
+        result = LoopResult()
+        started = time.perf_counter()
+        history = []
+        failed_steps = 0
+        result.status = BUDGET_EXHAUSTED
+        for step_number in range(1, self.max_steps + 1):
+            if self._failsafe_triggered():
+                self.failsafe_hit = True
+            if self.failsafe_hit or self.stop_event.is_set():
+                result.status = self._stopped_status()
+                break
+
+            step_started = time.perf_counter()
+            image_url, pixels, transform = self.capture()
+            captured = time.perf_counter()
+
+            prompt = task if not history else FOLLOW_UP_PROMPT.format(
+                task=task, history="\n".join(f"- {line}" for line in history))
+            try:
+                response = self._call_model(prompt, image_url)
+            except Exception as e:
+                print(f"Model call failed in step {step_number}: {e}")
+                result.status = FAILED
+                break
+            if response is None:
+                result.status = self._stopped_status()
+                break
+            answered = time.perf_counter()
+
+            structured = parse_structured_response(response)
+            if structured:
+                boxes = structured_boxes(structured, transform.width, transform.height)
+                response = structured['step_text']
+            else:
+                boxes = parse_highlight_boxes(response, transform.width, transform.height,
+                                              image_size=(transform.upload_width, transform.upload_height))
+            if pixels is not None and boxes:
+                refine_boxes(boxes, pixels, transform.scale_x, transform.scale_y)
+            transform.boxes_to_screen(boxes)
+            if structured:
+                plan = structured_action_plan(structured, boxes)
+                complete = structured['is_complete']
+            else:
+                plan = parse_action_plan(response, boxes)
+                complete = is_task_complete(response)
+            parsed = time.perf_counter()
+
+            plan_result = self.engine.run(plan, transform=transform, stop_event=self.stop_event) if plan else None
+            acted = time.perf_counter()
+
+            step = {
+                'step': step_number, 'response': response, 'actions': len(plan),
+                'capture': (captured - step_started) * 1000, 'model': (answered - captured) * 1000,
+                'parse': (parsed - answered) * 1000, 'act': (acted - parsed) * 1000,
+                'settle': sum(s.settle_ms for s in plan_result.steps) if plan_result else 0.0,
+                'total': (acted - step_started) * 1000,
+            }
+            result.steps.append(step)
+            if self.on_step:
+                self.on_step(step)
+
+            if plan_result and plan_result.aborted:
+                result.status = self._stopped_status() if self.stop_event.is_set() else ABORTED
+                break
+            if complete:
+                result.status = COMPLETE
+                break
+            if not plan:
+                result.status = STUCK
+                break
+            if plan_result.completed:
+                failed_steps = 0
+                history.append(" ".join(response.split())[:200])
+            else:
+                failed_steps += 1
+                history.append(f"(no visible effect) {' '.join(response.split())[:200]}")
+                if failed_steps >= MAX_FAILED_STEPS:
+                    result.status = STUCK
+                    break
+        result.total_ms = (time.perf_counter() - started) * 1000
+        return result
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the AI Desktop Assistant.
+
+Runs live measurements against the configured APIs and prints a summary for each benchmark.
+
+Usage:
+    python benchmark.py                      # Run every benchmark
+    python benchmark.py gemini_context       # Run selected benchmarks
+    python benchmark.py --runs 10 --model gemini-flash gemini_context
+    python benchmark.py --offline speech_backends  # Local speech backends only, no network
+    python benchmark.py autonomous           # Autonomous loop on a simulated desktop
+    python benchmark.py response_parsing     # Free-text vs structured response parsing (no network)
+"""
+import argparse
+import base64
+import io
+import json
+import os
+import statistics
+import time
+import wave
+
+from model_manager import get_model_manager
+from prompts import COORDINATE_CONTEXT, create_coordinate_system_instruction
+from speech_output import TTSPipeline, simplify_for_speech, MAX_SPOKEN_CHARS
+from speech_backends import SpeechBackendSelector, OpenAITTS, TTS_SAMPLE_RATE
+from autonomous import COMPLETE
+from simulated_desktop import run_simulated
+from response_parser import (parse_highlight_boxes, has_instruction, is_task_complete, parse_structured_response,
+                             structured_boxes)
+from action_engine import parse_action_plan, structured_action_plan
+
+DEFAULT_IMAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "screenshot.png")
+SAMPLE_REQUEST = "Where is the Mail app?"
+
+def format_samples(samples, unit=""):
+    """Format mean/median/min/max of a list of numbers"""
+    if not samples:
+        return "n/a"
+    return (f"mean={statistics.mean(samples):.3f}{unit} median={statistics.median(samples):.3f}{unit} "
+            f"min={min(samples):.3f}{unit} max={max(samples):.3f}{unit}")
+
+def load_image_url(path):
+    """Encode an image file as a base64 data URL"""
+    with open(path, "rb") as img_file:
+        return f"data:image/png;base64,{base64.b64encode(img_file.read()).decode('utf-8')}"
+
+def bench_gemini_context(args):
+    """Input tokens and latency with the fixed instruction inlined vs. registered as a cached context"""
+    manager = get_model_manager()
+    print(f"Model: {manager.switch_model(args.model)}")
+    if not manager.is_gemini_active():
+        print("Skipping: context caching only applies to Gemini models")
+        return
+
+    image_url = load_image_url(args.image)
+    instruction = create_coordinate_system_instruction()
+    manager.register_system_instruction(COORDINATE_CONTEXT, instruction)
+    turn_prompt = f"""User's current request: "{SAMPLE_REQUEST}"
+
+Analyze the screenshot and give the user just the next single step they should take.
+"""
+
+    modes = {
+        # Before: the whole instruction block is sent with every request
+        "inline": lambda: manager.call_model(image_url, f"{instruction}\n{turn_prompt}"),
+        # After: only the user turn and image, the instruction comes from the registered context
+        "context": lambda: manager.call_model(image_url, turn_prompt, context=COORDINATE_CONTEXT),
+    }
+
+    for mode, call in modes.items():
+        call()  # Warm-up call, also creates the cached context on first use
+        latencies, input_tokens, cached_tokens = [], [], []
+        for _ in range(args.runs):
+            manager.last_call_stats = {}
+            response = call()
+            stats = manager.last_call_stats
+            if stats.get('error'):
+                print(f"  {mode}: call failed: {stats['error']}")
+                continue
+            latencies.append(stats['latency'])
+            if stats.get('input_tokens') is not None:
+                input_tokens.append(stats['input_tokens'])
+            if stats.get('cached_tokens') is not None:
+                cached_tokens.append(stats['cached_tokens'])
+        print(f"  {mode:<8} latency: {format_samples(latencies, 's')}")
+        print(f"  {mode:<8} input tokens: {format_samples(input_tokens)}")
+        print(f"  {mode:<8} cached tokens: {format_samples(cached_tokens)}")
+
+class SilentPlayback:
+    """Playback handle stand-in that discards audio, so benchmarks don't need a sound device"""
+    active = True
+
+    def enqueue(self, pcm_bytes):
+        pass
+
+def bench_tts_first_audio(args):
+    """Time from sending the request until the first audio is ready to play"""
+    manager = get_model_manager()
+    print(f"Model: {manager.switch_model(args.model)}")
+    manager.register_system_instruction(COORDINATE_CONTEXT, create_coordinate_system_instruction())
+    image_url = load_image_url(args.image)
+    context = COORDINATE_CONTEXT if manager.is_gemini_active() else None
+    prompt = f'User\'s current request: "{SAMPLE_REQUEST}"\n'
+
+    def whole_response():
+        # Before: wait for the whole answer, then synthesize it in one request
+        start_time = time.perf_counter()
+        response = manager.call_model(image_url, prompt, context=context)
+        OpenAITTS().synthesize(simplify_for_speech(response)[:MAX_SPOKEN_CHARS], "alloy")
+        return time.perf_counter() - start_time
+
+    def streamed_sentences(use_cache=False):
+        # After: stream the answer and synthesize sentence by sentence
+        pipeline = TTSPipeline(playback=SilentPlayback(), use_cache=use_cache)
+        for chunk in manager.stream_model(image_url, prompt, context=context):
+            pipeline.feed(chunk)
+        pipeline.finish()
+        pipeline.wait()
+        return pipeline.time_to_first_audio
+
+    modes = (
+        ("whole", whole_response),
+        ("streamed", streamed_sentences),
+        # Repeated sentences come from the audio cache instead of being synthesized again
+        ("cached", lambda: streamed_sentences(use_cache=True)),
+    )
+    for mode, run in modes:
+        samples = [sample for sample in (run() for _ in range(args.runs)) if sample is not None]
+        print(f"  {mode:<8} time to first audio: {format_samples(samples, 's')}")
+
+SPEECH_SAMPLES = ["Click the Mail icon.", "Open the Mail app in the dock at the bottom of your screen, then select the inbox."]
+
+def pcm_to_wav(pcm_bytes, sample_rate=TTS_SAMPLE_RATE):
+    """Wrap 16-bit mono PCM in a WAV container"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        wf.writeframes(pcm_bytes)
+    return buffer.getvalue()
+
+def bench_speech_backends(args):
+    """Latency of each installed speech backend, and which one the selector picks"""
+    selector = SpeechBackendSelector()
+    selector.force_offline = args.offline
+    online = selector.is_online()
+    print(f"Online: {online}")
+
+    def usable(backend):
+        return backend.is_available() and (backend.is_local or online)
+
+    # Synthesized samples double as STT input
+    recordings = []
+    for backend in selector.tts_backends:
+        if not usable(backend):
+            print(f"  tts {backend.name:<16} unavailable")
+            continue
+        latencies = []
+        for _ in range(args.runs):
+            for text in SPEECH_SAMPLES:
+                start_time = time.perf_counter()
+                pcm_bytes = backend.synthesize(text, "alloy")
+                latencies.append(time.perf_counter() - start_time)
+                if pcm_bytes and len(recordings) < len(SPEECH_SAMPLES):
+                    recordings.append((text, pcm_bytes))
+        print(f"  tts {backend.name:<16} latency: {format_samples(latencies, 's')}")
+
+    for backend in selector.stt_backends:
+        if not usable(backend) or not recordings:
+            print(f"  stt {backend.name:<16} unavailable")
+            continue
+        latencies = []
+        for _ in range(args.runs):
+            for text, pcm_bytes in recordings:
+                start_time = time.perf_counter()
+                transcription = backend.transcribe(pcm_to_wav(pcm_bytes), "speech.wav")
+                latencies.append(time.perf_counter() - start_time)
+        print(f"  stt {backend.name:<16} latency: {format_samples(latencies, 's')} (last: {transcription!r})")
+
+    for audio_seconds in (1.5, 5.0, 15.0):
+        backend = selector.choose_stt(audio_seconds)
+        print(f"  selected stt for {audio_seconds:>4}s of audio: {backend.name if backend else 'none'}")
+    for text in SPEECH_SAMPLES:
+        backend = selector.choose_tts(text)
+        print(f"  selected tts for {len(text):>3} chars: {backend.name if backend else 'none'}")
+
+def bench_autonomous(args):
+    """Autonomous capture-act-verify loop on a simulated desktop with a stub model (no network)"""
+    # (stub model latency s, app render delay s) pairs: instant, and a realistic app and network
+    scenarios = [(0.0, 0.0), (0.8, 0.15)]
+    for model_latency, render_delay in scenarios:
+        totals, overheads = [], []
+        for _ in range(args.runs):
+            result, desktop = run_simulated(model_latency=model_latency, render_delay=render_delay)
+            if result.status != COMPLETE:
+                print(f"  run ended with {result.status}: {desktop.log}")
+                continue
+            totals.append(result.total_ms / 1000)
+            # Time per step that isn't the model or the app itself
+            overheads.extend((step['total'] - step['model'] - step['settle']) for step in result.steps)
+        label = f"model={model_latency}s render={render_delay}s"
+        print(f"  {label} task time: {format_samples(totals, 's')}")
+        print(f"  {label} loop overhead/step: {format_samples(overheads, 'ms')}")
+    print(result.format())
+
+# The same answers as free text and as structured output
+PARSING_SAMPLES = [
+    ("Click on the Mail app icon in the dock [912, 402, 968, 440].",
+     {"step_text": "Click on the Mail app icon in the dock.", "boxes": [{"label": "Mail icon", "box_2d": [912, 402, 968, 440]}],
+      "action": {"kind": "click"}, "is_complete": False}),
+    ("First, click the search field [40, 300, 70, 700], then type \"weather\" and press Enter.",
+     {"step_text": "Click the search field and type \"weather\".", "boxes": [{"label": "search field", "box_2d": [40, 300, 70, 700]}],
+      "action": {"kind": "type", "text": "weather"}, "is_complete": False}),
+    ("Great job! The task is complete, you're all set.",
+     {"step_text": "Great job! The task is complete, you're all set.", "boxes": [], "action": {"kind": "none"},
+      "is_complete": True}),
+]
+
+def bench_response_parsing(args):
+    """Time per response of the free-text parse (regex passes) and the structured one (one JSON decode)"""
+    width, height = 1440, 900
+    runs = max(args.runs, 1) * 200
+
+    def free_text(response):
+        boxes = parse_highlight_boxes(response, width, height)
+        return boxes, parse_action_plan(response, boxes), has_instruction(response), is_task_complete(response)
+
+    def structured(response):
+        step = parse_structured_response(response)
+        boxes = structured_boxes(step, width, height)
+        return boxes, structured_action_plan(step, boxes), step['is_complete']
+
+    for label, parse, responses in (("free text", free_text, [text for text, _ in PARSING_SAMPLES]),
+                                    ("structured", structured, [json.dumps(data) for _, data in PARSING_SAMPLES])):
+        samples = []
+        for _ in range(runs):
+            for response in responses:
+                start_time = time.perf_counter()
+                parse(response)
+                samples.append((time.perf_counter() - start_time) * 1000)
+        print(f"  {label}: {format_samples(samples, 'ms')}")
+
+# Registered benchmarks, run in this order
+BENCHMARKS = {
+    "gemini_context": bench_gemini_context,
+    "tts_first_audio": bench_tts_first_audio,
+    "speech_backends": bench_speech_backends,
+    "autonomous": bench_autonomous,
+    "response_parsing": bench_response_parsing,
+}
+
+def main():
+    """Main entry point"""
+    parser = argparse.ArgumentParser(description="AI Desktop Assistant benchmarks")
+    parser.add_argument("benchmarks", nargs="*", help=f"Benchmarks to run (default: all of {', '.join(BENCHMARKS)})")
+    parser.add_argument("--runs", type=int, default=5, help="Measured runs per benchmark mode")
+    parser.add_argument("--model", default="gemini-2.5-flash", help="Model type passed to ModelManager.switch_model")
+    parser.add_argument("--image", default=DEFAULT_IMAGE, help="Screenshot used for vision calls")
+    parser.add_argument("--offline", action="store_true", help="Only use local speech backends")
+    args = parser.parse_args()
+
+    selected = args.benchmarks or list(BENCHMARKS)
+    unknown = [name for name in selected if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"Unknown benchmark(s): {', '.join(unknown)}")
+
+    for name in selected:
+        print(f"\n=== {name} ===")
+        BENCHMARKS[name](args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import math
+import time
+
+import numpy as np
+
+# Search window around each side of a model box, as a fraction of the box size
+SEARCH_MARGIN = 0.35
+MIN_SEARCH_PIXELS = 6
+
+# Crops are subsampled so their longest side is at most this many pixels
+MAX_CROP_SIDE = 160
+
+# A side only snaps to an edge this much stronger than the crop's average edge line
+EDGE_STRENGTH_RATIO = 1.8
+
+# Snapped boxes must keep a similar size to the model's box
+MIN_AREA_RATIO = 0.35
+MAX_AREA_RATIO = 1.8
+
+def to_grayscale(pixels):
+    """Integer luma of a BGRA or BGR pixel array"""
+    pixels = pixels.astype(np.uint16)
+    return (pixels[..., 2] * 77 + pixels[..., 1] * 150 + pixels[..., 0] * 29) >> 8
+
+def _snap_side(profile, position, radius, threshold):
+    """Move a box side to the strongest edge within radius of its position, if strong enough"""
+    low = max(0, int(position - radius))
+    high = min(len(profile), int(position + radius) + 1)
+    if high <= low:
+        return position, False
+    peak = low + int(np.argmax(profile[low:high]))
+    if profile[peak] < threshold:
+        return position, False
+    # Index i of a pixel difference is the boundary in front of pixel i + 1
+    return peak + 1, True
+
+def snap_box_to_element(pixels, box):
+    """
+    Snap a box to the edges of the UI element under it
+
+    pixels: frame as an H x W x 4 (BGRA) or H x W x 3 array
+    box: (x, y, width, height) in frame pixels
+
+    Each side moves to the strongest intensity edge near it, measured along
+    the box's own span over a subsampled crop, so an icon's or button's real
+    outline replaces the model's approximate one. Returns the snapped
+    (x, y, width, height), or None when no side found a clear edge or the
+    result would change the box too much.
+    """
+    frame_height, frame_width = pixels.shape[:2]
+    x, y, width, height = box
+    if width < 2 or height < 2:
+        return None
+    margin_x = max(MIN_SEARCH_PIXELS, width * SEARCH_MARGIN)
+    margin_y = max(MIN_SEARCH_PIXELS, height * SEARCH_MARGIN)
+    crop_x1, crop_y1 = max(0, int(x - margin_x)), max(0, int(y - margin_y))
+    crop_x2, crop_y2 = min(frame_width, int(x + width + margin_x)), min(frame_height, int(y + height + margin_y))
+    if crop_x2 - crop_x1 < 4 or crop_y2 - crop_y1 < 4:
+        return None
+
+    step = max(1, math.ceil(max(crop_x2 - crop_x1, crop_y2 - crop_y1) / MAX_CROP_SIDE))
+    gray = to_grayscale(pixels[crop_y1:crop_y2:step, crop_x1:crop_x2:step]).astype(np.int16)
+    edges_x = np.abs(np.diff(gray, axis=1))  # Vertical edges, between columns
+    edges_y = np.abs(np.diff(gray, axis=0))  # Horizontal edges, between rows
+
+    # Box and search radius in crop coordinates
+    left, right = (x - crop_x1) / step, (x + width - crop_x1) / step
+    top, bottom = (y - crop_y1) / step, (y + height - crop_y1) / step
+    radius_x, radius_y = margin_x / step, margin_y / step
+
+    # Edge strength per column over the box's rows, and per row over its columns
+    column_profile = edges_x[max(0, int(top)):max(1, int(bottom))].sum(axis=0)
+    row_profile = edges_y[:, max(0, int(left)):max(1, int(right))].sum(axis=1)
+    column_threshold = max(1, column_profile.mean() * EDGE_STRENGTH_RATIO)
+    row_threshold = max(1, row_profile.mean() * EDGE_STRENGTH_RATIO)
+
+    new_left, snapped_left = _snap_side(column_profile, left - 1, min(radius_x, (right - left) / 2), column_threshold)
+    new_right, snapped_right = _snap_side(column_profile, right - 1, min(radius_x, (right - left) / 2), column_threshold)
+    new_top, snapped_top = _snap_side(row_profile, top - 1, min(radius_y, (bottom - top) / 2), row_threshold)
+    new_bottom, snapped_bottom = _snap_side(row_profile, bottom - 1, min(radius_y, (bottom - top) / 2), row_threshold)
+    if not (snapped_left or snapped_right or snapped_top or snapped_bottom):
+        return None
+    # Sides without a clear edge stay where the model put them
+    new_left = new_left if snapped_left else left
+    new_right = new_right if snapped_right else right
+    new_top = new_top if snapped_top else top
+    new_bottom = new_bottom if snapped_bottom else bottom
+
+    snapped = (int(crop_x1 + new_left * step), int(crop_y1 + new_top * step),
+               int((new_right - new_left) * step), int((new_bottom - new_top) * step))
+    if snapped[2] <= 0 or snapped[3] <= 0:
+        return None
+    area_ratio = (snapped[2] * snapped[3]) / (width * height)
+    if not MIN_AREA_RATIO <= area_ratio <= MAX_AREA_RATIO:
+        return None
+    return snapped
+
+def refine_boxes(boxes, pixels, scale_x=1.0, scale_y=1.0):
+    """
+    Snap parsed boxes (see response_parser) to UI elements in the captured frame
+
+    scale_x/scale_y convert screen coordinates to frame pixels (e.g. 2.0 on Retina).
+    Snapped boxes replace the keyword heuristics and are marked 'snapped';
+    the others are left as they are. Returns the time taken in milliseconds.
+    """
+    start_time = time.perf_counter()
+    for box in boxes:
+        model_x, model_y, model_width, model_height = box.get('model_box', (box['x'], box['y'], box['width'], box['height']))
+        snapped = snap_box_to_element(pixels, (model_x * scale_x, model_y * scale_y,
+                                               model_width * scale_x, model_height * scale_y))
+        if snapped:
+            box['x'], box['y'] = int(snapped[0] / scale_x), int(snapped[1] / scale_y)
+            box['width'], box['height'] = int(snapped[2] / scale_x), int(snapped[3] / scale_y)
+            box['snapped'] = True
+    return (time.perf_counter() - start_time) * 1000
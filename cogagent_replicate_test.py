@@ -15,6 +15,8 @@ import boto3
 from botocore.exceptions import NoCredentialsError, PartialCredentialsError, ClientError
 import uuid
 import pyautogui  # <-- Add PyAutoGUI import
+from action_engine import Action, perform_action, CLICK
+from coordinates import CoordinateTransform
 
 # Configure PyAutoGUI safety settings
 pyautogui.FAILSAFE = True  # Move mouse to upper-left corner to abort
@@ -245,52 +247,39 @@ def parse_grid_cell(output_text, is_llava=False):
     
     return None  # No grid cell found
 
-def perform_click_action(row_index, col_index, screenshot_width, screenshot_height):
+def perform_click_action(row_index, col_index, transform):
     """
     Convert grid cell coordinates to screen coordinates and perform a click.
     
     Args:
         row_index: Zero-based row index (A=0, B=1, etc.)
         col_index: Zero-based column index (1=0, 2=1, etc.)
-        screenshot_width: Width of the full screenshot in pixels
-        screenshot_height: Height of the full screenshot in pixels
+        transform: CoordinateTransform of the screenshot the grid was drawn on
     
     Returns:
         bool: True if successful, False otherwise
     """
     try:
-        # Get the screen dimensions
-        screen_width, screen_height = pyautogui.size()
-        
-        # Handle case where screenshot might be from different resolution
-        # If there's a mismatch, we need to scale coordinates
-        scale_x = screen_width / screenshot_width
-        scale_y = screen_height / screenshot_height
-        
-        # Calculate cell dimensions
-        cell_width = screenshot_width / GRID_COLS
-        cell_height = screenshot_height / GRID_ROWS
+        # Calculate cell dimensions (in screenshot pixels, physical on HiDPI screens)
+        cell_width = transform.frame_width / GRID_COLS
+        cell_height = transform.frame_height / GRID_ROWS
         
         # Calculate center of the grid cell (in screenshot coordinates)
         center_x_screenshot = (col_index * cell_width) + (cell_width / 2)
         center_y_screenshot = (row_index * cell_height) + (cell_height / 2)
         
-        # Scale to actual screen coordinates
-        target_x = center_x_screenshot * scale_x
-        target_y = center_y_screenshot * scale_y
+        # Map to screen coordinates (the ones pyautogui clicks in)
+        target_x, target_y, _, _ = transform.frame_to_screen(center_x_screenshot, center_y_screenshot)
         
-        # Safety guardrail to ensure coordinates are within screen
-        target_x = max(0, min(target_x, screen_width - 1))
-        target_y = max(0, min(target_y, screen_height - 1))
+        # Safety guardrail to ensure coordinates are within the captured screen
+        target_x = max(transform.left, min(target_x, transform.left + transform.width - 1))
+        target_y = max(transform.top, min(target_y, transform.top + transform.height - 1))
         
         # Log the action
         print(f"Moving mouse to coordinates: ({target_x}, {target_y})")
         
-        # Move the mouse to the position (with duration for visibility)
-        pyautogui.moveTo(target_x, target_y, duration=0.5)
-        
-        # Perform the click
-        pyautogui.click()
+        # Move the mouse (with the configured motion profile) and click
+        perform_action(Action(CLICK, x=target_x, y=target_y))
         
         return True
     except Exception as e:
@@ -320,6 +309,7 @@ class ScreenshotAnalyzerApp:
 
         self.original_img = None
         self.display_img_tk = None
+        self.capture_transform = None  # Where the screenshot sits on the screen
         self.screenshot_width = 0
         self.screenshot_height = 0
         self.display_width = 0
@@ -440,6 +430,7 @@ class ScreenshotAnalyzerApp:
                 # Capture the primary monitor
                 monitor = sct.monitors[1] # Index 1 is usually the primary monitor
                 sct_img = sct.grab(monitor)
+                self.capture_transform = CoordinateTransform.for_frame(monitor, sct_img.width, sct_img.height, 1)
                 # Save to PNG file
                 mss.tools.to_png(sct_img.rgb, sct_img.size, output=TEMP_SCREENSHOT_PATH)
 
@@ -875,9 +866,9 @@ class ScreenshotAnalyzerApp:
                 messagebox.showwarning("No Valid Coordinates", "No valid coordinates have been identified.")
                 return
             
-            # Get the coordinates
-            x = self.current_coords["x"]
-            y = self.current_coords["y"]
+            # Get the coordinates (screenshot pixels) in screen coordinates
+            x, y, _, _ = self.capture_transform.frame_to_screen(self.current_coords["x"], self.current_coords["y"])
+            x, y = int(x), int(y)
             self.update_status("Executing action (Direct Mode)...")
             
             # Ask for confirmation before performing the click
@@ -888,18 +879,14 @@ class ScreenshotAnalyzerApp:
             
             # Perform the click action at exact coordinates
             try:
-                # Get screen dimensions
-                screen_width, screen_height = pyautogui.size()
-                
                 # Safety check
-                if x < 0 or x >= screen_width or y < 0 or y >= screen_height:
+                if not self.capture_transform.contains(x, y):
                     self.update_status(f"Error: Coordinates ({x}, {y}) are outside screen bounds.")
                     return
                 
                 # Move the mouse directly to the specified position
                 print(f"Moving mouse to direct coordinates: ({x}, {y})")
-                pyautogui.moveTo(x, y, duration=0.5)
-                pyautogui.click()
+                perform_action(Action(CLICK, x=x, y=y))
                 self.update_status("Action executed successfully.")
             except Exception as e:
                 self.update_status(f"Action execution failed: {e}")
@@ -921,7 +908,7 @@ class ScreenshotAnalyzerApp:
                 return
             
             # Perform the click action
-            if perform_click_action(row_index, col_index, self.screenshot_width, self.screenshot_height):
+            if perform_click_action(row_index, col_index, self.capture_transform):
                 self.update_status("Action executed successfully.")
             else:
                 self.update_status("Action execution failed. Check console for errors.")
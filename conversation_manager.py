@@ -0,0 +1,279 @@
+import os
+import re
+import json
+import time
+
+from keyword_matcher import KeywordMatcher
+from intent_classifier import load_intent_classifier
+
+# Fixed phrases added to educational responses (also pre-synthesized for speech)
+WHAT_IS_CLOSING_NOTE = "I hope that helps explain it clearly! Feel free to ask if you have any other questions."
+VISUAL_GUIDANCE_NOTE = "I've highlighted elements on your screen to help you visualize what I'm explaining. This should make it easier to follow along!"
+
+# Arabic-script characters (Urdu, Arabic) for language detection
+ARABIC_SCRIPT_PATTERN = re.compile('[\u0600-\u06FF]')
+
+class ConversationManager:
+    """
+    Manages conversation context, educational content, and intent recognition.
+    Helps provide appropriate responses for users with limited computer knowledge.
+    """
+    def __init__(self):
+        # Conversation history
+        self.conversation_history = []
+        
+        # Current detected language (default to English)
+        self.detected_language = "en"
+        
+        # Map of question types and intents
+        self.intent_keywords = {
+            "how_to": ["how do i", "how to", "how can i", "steps to", "guide for"],
+            "what_is": ["what is", "what are", "explain", "meaning of", "definition of"],
+            "where_is": ["where is", "find", "locate", "show me", "position of"],
+            "when_to": ["when should i", "when to", "best time to"],
+            "why_use": ["why should i", "why use", "purpose of", "benefit of"],
+            "chat": [
+                "hello", "hi", "hey", "greetings", "good morning", "good afternoon", "good evening",
+                "how are you", "how's it going", "what's up",
+                "thank you", "thanks", "great", "cool", "awesome", "ok", "okay",
+                "tell me a joke", "tell me something interesting", "can you chat", "let's talk",
+                "what's the weather", "what time is it", "who are you", "what is your name",
+                "bye", "goodbye", "see you later"
+            ]
+        }
+        
+        # Map of common UI elements and descriptions for education
+        self.ui_elements = {
+            "dock": "The Dock is a bar of icons at the bottom of your Mac screen that gives you quick access to frequently used apps and documents.",
+            "menu bar": "The Menu Bar at the top of your screen contains menus like File, Edit, and View, plus status icons on the right.",
+            "finder": "Finder is a file management application that helps you navigate and organize files on your Mac.",
+            "spotlight": "Spotlight is a quick search feature on Mac that helps you find apps, documents, and information.",
+            "mail": "Mail is the default email application on your Mac that helps you send, receive and manage emails.",
+            "safari": "Safari is the default web browser on your Mac that lets you access the internet and browse websites.",
+            "system preferences": "System Preferences lets you customize settings on your Mac, like display, sound, and user accounts.",
+            "desktop": "The Desktop is the main screen you see when your Mac is running, where you can store files and access applications.",
+            "folder": "Folders help you organize and store files on your computer.",
+            "window": "Windows are rectangular areas on your screen that display apps, documents, or other content.",
+            "button": "Buttons are interactive elements you can click to perform actions.",
+            "icon": "Icons are small images that represent applications, files, or functions on your computer."
+        }
+        
+        # Common words used to guess the user's language (Arabic-script text is detected separately)
+        self.language_markers = {
+            "ur": ["کیسے", "ہے", "میں", "کیا"],
+            "de": ["wie", "ist", "und", "ich", "der", "das", "ein", "eine"]
+        }
+        
+        # Always apply visual cues flag
+        self.always_visual = True
+        
+        # Extra keyword packs listed in KEYWORD_PACKS (files or directories, separated by os.pathsep)
+        for pack_path in filter(None, os.getenv("KEYWORD_PACKS", "").split(os.pathsep)):
+            self.load_keyword_pack(pack_path, rebuild=False)
+        
+        # Single matcher for intents, UI elements and language markers
+        self.keyword_matcher = self._build_keyword_matcher()
+        
+        # Optional local classifier that pre-routes queries before keyword matching
+        self.intent_classifier = load_intent_classifier(os.getenv("INTENT_CLASSIFIER_PATH"))
+        self.classifier_min_confidence = float(os.getenv("INTENT_CLASSIFIER_MIN_CONFIDENCE", "0.6"))
+        self.visual_probability_threshold = 0.5
+        
+        # Optional JSONL log of turns, used to train the intent classifier
+        self.turn_log_path = os.getenv("INTENT_LOG_PATH")
+    
+    def _build_keyword_matcher(self):
+        """Compile all keyword vocabularies into one multi-pattern matcher"""
+        matcher = KeywordMatcher()
+        # Priority follows dictionary order, so earlier intents win as before
+        for priority, (intent, keywords) in enumerate(self.intent_keywords.items()):
+            for keyword in keywords:
+                # Verbs also match their inflections ("finding", "located"); chat words are left exact
+                matcher.add(keyword, "intent", intent, priority, inflect=intent != "chat")
+        for priority, element in enumerate(self.ui_elements):
+            matcher.add(element, "element", element, priority, plural=True)  # "icons", "windows"...
+        for priority, (language, markers) in enumerate(self.language_markers.items()):
+            for marker in markers:
+                matcher.add(marker, "language", language, priority)
+        matcher.build()
+        return matcher
+    
+    def load_keyword_pack(self, path, rebuild=True):
+        """
+        Merge keyword packs from a JSON file (or every .json file in a directory).
+        
+        A pack may contain any of:
+            {"intent_keywords": {"how_to": ["..."]},
+             "ui_elements": {"launchpad": "Description..."},
+             "language_markers": {"fr": ["comment", "est"]}}
+        New intents and languages rank after the built-in ones.
+        """
+        if os.path.isdir(path):
+            for file_name in sorted(os.listdir(path)):
+                if file_name.endswith(".json"):
+                    self.load_keyword_pack(os.path.join(path, file_name), rebuild=False)
+        else:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    pack = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Error loading keyword pack {path}: {e}")
+                return
+            
+            for intent, keywords in pack.get("intent_keywords", {}).items():
+                existing = self.intent_keywords.setdefault(intent, [])
+                existing.extend(keyword for keyword in keywords if keyword not in existing)
+            self.ui_elements.update(pack.get("ui_elements", {}))
+            for language, markers in pack.get("language_markers", {}).items():
+                existing = self.language_markers.setdefault(language, [])
+                existing.extend(marker for marker in markers if marker not in existing)
+            print(f"Loaded keyword pack: {path}")
+        
+        if rebuild:
+            self.keyword_matcher = self._build_keyword_matcher()
+        
+    def add_message(self, role, content):
+        """Add a message to the conversation history"""
+        self.conversation_history.append({"role": role, "content": content})
+        
+    def get_last_messages(self, count=5):
+        """Get the last n messages from conversation history"""
+        return self.conversation_history[-count:] if len(self.conversation_history) >= count else self.conversation_history
+        
+    def clear_history(self):
+        """Clear conversation history"""
+        self.conversation_history = []
+    
+    def set_always_visual(self, value):
+        """Set whether to always apply visual cues"""
+        self.always_visual = value
+        
+    def analyze_query(self, user_query):
+        """
+        Scan the query once for intent keywords, UI elements and language markers
+        Returns the best intent, mentioned elements and language hints
+        """
+        matches = self.keyword_matcher.match(user_query)
+        intents = matches.get("intent", [])
+        return {
+            "intent": intents[0] if intents else "general",
+            "mentioned_elements": matches.get("element", []),
+            "language_hints": matches.get("language", [])
+        }
+    
+    def detect_language(self, text, language_hints=None):
+        """
+        Detect the language of the input text.
+        Returns language code (e.g., 'en', 'ur', 'de')
+        """
+        if language_hints is None:
+            language_hints = self.analyze_query(text)["language_hints"]
+        
+        # Check for common Urdu/Arabic script characters
+        if ARABIC_SCRIPT_PATTERN.search(text):
+            if "ur" in language_hints:
+                return "ur"  # Urdu
+            return "ar"  # Default to Arabic for Arabic script
+        
+        # Otherwise the highest priority marker language (e.g. German), if any
+        for language in language_hints:
+            if language != "ur":
+                return language
+        
+        # Default to English
+        return "en"
+        
+    def detect_intent(self, user_query):
+        """
+        Detect the user's intent based on their query
+        Returns intent type, whether visual guidance is likely needed and the detected language
+        """
+        analysis = self.analyze_query(user_query)
+        detected_intent = analysis["intent"]
+        mentioned_elements = analysis["mentioned_elements"]
+        needs_visual_probability = None
+        
+        # Prefer the local classifier when it is confident, keywords otherwise
+        prediction = self.intent_classifier.predict(user_query) if self.intent_classifier else None
+        if prediction and prediction["intent_confidence"] >= self.classifier_min_confidence:
+            detected_intent = prediction["primary_intent"]
+            needs_visual_probability = prediction["needs_visual_probability"]
+            needs_visual = needs_visual_probability >= self.visual_probability_threshold
+        # Determine if visual guidance is needed
+        # Visuals are needed for task-oriented intents, not for "chat" or some "what_is"
+        elif detected_intent == "chat":
+            needs_visual = False
+        elif detected_intent == "what_is":
+            # For "what_is", only a question about a UI element might need visual
+            # Otherwise it's likely a general knowledge "what is" question
+            needs_visual = bool(mentioned_elements)
+        else:
+            needs_visual = True  # Default to True for other intents (how_to, where_is etc.)
+        
+        return {
+            "primary_intent": detected_intent,
+            "needs_visual": needs_visual,
+            "needs_visual_probability": needs_visual_probability,
+            "mentioned_elements": mentioned_elements,
+            "language": self.detect_language(user_query, analysis["language_hints"])
+        }
+    
+    def log_turn(self, user_query, intent_data, response, had_box=None):
+        """
+        Append a turn to the training log (if INTENT_LOG_PATH is set).
+        Predictions and labels are kept apart, so training doesn't learn the detector's own
+        mistakes: predicted_intent and predicted_needs_visual are what was detected, and the
+        intent label is left empty (null) for annotation. had_box records whether the response
+        contained a box, and the needs_visual label is that outcome for turns answered with a
+        screenshot; turns answered without one can't show whether a screenshot would have
+        helped, so their label is left empty too.
+        had_box is found in the response text unless given (structured responses keep
+        their boxes apart from the text).
+        """
+        if not self.turn_log_path or intent_data.get("primary_intent") == "next_step_follow_up":
+            return
+        
+        predicted = intent_data.get("needs_visual")
+        if had_box is None:
+            had_box = bool(response and re.search(r"\[[\d\.,\s]+\]", response))
+        record = {
+            "text": user_query,
+            "intent": None,
+            "predicted_intent": intent_data.get("primary_intent", "general"),
+            "needs_visual": had_box if predicted else None,
+            "predicted_needs_visual": predicted,
+            "had_box": had_box,
+            "timestamp": time.time()
+        }
+        try:
+            with open(self.turn_log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"Error logging turn: {e}")
+    
+    def create_educational_response(self, intent_data, ai_response):
+        """
+        Enhance the AI response with educational content based on intent
+        """
+        enhanced_response = ai_response
+        
+        # Add educational content about UI elements mentioned
+        if intent_data["mentioned_elements"]:
+            educational_info = []
+            for element in intent_data["mentioned_elements"]:
+                if element in self.ui_elements:
+                    educational_info.append(f"**{element.title()}**: {self.ui_elements[element]}")
+            
+            if educational_info:
+                enhanced_response += "\n\n📚 Learn More:\n" + "\n".join(educational_info)
+        
+        # For "what_is" questions, add more background when relevant
+        if intent_data["primary_intent"] == "what_is":
+            # Add general computer literacy information if no specific elements mentioned
+            if not intent_data["mentioned_elements"]:
+                enhanced_response += "\n\n" + WHAT_IS_CLOSING_NOTE
+        
+        # Add visual guidance encouragement for all responses
+        enhanced_response += "\n\n" + VISUAL_GUIDANCE_NOTE
+            
+        return enhanced_response
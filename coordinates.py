@@ -0,0 +1,137 @@
+import platform
+
+import numpy as np
+
+# Coordinate spaces
+MODEL = "model"  # Normalized to 0-1000 over the uploaded image (Gemini boxes)
+UPLOAD = "upload"  # Pixels of the image sent to the model
+FRAME = "frame"  # Pixels of the captured frame (physical pixels on HiDPI screens)
+SCREEN = "screen"  # Global desktop coordinates, as used by mss monitors and pyautogui
+
+class CoordinateTransform:
+    """
+    Where a captured frame sits on the desktop, and how its spaces relate.
+
+    A capture covers an area of the (possibly multi-monitor) desktop in
+    screen coordinates (the space of mss monitors and pyautogui: points on
+    macOS, pixels elsewhere): left, top, width and height. Its frame can
+    have more pixels than that (Retina), and the image uploaded to the
+    model can have fewer (downscaled before upload). Every space is an
+    axis-aligned scaling of the captured area, so one transform converts
+    boxes between model, upload, frame and screen coordinates, one at a
+    time or as whole arrays. Overlays map screen coordinates to their own
+    logical window coordinates with screen_to_overlay().
+    """
+    __slots__ = ('left', 'top', 'width', 'height', 'frame_width', 'frame_height',
+                 'upload_width', 'upload_height', 'monitor')
+
+    def __init__(self, left, top, width, height, frame_width=None, frame_height=None,
+                 upload_width=None, upload_height=None, monitor=None):
+        self.left = left
+        self.top = top
+        self.width = width
+        self.height = height
+        self.frame_width = frame_width or width
+        self.frame_height = frame_height or height
+        self.upload_width = upload_width or self.frame_width
+        self.upload_height = upload_height or self.frame_height
+        self.monitor = monitor  # mss monitor index (0 is the stitched virtual desktop)
+
+    @classmethod
+    def for_frame(cls, monitor, frame_width, frame_height, index=None):
+        """Transform of a frame captured from an mss monitor dict"""
+        return cls(monitor['left'], monitor['top'], monitor['width'], monitor['height'],
+                   frame_width, frame_height, monitor=index)
+
+    @property
+    def scale_x(self):
+        """Frame pixels per screen unit (the device pixel ratio of a single HiDPI monitor)"""
+        return self.frame_width / self.width
+
+    @property
+    def scale_y(self):
+        return self.frame_height / self.height
+
+    def _space_scale(self, space):
+        """Units of a space per screen unit, along x and y"""
+        if space == SCREEN:
+            return 1.0, 1.0
+        if space == FRAME:
+            return self.frame_width / self.width, self.frame_height / self.height
+        if space == UPLOAD:
+            return self.upload_width / self.width, self.upload_height / self.height
+        if space == MODEL:
+            return 1000 / self.width, 1000 / self.height
+        raise ValueError(f"Unknown coordinate space: {space}")
+
+    def convert(self, boxes, source, target):
+        """
+        Convert an N x 4 array of (x, y, width, height) boxes, or N x 2 points,
+        from one space to another in one vectorized step
+        """
+        boxes = np.asarray(boxes, dtype=np.float64)
+        source_x, source_y = self._space_scale(source)
+        target_x, target_y = self._space_scale(target)
+        factor = np.array([target_x / source_x, target_y / source_y] * (boxes.shape[-1] // 2))
+        converted = boxes * factor
+        # Positions (not sizes) also move between the captured area and the desktop
+        if source == SCREEN:
+            converted[..., 0] -= self.left * target_x
+            converted[..., 1] -= self.top * target_y
+        if target == SCREEN:
+            converted[..., 0] += self.left
+            converted[..., 1] += self.top
+        return converted
+
+    def contains(self, x, y):
+        return self.left <= x < self.left + self.width and self.top <= y < self.top + self.height
+
+    def _convert_one(self, x, y, width, height, source, target):
+        return tuple(float(value) for value in self.convert((x, y, width, height), source, target))
+
+    def screen_to_frame(self, x, y, width=0, height=0):
+        """Global screen box -> frame pixel box"""
+        return self._convert_one(x, y, width, height, SCREEN, FRAME)
+
+    def frame_to_screen(self, x, y, width=0, height=0):
+        """Frame pixel box -> global screen box"""
+        return self._convert_one(x, y, width, height, FRAME, SCREEN)
+
+    def upload_to_screen(self, x, y, width=0, height=0):
+        """Box in pixels of the uploaded image -> global screen box"""
+        return self._convert_one(x, y, width, height, UPLOAD, SCREEN)
+
+    def screen_to_model(self, x, y, width, height):
+        """Global screen box -> Gemini box [y_min, x_min, y_max, x_max] normalized to 0-1000"""
+        return [round((y - self.top) * 1000 / self.height), round((x - self.left) * 1000 / self.width),
+                round((y + height - self.top) * 1000 / self.height), round((x + width - self.left) * 1000 / self.width)]
+
+    def boxes_to_screen(self, boxes):
+        """Move parsed boxes (see response_parser, parsed with this width and height) to global coordinates"""
+        for box in boxes:
+            box['x'] += self.left
+            box['y'] += self.top
+            if 'model_box' in box:
+                x, y, width, height = box['model_box']
+                box['model_box'] = (x + self.left, y + self.top, width, height)
+        return boxes
+
+    def __repr__(self):
+        return (f"CoordinateTransform({self.left}, {self.top}, {self.width}x{self.height}, "
+                f"frame {self.frame_width}x{self.frame_height}, upload {self.upload_width}x{self.upload_height})")
+
+def overlay_scale(device_pixel_ratio):
+    """
+    Screen units per logical overlay unit on a screen. macOS screen
+    coordinates are already logical points; elsewhere they are pixels, and
+    Qt's logical coordinates are smaller by the device pixel ratio.
+    """
+    return 1.0 if platform.system() == "Darwin" else device_pixel_ratio
+
+def screen_to_overlay(x, y, width, height, screen_left, screen_top, scale):
+    """
+    Global screen box -> box in an overlay window covering one screen.
+    Qt keeps each screen's top-left at its native position and scales
+    within the screen, so the offset is removed before scaling.
+    """
+    return (x - screen_left) / scale, (y - screen_top) / scale, width / scale, height / scale
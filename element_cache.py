@@ -0,0 +1,153 @@
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from box_refiner import to_grayscale
+from element_index import normalize_name
+from spatial_index import SpatialIndex
+
+# Patches are stored downsampled so their longest side is at most this many pixels
+MAX_PATCH_SIDE = 48
+MIN_DOWNSAMPLE = 2
+
+# Verification
+SEARCH_RADIUS = 6  # Downsampled pixels the element may have moved
+MATCH_THRESHOLD = 0.9  # Minimum normalized cross-correlation
+MIN_PATCH_CONTRAST = 4.0  # Flat patches can't be verified, so they aren't cached
+
+MAX_ENTRIES = 64
+
+class CachedElement:
+    """A located element: its box in frame pixels and a downsampled grayscale patch of it"""
+    __slots__ = ('box', 'patch', 'factor')
+
+    def __init__(self, box, patch, factor):
+        self.box = box
+        self.patch = patch
+        self.factor = factor
+
+def _patch_factor(width, height):
+    return max(MIN_DOWNSAMPLE, math.ceil(max(width, height) / MAX_PATCH_SIDE))
+
+def _gray_region(pixels, x1, y1, x2, y2, factor):
+    return to_grayscale(pixels[y1:y2:factor, x1:x2:factor]).astype(np.float32)
+
+def best_match(region, patch):
+    """
+    Normalized cross-correlation of a patch at every position in a region
+    Returns (score, dx, dy) of the best position
+    """
+    patch_height, patch_width = patch.shape
+    if region.shape[0] < patch_height or region.shape[1] < patch_width:
+        return -1.0, 0, 0
+    centered = patch - patch.mean()
+    patch_norm = np.sqrt((centered * centered).sum())
+    windows = sliding_window_view(region, patch.shape)
+    count = patch.size
+    window_sums = windows.sum(axis=(2, 3))
+    window_squares = (windows * windows).sum(axis=(2, 3))
+    window_norms = np.sqrt(np.maximum(window_squares - window_sums * window_sums / count, 1e-6))
+    # The centered patch sums to zero, so window means don't affect the numerator
+    scores = np.einsum('ijkl,kl->ij', windows, centered) / (window_norms * patch_norm)
+    dy, dx = np.unravel_index(int(np.argmax(scores)), scores.shape)
+    return float(scores[dy, dx]), int(dx), int(dy)
+
+class ElementCache:
+    """
+    Cache of elements the model has located, verified by template matching.
+
+    Entries are keyed by element name and frame size. A lookup checks the
+    stored patch against the new frame around the stored position (a
+    downsampled normalized cross-correlation over a few pixels), returns the
+    box, shifted if the element moved slightly, when it still matches, and
+    drops the entry when it doesn't.
+    """
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # (name, frame width, frame height) -> CachedElement
+        self.spatial = SpatialIndex()  # Entry key -> box, to drop entries where the screen changed
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(name, pixels):
+        return (" ".join(normalize_name(name)), pixels.shape[1], pixels.shape[0])
+
+    def store(self, name, pixels, box):
+        """Remember an element located in a frame; box is (x, y, width, height) in frame pixels"""
+        x, y, width, height = [int(v) for v in box]
+        x1, y1 = max(0, x), max(0, y)
+        x2, y2 = min(pixels.shape[1], x + width), min(pixels.shape[0], y + height)
+        if x2 - x1 < 4 or y2 - y1 < 4:
+            return False
+        factor = _patch_factor(x2 - x1, y2 - y1)
+        patch = _gray_region(pixels, x1, y1, x2, y2, factor)
+        if min(patch.shape) < 2 or patch.std() < MIN_PATCH_CONTRAST:
+            return False
+        with self.lock:
+            key = self.make_key(name, pixels)
+            self.entries[key] = CachedElement((x1, y1, x2 - x1, y2 - y1), patch, factor)
+            self.entries.move_to_end(key)
+            self.spatial.insert(key, x1, y1, x2 - x1, y2 - y1)
+            while len(self.entries) > self.max_entries:
+                evicted, _ = self.entries.popitem(last=False)
+                self.spatial.remove(evicted)
+        return True
+
+    def lookup(self, name, pixels):
+        """Box of a cached element in this frame (frame pixels), or None; failed entries are invalidated"""
+        key = self.make_key(name, pixels)
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        x, y, width, height = entry.box
+        factor = entry.factor
+        margin = SEARCH_RADIUS * factor
+        region_x1, region_y1 = max(0, x - margin), max(0, y - margin)
+        region_x2 = min(pixels.shape[1], x + width + margin)
+        region_y2 = min(pixels.shape[0], y + height + margin)
+        region = _gray_region(pixels, region_x1, region_y1, region_x2, region_y2, factor)
+        score, dx, dy = best_match(region, entry.patch)
+
+        with self.lock:
+            if score < MATCH_THRESHOLD:
+                self.entries.pop(key, None)
+                self.spatial.remove(key)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+        return (region_x1 + dx * factor, region_y1 + dy * factor, width, height)
+
+    def invalidate(self, name=None):
+        """Drop one element (all frame sizes), or everything"""
+        with self.lock:
+            if name is None:
+                self.entries.clear()
+                self.spatial.clear()
+                return
+            normalized = " ".join(normalize_name(name))
+            for key in [key for key in self.entries if key[0] == normalized]:
+                del self.entries[key]
+                self.spatial.remove(key)
+
+    def invalidate_region(self, x, y, width, height, frame_size=None):
+        """
+        Drop the elements overlapping an area (frame pixels) that is about to change,
+        e.g. where a click landed. frame_size (width, height) limits it to one frame size.
+        Returns the number of entries dropped.
+        """
+        with self.lock:
+            keys = [key for key in self.spatial.query_rect(x, y, width, height)
+                    if frame_size is None or key[1:] == tuple(frame_size)]
+            for key in keys:
+                self.entries.pop(key, None)
+                self.spatial.remove(key)
+        return len(keys)
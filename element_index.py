@@ -0,0 +1,247 @@
+import os
+import re
+import json
+import time
+import platform
+import threading
+
+# Refresh policy
+REFRESH_INTERVAL = 5.0  # seconds before an application's elements are walked again
+MAX_APPS_PER_REFRESH = 3  # applications re-walked per refresh, oldest first
+
+# Limits of one accessibility tree walk
+MAX_TREE_DEPTH = 12
+MAX_ELEMENTS_PER_APP = 3000
+
+# Target of a "where is X" question
+WHERE_IS_PATTERN = re.compile(
+    r"(?:where(?:'s| is| are)|find|locate|show me|position of)\s+(?:the\s+|my\s+|a\s+)?(.+?)[\s?.!]*$",
+    re.IGNORECASE)
+
+def normalize_name(text):
+    return re.sub(r'[^\w\s]', ' ', (text or "").lower()).split()
+
+def extract_target(query):
+    """The element a "where is X" question asks about, or None"""
+    match = WHERE_IS_PATTERN.search(query.strip())
+    if not match:
+        return None
+    target = re.sub(r'\s+(?:icon|app|application|button)$', '', match.group(1).strip(), flags=re.IGNORECASE)
+    return target or None
+
+class ScreenElement:
+    """An on-screen element reported by an accessibility provider (screen coordinates)"""
+    __slots__ = ('name', 'role', 'x', 'y', 'width', 'height', 'app')
+
+    def __init__(self, name, role, x, y, width, height, app=None):
+        self.name = name
+        self.role = role
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.app = app
+
+    @property
+    def signature(self):
+        return (self.name, self.role, self.x, self.y, self.width, self.height)
+
+    def __repr__(self):
+        return f"ScreenElement({self.name!r}, {self.role!r}, {self.x}, {self.y}, {self.width}, {self.height})"
+
+class ElementProvider:
+    """
+    Source of on-screen elements, grouped by application so the index can
+    refresh one application at a time.
+    """
+    name = "none"
+
+    def is_available(self):
+        return False
+
+    def list_applications(self):
+        """Return {app key: app handle} for the running applications (must be cheap)"""
+        return {}
+
+    def list_elements(self, app_key, app):
+        """Return the visible ScreenElements of one application"""
+        return []
+
+class AtspiElementProvider(ElementProvider):
+    """Linux accessibility tree via AT-SPI (the optional pyatspi package)"""
+    name = "atspi"
+
+    def __init__(self):
+        try:
+            import pyatspi
+            self.pyatspi = pyatspi
+        except ImportError:
+            self.pyatspi = None
+
+    def is_available(self):
+        return self.pyatspi is not None
+
+    def list_applications(self):
+        desktop = self.pyatspi.Registry.getDesktop(0)
+        applications = {}
+        for app in desktop:
+            if app is not None:
+                applications[f"{app.name}:{app.get_process_id()}"] = app
+        return applications
+
+    def list_elements(self, app_key, app):
+        pyatspi = self.pyatspi
+        elements = []
+        stack = [(app, 0)]
+        while stack and len(elements) < MAX_ELEMENTS_PER_APP:
+            node, depth = stack.pop()
+            try:
+                states = node.getState()
+                if node is not app and not states.contains(pyatspi.STATE_SHOWING):
+                    continue  # Hidden subtree
+                if node.name:
+                    extents = node.queryComponent().getExtents(pyatspi.DESKTOP_COORDS)
+                    if extents.width > 0 and extents.height > 0:
+                        elements.append(ScreenElement(node.name, node.getRoleName(), extents.x, extents.y,
+                                                      extents.width, extents.height, app_key))
+                if depth < MAX_TREE_DEPTH:
+                    stack.extend((child, depth + 1) for child in node if child is not None)
+            except Exception:
+                continue  # Elements can disappear while being walked
+        return elements
+
+class FakeElementProvider(ElementProvider):
+    """
+    Fixed elements, for tests and for trying the index without accessibility
+    support. Elements are grouped by their app (default "fake").
+    """
+    name = "fake"
+
+    def __init__(self, elements=None):
+        self.elements = list(elements or [])
+
+    @classmethod
+    def from_json(cls, path):
+        """Load elements from a JSON list of {name, role, x, y, width, height[, app]}"""
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(ScreenElement(e["name"], e.get("role", ""), e["x"], e["y"], e["width"], e["height"],
+                                     e.get("app", "fake")) for e in json.load(f))
+
+    def is_available(self):
+        return True
+
+    def list_applications(self):
+        return {element.app or "fake": None for element in self.elements}
+
+    def list_elements(self, app_key, app):
+        return [element for element in self.elements if (element.app or "fake") == app_key]
+
+def create_element_provider():
+    """
+    Provider selected by ELEMENT_INDEX: "atspi", "none", or a JSON file of fake
+    elements. By default AT-SPI is used on Linux when available.
+    """
+    setting = os.getenv("ELEMENT_INDEX", "").strip()
+    if setting.lower() == "none":
+        return None
+    if setting and setting.lower() != "atspi":
+        return FakeElementProvider.from_json(setting)
+    if setting.lower() == "atspi" or platform.system() == "Linux":
+        provider = AtspiElementProvider()
+        if provider.is_available():
+            return provider
+    return None
+
+class ElementIndex:
+    """
+    Index of on-screen elements by name and role.
+
+    refresh() re-walks at most a few applications per call (new ones first,
+    then the least recently walked), so the index stays current without a
+    full accessibility tree walk per request. find() resolves a name such as
+    "Safari" or "menu bar" to the best matching element. Only one refresh
+    runs at a time; a refresh requested meanwhile (e.g. by a request while the
+    startup walk is still going) is skipped and find() uses the index as is.
+    """
+    def __init__(self, provider, refresh_interval=REFRESH_INTERVAL, max_apps_per_refresh=MAX_APPS_PER_REFRESH):
+        self.provider = provider
+        self.refresh_interval = refresh_interval
+        self.max_apps_per_refresh = max_apps_per_refresh
+        self.app_elements = {}  # App key -> list of ScreenElements
+        self.app_walked_at = {}  # App key -> time of the last walk
+        self.by_word = {}  # Name or role word -> set of (app key, element index)
+        self.lock = threading.Lock()
+        self.refresh_lock = threading.Lock()  # Held for the whole of a refresh
+
+    def refresh(self, force=False):
+        """
+        Bring the index up to date. Returns the number of applications re-walked
+        (0 when another refresh is already in progress).
+        """
+        if not self.refresh_lock.acquire(blocking=False):
+            return 0
+        try:
+            return self._refresh(force)
+        finally:
+            self.refresh_lock.release()
+
+    def _refresh(self, force):
+        applications = self.provider.list_applications()
+        now = time.time()
+        with self.lock:
+            for app_key in [key for key in self.app_elements if key not in applications]:
+                self._drop_app(app_key)
+
+        due = [key for key in applications
+               if force or now - self.app_walked_at.get(key, 0) >= self.refresh_interval]
+        due.sort(key=lambda key: self.app_walked_at.get(key, 0))
+        if not force:
+            due = due[:self.max_apps_per_refresh]
+
+        for app_key in due:
+            elements = self.provider.list_elements(app_key, applications[app_key])
+            with self.lock:
+                old = self.app_elements.get(app_key)
+                if old is None or [e.signature for e in old] != [e.signature for e in elements]:
+                    self._drop_app(app_key)
+                    self.app_elements[app_key] = elements
+                    for position, element in enumerate(elements):
+                        for word in set(normalize_name(element.name) + normalize_name(element.role)):
+                            self.by_word.setdefault(word, set()).add((app_key, position))
+                self.app_walked_at[app_key] = now
+        return len(due)
+
+    def _drop_app(self, app_key):
+        for position, element in enumerate(self.app_elements.pop(app_key, [])):
+            for word in set(normalize_name(element.name) + normalize_name(element.role)):
+                entries = self.by_word.get(word)
+                if entries:
+                    entries.discard((app_key, position))
+                    if not entries:
+                        del self.by_word[word]
+        self.app_walked_at.pop(app_key, None)
+
+    def __len__(self):
+        return sum(len(elements) for elements in self.app_elements.values())
+
+    def find(self, query):
+        """
+        Best element for a name, or None
+        Exact name matches win, then names or roles containing every query word;
+        among equals the smallest element (the most specific one) is chosen.
+        """
+        words = normalize_name(query)
+        if not words:
+            return None
+        with self.lock:
+            candidates = set.intersection(*(self.by_word.get(word, set()) for word in words))
+            if not candidates:
+                return None
+            best, best_key = None, None
+            for app_key, position in candidates:
+                element = self.app_elements[app_key][position]
+                exact = normalize_name(element.name) == words or normalize_name(element.role) == words
+                key = (not exact, element.width * element.height)
+                if best_key is None or key < best_key:
+                    best, best_key = element, key
+            return best
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+Batch evaluation of grounding accuracy, latency and cost over a labeled screenshot corpus.
+
+Every labeled screenshot is prepared with each preprocessing profile, sent to each model
+with the app's coordinate instruction, and the first box of the answer is scored against
+the labeled target: IoU, and whether a click at its center lands on the target.
+
+Usage:
+    python grounding_eval.py corpus/ --models gemini-2.5-flash gemini --profiles full half
+    python grounding_eval.py corpus/ --models stub --concurrency 8 --snap
+    python grounding_eval.py corpus/ --models gemini-2.5-flash --structured  # JSON output mode
+
+The corpus directory holds the screenshots and a labels.jsonl file with one target per line,
+its box as x, y, width, height in pixels of the screenshot:
+    {"id": "mail", "image": "screenshot.png", "prompt": "Where is the Mail app?", "target": [812, 1010, 64, 64]}
+
+Raw answers are appended to a results file as they complete (corpus/grounding_results.jsonl
+by default), so an interrupted run picks up where it stopped; metrics are computed from that
+file, so re-scoring (e.g. with --snap) needs no new model calls.
+"""
+import argparse
+import base64
+import io
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from prompts import COORDINATE_CONTEXT, create_coordinate_system_instruction, STEP_RESPONSE_SCHEMA, STRUCTURED_OUTPUT_NOTE
+from response_parser import parse_highlight_boxes, parse_structured_response, structured_boxes
+from box_refiner import refine_boxes
+
+LABELS_FILE = "labels.jsonl"
+RESULTS_FILE = "grounding_results.jsonl"
+STUB_MODEL = "stub"
+
+# How a screenshot is prepared for upload
+PROFILES = {
+    "full": {"format": "PNG"},  # The frame as captured
+    "half": {"scale": 0.5, "format": "PNG"},  # A Retina frame at its logical size (CAPTURE_SCALE=logical)
+    "max1280": {"max_side": 1280, "format": "PNG"},
+    "jpeg": {"format": "JPEG", "quality": 80},
+}
+
+# List prices in USD: per million input/output tokens, or per second of Replicate GPU time
+PRICES = {
+    "gemini": {"input": 1.25, "output": 10.0},
+    "gemini-2.5-flash": {"input": 0.15, "output": 0.60},
+    "gemini-flash": {"input": 0.075, "output": 0.30},
+    "cogagent": {"second": 0.000725},
+    "llava": {"second": 0.000725},
+    STUB_MODEL: {},
+}
+
+# Per-turn request, as the app sends it (the instruction comes from the registered context)
+TURN_PROMPT = """User's current request: "{prompt}"
+
+Analyze the screenshot and give the user just the next single step they should take.
+"""
+
+def load_labels(corpus):
+    """Labeled targets of a corpus directory, skipping malformed lines"""
+    samples = []
+    path = os.path.join(corpus, LABELS_FILE)
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                sample = json.loads(line)
+            except ValueError as e:
+                print(f"Skipping line {line_number} of {path}: {e}")
+                continue
+            if not (sample.get("image") and sample.get("prompt") and len(sample.get("target") or ()) == 4):
+                print(f"Skipping line {line_number} of {path}: needs image, prompt and target")
+                continue
+            sample.setdefault("id", f"{sample['image']}:{line_number}")
+            samples.append(sample)
+    return samples
+
+def load_results(path):
+    """Completed results by key, from an append-only results file"""
+    results = {}
+    if not os.path.exists(path):
+        return results
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue  # A line cut short by an interruption
+            results[result["key"]] = result
+    return results
+
+def result_key(model, profile, sample, structured=False):
+    return f"{model}|{profile}|{sample['id']}" + ("|json" if structured else "")
+
+def prepare_image(image, profile):
+    """Upload of a screenshot under a preprocessing profile: (data URL, (width, height))"""
+    settings = PROFILES[profile]
+    scale = settings.get("scale", 1.0)
+    if settings.get("max_side"):
+        scale = min(scale, settings["max_side"] / max(image.size))
+    if scale < 1.0:
+        image = image.resize((round(image.width * scale), round(image.height * scale)), Image.BILINEAR)
+    output = io.BytesIO()
+    image.save(output, format=settings["format"], quality=settings.get("quality", 90))
+    mime = "jpeg" if settings["format"] == "JPEG" else "png"
+    return f"data:image/{mime};base64,{base64.b64encode(output.getvalue()).decode('utf-8')}", image.size
+
+def box_iou(a, b):
+    """Intersection over union of two (x, y, width, height) boxes"""
+    width = min(a[0] + a[2], b[0] + b[2]) - max(a[0], b[0])
+    height = min(a[1] + a[3], b[1] + b[3]) - max(a[1], b[1])
+    if width <= 0 or height <= 0:
+        return 0.0
+    intersection = width * height
+    return intersection / (a[2] * a[3] + b[2] * b[3] - intersection)
+
+def cost_of(model, result, prices=PRICES):
+    """USD cost of one call, from its token usage or latency"""
+    price = prices.get(model, {})
+    if "second" in price:
+        return result["latency"] * price["second"]
+    return ((result.get("input_tokens") or 0) * price.get("input", 0.0) +
+            (result.get("output_tokens") or 0) * price.get("output", 0.0)) / 1_000_000
+
+class StubGroundingModel:
+    """
+    Answers like Gemini with the labeled target, shifted by a seeded fraction of its size,
+    so the pipeline and metrics can be exercised without network calls
+    """
+    def __init__(self, latency=0.0, jitter=0.15, structured=False):
+        self.latency = latency  # Seconds per call
+        self.jitter = jitter  # Largest shift, as a fraction of the box size
+        self.structured = structured
+
+    def __call__(self, sample, image_size):
+        """Answer for a sample; image_size is the labeled screenshot's (width, height)"""
+        time.sleep(self.latency)
+        rng = random.Random(sample["id"])
+        x, y, width, height = sample["target"]
+        x += rng.uniform(-self.jitter, self.jitter) * width
+        y += rng.uniform(-self.jitter, self.jitter) * height
+        image_width, image_height = image_size
+        box = [round(y * 1000 / image_height), round(x * 1000 / image_width),
+               round((y + height) * 1000 / image_height), round((x + width) * 1000 / image_width)]
+        if self.structured:
+            return json.dumps({"step_text": "Click on the target.", "boxes": [{"label": "target", "box_2d": box}],
+                               "action": {"kind": "click"}, "is_complete": False})
+        return f"Click on the target {box}."
+
+class GroundingEvaluator:
+    """
+    Runs every (model, profile, sample) that has no successful result yet, with at most
+    `concurrency` calls in flight, appending each result as it completes.
+    Each worker thread has its own ModelManager so call stats don't mix.
+    """
+    def __init__(self, corpus, results_path, concurrency=4, stub_latency=0.0, structured=False):
+        self.corpus = corpus
+        self.results_path = results_path
+        self.concurrency = concurrency
+        self.structured = structured  # Gemini structured output (JSON) instead of free text
+        self.stub = StubGroundingModel(stub_latency, structured=structured)
+        self.instruction = create_coordinate_system_instruction()
+        self.results = load_results(results_path)
+        self.write_lock = threading.Lock()
+        self.local = threading.local()
+        self.images = {}  # Image path -> PIL image, loaded once
+        self.images_lock = threading.Lock()
+
+    def _image(self, name):
+        path = os.path.join(self.corpus, name)
+        with self.images_lock:
+            if path not in self.images:
+                self.images[path] = Image.open(path).convert("RGB")
+            return self.images[path]
+
+    def _manager(self, model):
+        """This thread's ModelManager for a model"""
+        managers = self.local.__dict__.setdefault("managers", {})
+        if model not in managers:
+            from model_manager import ModelManager  # Only needed for real models
+            manager = ModelManager()
+            manager.switch_model(model)
+            manager.register_system_instruction(COORDINATE_CONTEXT, self.instruction)
+            managers[model] = manager
+        return managers[model]
+
+    def _run_one(self, model, profile, sample):
+        image = self._image(sample["image"])
+        image_url, upload_size = prepare_image(image, profile)
+        result = {"key": result_key(model, profile, sample, self.structured), "model": model, "profile": profile,
+                  "sample": sample["id"], "upload_size": list(upload_size), "error": None}
+        start_time = time.perf_counter()
+        if model == STUB_MODEL:
+            response = self.stub(sample, image.size)
+            stats = {}
+        else:
+            manager = self._manager(model)
+            manager.last_call_stats = {}
+            prompt = TURN_PROMPT.format(prompt=sample["prompt"])
+            if self.structured:
+                prompt += STRUCTURED_OUTPUT_NOTE
+            response = manager.call_model(image_url, prompt, context=COORDINATE_CONTEXT,
+                                          response_schema=STEP_RESPONSE_SCHEMA if self.structured else None)
+            stats = manager.last_call_stats
+            result["error"] = stats.get("error")
+        result.update(response=response, latency=time.perf_counter() - start_time,
+                      input_tokens=stats.get("input_tokens"), output_tokens=stats.get("output_tokens"))
+
+        with self.write_lock:
+            with open(self.results_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(result) + "\n")
+            self.results[result["key"]] = result
+        return result
+
+    def run(self, samples, models, profiles):
+        """Evaluate what is missing or failed before; returns the number of new results"""
+        def done_before(model, profile, sample):
+            result = self.results.get(result_key(model, profile, sample, self.structured))
+            return result is not None and not result["error"]  # Failed calls are retried
+        pending = [(model, profile, sample) for model in models for profile in profiles for sample in samples
+                   if not done_before(model, profile, sample)]
+        skipped = len(models) * len(profiles) * len(samples) - len(pending)
+        if skipped:
+            print(f"Resuming: {skipped} result(s) already in {self.results_path}")
+        if not pending:
+            return 0
+        done = 0
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            futures = [executor.submit(self._run_one, *task) for task in pending]
+            for future in futures:
+                result = future.result()
+                done += 1
+                status = f"error: {result['error'][:60]}" if result["error"] else f"{result['latency']:.2f}s"
+                print(f"  [{done}/{len(pending)}] {result['model']} {result['profile']} {result['sample']}: {status}")
+        return done
+
+    def score(self, samples, models, profiles, snap=False, prices=PRICES):
+        """Metrics per (model, profile) from the stored results"""
+        report = {}
+        for model in models:
+            for profile in profiles:
+                ious, hits, latencies, costs = [], [], [], []
+                errors = missing_box = 0
+                for sample in samples:
+                    result = self.results.get(result_key(model, profile, sample, self.structured))
+                    if result is None:
+                        continue
+                    if result["error"]:
+                        errors += 1
+                        continue
+                    latencies.append(result["latency"])
+                    costs.append(cost_of(model, result, prices))
+                    box = self._predicted_box(sample, result, snap)
+                    if box is None:
+                        missing_box += 1
+                        ious.append(0.0)
+                        hits.append(False)
+                        continue
+                    x, y, width, height = sample["target"]
+                    center_x, center_y = box[0] + box[2] / 2, box[1] + box[3] / 2
+                    ious.append(box_iou(box, sample["target"]))
+                    hits.append(x <= center_x < x + width and y <= center_y < y + height)
+                report[(model, profile)] = {
+                    "count": len(latencies) + errors, "errors": errors, "missing_box": missing_box,
+                    "mean_iou": float(np.mean(ious)) if ious else 0.0,
+                    "hit_rate": float(np.mean(hits)) if hits else 0.0,
+                    "latency": [float(v) for v in np.percentile(latencies, [50, 90, 99])] if latencies else None,
+                    "cost": sum(costs), "cost_per_call": sum(costs) / len(costs) if costs else 0.0,
+                }
+        return report
+
+    def _predicted_box(self, sample, result, snap):
+        """First box of an answer, in pixels of the labeled screenshot"""
+        image = self._image(sample["image"])
+        step = parse_structured_response(result["response"])
+        if step:
+            boxes = structured_boxes(step, image.width, image.height)
+        else:
+            boxes = parse_highlight_boxes(result["response"], image.width, image.height,
+                                          image_size=tuple(result["upload_size"]))
+        if not boxes:
+            return None
+        if snap:
+            refine_boxes(boxes[:1], np.asarray(image)[..., ::-1])  # RGB -> BGR
+        box = boxes[0]
+        return box["x"], box["y"], box["width"], box["height"]
+
+def print_report(report):
+    """Print one line of metrics per model and profile"""
+    print(f"\n{'model':<18} {'profile':<9} {'n':>4} {'err':>4} {'nobox':>5} {'IoU':>6} {'hit':>6} "
+          f"{'p50':>7} {'p90':>7} {'p99':>7} {'cost':>9} {'$/call':>9}")
+    for (model, profile), metrics in report.items():
+        p50, p90, p99 = metrics["latency"] or (0.0, 0.0, 0.0)
+        print(f"{model:<18} {profile:<9} {metrics['count']:>4} {metrics['errors']:>4} {metrics['missing_box']:>5} "
+              f"{metrics['mean_iou']:>6.3f} {metrics['hit_rate']:>6.1%} {p50:>6.2f}s {p90:>6.2f}s {p99:>6.2f}s "
+              f"{metrics['cost']:>9.4f} {metrics['cost_per_call']:>9.6f}")
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Evaluate grounding accuracy, latency and cost on a labeled corpus")
+    parser.add_argument("corpus", help=f"Directory of screenshots with a {LABELS_FILE} file")
+    parser.add_argument("--models", nargs="+", default=["gemini-2.5-flash"],
+                        help=f"Model types passed to ModelManager.switch_model, or '{STUB_MODEL}'")
+    parser.add_argument("--profiles", nargs="+", default=["full"], choices=list(PROFILES),
+                        help="Preprocessing profiles to compare")
+    parser.add_argument("--concurrency", type=int, default=4, help="Model calls in flight at once")
+    parser.add_argument("--results", help=f"Results file to append to and resume from (default: corpus/{RESULTS_FILE})")
+    parser.add_argument("--fresh", action="store_true", help="Discard previous results")
+    parser.add_argument("--structured", action="store_true",
+                        help="Ask Gemini for structured (JSON) output; other models answer in free text")
+    parser.add_argument("--snap", action="store_true", help="Snap boxes to UI edges before scoring, as the app does")
+    parser.add_argument("--prices", help="JSON file of prices overriding the built-in list prices")
+    parser.add_argument("--stub-latency", type=float, default=0.0, help="Seconds per call of the stub model")
+    parser.add_argument("-o", "--output", help="Also write the report as JSON")
+    args = parser.parse_args()
+
+    samples = load_labels(args.corpus)
+    if not samples:
+        parser.error(f"No labeled targets in {os.path.join(args.corpus, LABELS_FILE)}")
+    results_path = args.results or os.path.join(args.corpus, RESULTS_FILE)
+    if args.fresh and os.path.exists(results_path):
+        os.remove(results_path)
+    prices = dict(PRICES)
+    if args.prices:
+        with open(args.prices, "r", encoding="utf-8") as f:
+            prices.update(json.load(f))
+
+    evaluator = GroundingEvaluator(args.corpus, results_path, args.concurrency, args.stub_latency, args.structured)
+    print(f"Evaluating {len(samples)} target(s) x {len(args.models)} model(s) x {len(args.profiles)} profile(s)")
+    start_time = time.perf_counter()
+    evaluator.run(samples, args.models, args.profiles)
+    print(f"Done in {time.perf_counter() - start_time:.1f}s")
+
+    report = evaluator.score(samples, args.models, args.profiles, snap=args.snap, prices=prices)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({f"{model}|{profile}": metrics for (model, profile), metrics in report.items()}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import time
+import statistics
+from collections import deque
+
+from PyQt5.QtCore import QEventLoop
+from PyQt5.QtWidgets import QApplication
+
+# Qt pumping from the Tk loop (milliseconds)
+QT_PUMP_INTERVAL = 8  # Time between pumps (~120 Hz, well above the overlay's animation rate)
+QT_PUMP_SLICE = 4  # Longest time Qt may run per pump, so Tk stays responsive
+STALL_THRESHOLD = 100  # A pump this late means the event loop was blocked
+METRICS_WINDOW = 2000  # Number of recent pumps kept for the statistics
+
+class LoopMetrics:
+    """Frame latency and stall statistics of the shared event loop"""
+    def __init__(self, window=METRICS_WINDOW, stall_threshold=STALL_THRESHOLD):
+        self.stall_threshold = stall_threshold
+        self.lateness = deque(maxlen=window)  # ms each pump ran after it was due
+        self.pump_times = deque(maxlen=window)  # ms spent processing Qt events per pump
+        self.pumps = 0
+        self.stalls = 0
+        self.worst_stall = 0.0
+
+    def record(self, lateness_ms, pump_ms):
+        self.pumps += 1
+        self.lateness.append(lateness_ms)
+        self.pump_times.append(pump_ms)
+        if lateness_ms >= self.stall_threshold:
+            self.stalls += 1
+            self.worst_stall = max(self.worst_stall, lateness_ms)
+
+    @staticmethod
+    def _percentile(samples, fraction):
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def summary(self):
+        """Statistics over the recent pumps (ms), or an empty dict before the first pump"""
+        if not self.lateness:
+            return {}
+        return {
+            'pumps': self.pumps,
+            'latency_p50': self._percentile(self.lateness, 0.5),
+            'latency_p95': self._percentile(self.lateness, 0.95),
+            'latency_max': max(self.lateness),
+            'pump_mean': statistics.mean(self.pump_times),
+            'stalls': self.stalls,
+            'worst_stall': self.worst_stall,
+        }
+
+    def format(self):
+        stats = self.summary()
+        if not stats:
+            return "no frames yet"
+        return (f"{stats['pumps']} pumps, frame latency p50={stats['latency_p50']:.1f}ms "
+                f"p95={stats['latency_p95']:.1f}ms max={stats['latency_max']:.1f}ms, "
+                f"Qt time/pump={stats['pump_mean']:.2f}ms, "
+                f"{stats['stalls']} stalls (worst {stats['worst_stall']:.0f}ms)")
+
+class QtTkEventLoop:
+    """
+    Runs Qt inside the Tk main loop.
+
+    The app only runs root.mainloop(), so without this Qt timers and repaints
+    of the overlay would only happen as a platform side effect. A Tk after()
+    hook pumps Qt's event queue at a high rate with a bounded time slice, and
+    measures how late each pump runs: that lateness is the frame latency any
+    overlay animation sees, and large values are event-loop stalls.
+    """
+    def __init__(self, root, qt_app=None, interval=QT_PUMP_INTERVAL, time_slice=QT_PUMP_SLICE):
+        self.root = root
+        self.qt_app = qt_app or QApplication.instance()
+        self.interval = interval
+        self.time_slice = time_slice
+        self.metrics = LoopMetrics()
+        self.job = None
+        self.due_at = None
+
+    def start(self):
+        if self.job is None and self.qt_app is not None:
+            self.due_at = time.perf_counter() + self.interval / 1000
+            self.job = self.root.after(self.interval, self._pump)
+
+    def stop(self):
+        if self.job is not None:
+            try:
+                self.root.after_cancel(self.job)
+            except Exception:
+                pass  # The Tk root is already destroyed
+            self.job = None
+
+    def _pump(self):
+        started = time.perf_counter()
+        lateness_ms = max(0.0, (started - self.due_at) * 1000)
+        self.qt_app.processEvents(QEventLoop.AllEvents, self.time_slice)
+        finished = time.perf_counter()
+        self.metrics.record(lateness_ms, (finished - started) * 1000)
+
+        self.due_at = finished + self.interval / 1000
+        self.job = self.root.after(self.interval, self._pump)
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+Local intent classifier used as a fast pre-router before any screenshot or model call.
+
+TF-IDF features (words, word pairs and character trigrams) feed two linear models:
+a softmax over intents and a logistic "needs_visual" head. Everything is pure Python,
+runs on the CPU in well under a millisecond per query and is stored as a JSON file.
+
+Usage:
+    python intent_classifier.py train turns.jsonl -o intent_model.json
+    python intent_classifier.py evaluate labeled.jsonl --model intent_model.json [--baseline]
+
+Training and evaluation files are JSONL with one turn per line:
+    {"text": "How do I open my email?", "intent": "how_to", "needs_visual": true}
+Either label may be null (logged turns leave the intent for annotation); each head
+only learns from, and is only scored on, the turns labeled for it.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import re
+import time
+
+TOKEN_PATTERN = re.compile(r"\w+(?:'\w+)?")
+
+def load_jsonl(path):
+    """Load labeled turns from a JSONL file, skipping blank or malformed lines"""
+    examples = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                example = json.loads(line)
+            except ValueError as e:
+                print(f"Skipping line {line_number} of {path}: {e}")
+                continue
+            if example.get("text") and (example.get("intent") or example.get("needs_visual") is not None):
+                examples.append(example)
+    return examples
+
+class IntentClassifier:
+    """TF-IDF + linear intent classifier with a needs_visual probability head"""
+    def __init__(self):
+        self.vocabulary = {}  # Feature string -> index
+        self.idf = []
+        self.intents = []
+        self.intent_weights = []  # Per feature: list of weights, one per intent
+        self.intent_bias = []
+        self.visual_weights = []  # Per feature: weight for the needs_visual head
+        self.visual_bias = 0.0
+
+    @staticmethod
+    def _extract_terms(text):
+        """Split text into word, word-pair and character-trigram terms"""
+        words = TOKEN_PATTERN.findall(text.lower())
+        terms = list(words)
+        terms.extend(f"{first} {second}" for first, second in zip(words, words[1:]))
+        for word in words:
+            padded = f"#{word}#"
+            terms.extend(f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2))
+        return terms
+
+    def _vectorize(self, text):
+        """Return a sparse, L2-normalized TF-IDF vector as {feature_index: value}"""
+        counts = {}
+        for term in self._extract_terms(text):
+            index = self.vocabulary.get(term)
+            if index is not None:
+                counts[index] = counts.get(index, 0) + 1
+
+        vector = {index: (1.0 + math.log(count)) * self.idf[index] for index, count in counts.items()}
+        norm = math.sqrt(sum(value * value for value in vector.values()))
+        if norm:
+            vector = {index: value / norm for index, value in vector.items()}
+        return vector
+
+    def _intent_probabilities(self, vector):
+        scores = list(self.intent_bias)
+        for index, value in vector.items():
+            for class_index, weight in enumerate(self.intent_weights[index]):
+                scores[class_index] += weight * value
+        top = max(scores)
+        exps = [math.exp(score - top) for score in scores]
+        total = sum(exps)
+        return [exp / total for exp in exps]
+
+    def _visual_probability(self, vector):
+        score = self.visual_bias + sum(self.visual_weights[index] * value for index, value in vector.items())
+        return 1.0 / (1.0 + math.exp(-max(min(score, 30.0), -30.0)))
+
+    def train(self, examples, epochs=30, learning_rate=0.5, seed=0):
+        """
+        Fit the classifier on labeled turns
+
+        Args:
+            examples: Dicts with "text" and an "intent" and/or "needs_visual" label
+            epochs: Passes of stochastic gradient descent over the data
+            learning_rate: Initial step size (decays linearly over the epochs)
+            seed: Shuffle seed, for reproducible models
+        """
+        if not any(example.get("intent") for example in examples):
+            raise ValueError("No training examples with an intent label")
+
+        # Vocabulary and inverse document frequencies
+        document_frequency = {}
+        for example in examples:
+            for term in set(self._extract_terms(example["text"])):
+                document_frequency[term] = document_frequency.get(term, 0) + 1
+        self.vocabulary = {term: index for index, term in enumerate(sorted(document_frequency))}
+        self.idf = [0.0] * len(self.vocabulary)
+        for term, index in self.vocabulary.items():
+            self.idf[index] = math.log((1 + len(examples)) / (1 + document_frequency[term])) + 1.0
+
+        self.intents = sorted({example["intent"] for example in examples if example.get("intent")})
+        intent_index = {intent: index for index, intent in enumerate(self.intents)}
+        self.intent_weights = [[0.0] * len(self.intents) for _ in self.vocabulary]
+        self.intent_bias = [0.0] * len(self.intents)
+        self.visual_weights = [0.0] * len(self.vocabulary)
+        self.visual_bias = 0.0
+
+        samples = [
+            (self._vectorize(example["text"]), intent_index.get(example.get("intent")), example.get("needs_visual"))
+            for example in examples
+        ]
+        rng = random.Random(seed)
+        for epoch in range(epochs):
+            rate = learning_rate * (1.0 - epoch / epochs)
+            rng.shuffle(samples)
+            for vector, target, needs_visual in samples:
+                # Softmax cross-entropy step for the intent head (skipped when unlabeled)
+                if target is not None:
+                    probabilities = self._intent_probabilities(vector)
+                    for class_index, probability in enumerate(probabilities):
+                        gradient = probability - (1.0 if class_index == target else 0.0)
+                        self.intent_bias[class_index] -= rate * gradient
+                        for index, value in vector.items():
+                            self.intent_weights[index][class_index] -= rate * gradient * value
+
+                # Logistic step for the needs_visual head (skipped when unlabeled)
+                if needs_visual is not None:
+                    gradient = self._visual_probability(vector) - (1.0 if needs_visual else 0.0)
+                    self.visual_bias -= rate * gradient
+                    for index, value in vector.items():
+                        self.visual_weights[index] -= rate * gradient * value
+        return self
+
+    def predict(self, text):
+        """
+        Classify a query
+        Returns the intent, its confidence and the probability that visual guidance is needed
+        """
+        vector = self._vectorize(text)
+        probabilities = self._intent_probabilities(vector)
+        best = max(range(len(probabilities)), key=probabilities.__getitem__)
+        return {
+            "primary_intent": self.intents[best],
+            "intent_confidence": probabilities[best],
+            "needs_visual_probability": self._visual_probability(vector)
+        }
+
+    def save(self, path):
+        """Save the model as JSON"""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({
+                "vocabulary": self.vocabulary,
+                "idf": self.idf,
+                "intents": self.intents,
+                "intent_weights": self.intent_weights,
+                "intent_bias": self.intent_bias,
+                "visual_weights": self.visual_weights,
+                "visual_bias": self.visual_bias
+            }, f)
+
+    @classmethod
+    def load(cls, path):
+        """Load a model saved with save()"""
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        classifier = cls()
+        for key, value in data.items():
+            setattr(classifier, key, value)
+        return classifier
+
+def load_intent_classifier(path):
+    """Load a classifier if the path is set and exists, otherwise return None"""
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        classifier = IntentClassifier.load(path)
+        print(f"Loaded intent classifier from {path} ({len(classifier.intents)} intents)")
+        return classifier
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Error loading intent classifier {path}: {e}")
+        return None
+
+def evaluate(predict, examples):
+    """
+    Score a predict(text) function on labeled turns
+    Returns intent accuracy, per-intent precision/recall, needs_visual accuracy and latency
+    """
+    latencies = []
+    intent_total = 0
+    correct_intents = 0
+    visual_total = 0
+    visual_correct = 0
+    per_intent = {}
+
+    for example in examples:
+        start_time = time.perf_counter()
+        prediction = predict(example["text"])
+        latencies.append((time.perf_counter() - start_time) * 1000)
+
+        expected, predicted = example.get("intent"), prediction["primary_intent"]
+        if expected:
+            intent_total += 1
+            per_intent.setdefault(expected, {"tp": 0, "fp": 0, "fn": 0})
+            per_intent.setdefault(predicted, {"tp": 0, "fp": 0, "fn": 0})
+            if expected == predicted:
+                correct_intents += 1
+                per_intent[expected]["tp"] += 1
+            else:
+                per_intent[expected]["fn"] += 1
+                per_intent[predicted]["fp"] += 1
+
+        if example.get("needs_visual") is not None:
+            visual_total += 1
+            if prediction["needs_visual"] == bool(example["needs_visual"]):
+                visual_correct += 1
+
+    latencies.sort()
+    return {
+        "count": len(examples),
+        "intent_accuracy": correct_intents / intent_total if intent_total else 0.0,
+        "needs_visual_accuracy": visual_correct / visual_total if visual_total else None,
+        "latency_p50_ms": latencies[len(latencies) // 2] if latencies else 0.0,
+        "latency_p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else 0.0,
+        "per_intent": {
+            intent: {
+                "precision": counts["tp"] / (counts["tp"] + counts["fp"]) if counts["tp"] + counts["fp"] else 0.0,
+                "recall": counts["tp"] / (counts["tp"] + counts["fn"]) if counts["tp"] + counts["fn"] else 0.0
+            }
+            for intent, counts in sorted(per_intent.items())
+        }
+    }
+
+def print_report(name, report):
+    """Print an evaluation report"""
+    print(f"\n=== {name} ({report['count']} turns) ===")
+    print(f"Intent accuracy: {report['intent_accuracy']:.3f}")
+    if report["needs_visual_accuracy"] is not None:
+        print(f"needs_visual accuracy: {report['needs_visual_accuracy']:.3f}")
+    print(f"Latency: p50={report['latency_p50_ms']:.3f}ms p95={report['latency_p95_ms']:.3f}ms")
+    for intent, scores in report["per_intent"].items():
+        print(f"  {intent:<22} precision={scores['precision']:.3f} recall={scores['recall']:.3f}")
+
+def main():
+    """Command line entry point for training and evaluation"""
+    parser = argparse.ArgumentParser(description="Train or evaluate the local intent classifier")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    train_parser = subparsers.add_parser("train", help="Train a model from labeled or logged turns")
+    train_parser.add_argument("data", help="JSONL file of turns")
+    train_parser.add_argument("-o", "--output", default="intent_model.json", help="Where to save the model")
+    train_parser.add_argument("--epochs", type=int, default=30)
+
+    eval_parser = subparsers.add_parser("evaluate", help="Evaluate a model on a labeled JSONL file")
+    eval_parser.add_argument("data", help="Labeled JSONL file")
+    eval_parser.add_argument("--model", default="intent_model.json", help="Model to evaluate")
+    eval_parser.add_argument("--threshold", type=float, default=0.5, help="needs_visual probability threshold")
+    eval_parser.add_argument("--baseline", action="store_true", help="Also score the keyword detector for comparison")
+
+    args = parser.parse_args()
+    examples = load_jsonl(args.data)
+
+    if args.command == "train":
+        start_time = time.perf_counter()
+        classifier = IntentClassifier().train(examples, epochs=args.epochs)
+        classifier.save(args.output)
+        print(f"Trained on {len(examples)} turns in {time.perf_counter() - start_time:.2f}s, "
+              f"{len(classifier.vocabulary)} features, intents: {', '.join(classifier.intents)}")
+        print(f"Saved model to {args.output}")
+        return
+
+    classifier = IntentClassifier.load(args.model)
+
+    def predict_with_classifier(text):
+        prediction = classifier.predict(text)
+        prediction["needs_visual"] = prediction["needs_visual_probability"] >= args.threshold
+        return prediction
+
+    print_report(f"Classifier {args.model}", evaluate(predict_with_classifier, examples))
+
+    if args.baseline:
+        from conversation_manager import ConversationManager
+        keyword_manager = ConversationManager()
+        keyword_manager.intent_classifier = None
+        print_report("Keyword baseline", evaluate(keyword_manager.detect_intent, examples))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+from collections import deque
+
+class KeywordMatcher:
+    """
+    Multi-pattern keyword matcher built on an Aho-Corasick automaton.
+
+    Keywords are added with a category (e.g. "intent", "element", "language"),
+    a value (e.g. "how_to") and a priority (lower wins). Once built, a single
+    scan over the text finds every keyword of every category, so matching cost
+    depends on the text length rather than on how many keywords are loaded.
+    """
+    def __init__(self):
+        # Automaton state: transitions, failure links and pattern outputs per node
+        self.transitions = [{}]
+        self.fail = [0]
+        self.outputs = [[]]
+        self.patterns = []  # (keyword, category, value, priority, whole_word, plural)
+        self.built = False
+
+    def add(self, keyword, category, value=None, priority=0, whole_word=True, plural=False, inflect=False):
+        """
+        Add a keyword to the matcher
+
+        Args:
+            keyword: Text to match (matched case-insensitively)
+            category: Group the keyword belongs to
+            value: Value reported for a match (defaults to the keyword itself)
+            priority: Lower values take precedence when ranking matches
+            whole_word: Only match when not surrounded by letters or digits
+            plural: Also match the keyword followed by "s" or "es" ("icons", "boxes")
+            inflect: Also match the verb forms of a single-word keyword ("finds", "located", "explaining")
+        """
+        keyword = keyword.strip().lower()
+        if not keyword:
+            return
+        if inflect and " " not in keyword:
+            for form in self._verb_forms(keyword):
+                self.add(form, category, keyword if value is None else value, priority, whole_word, plural)
+        pattern_index = len(self.patterns)
+        self.patterns.append((keyword, category, keyword if value is None else value, priority, whole_word, plural))
+
+        node = 0
+        for char in keyword:
+            next_node = self.transitions[node].get(char)
+            if next_node is None:
+                next_node = len(self.transitions)
+                self.transitions.append({})
+                self.fail.append(0)
+                self.outputs.append([])
+                self.transitions[node][char] = next_node
+            node = next_node
+        self.outputs[node].append(pattern_index)
+        self.built = False
+
+    def build(self):
+        """Compute failure links (breadth-first) so the automaton can scan in one pass"""
+        queue = deque()
+        for child in self.transitions[0].values():
+            self.fail[child] = 0
+            queue.append(child)
+
+        while queue:
+            node = queue.popleft()
+            for char, child in self.transitions[node].items():
+                queue.append(child)
+                fallback = self.fail[node]
+                while fallback and char not in self.transitions[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.transitions[fallback].get(char, 0)
+                if self.fail[child] == child:
+                    self.fail[child] = 0
+                # Inherit matches that end at the failure state
+                self.outputs[child] = self.outputs[child] + self.outputs[self.fail[child]]
+        self.built = True
+
+    @staticmethod
+    def _verb_forms(verb):
+        """Third person, past and -ing forms of a regular verb"""
+        stem = verb[:-1] if verb.endswith("e") else verb
+        third_person = verb + "es" if verb.endswith(("s", "x", "ch", "sh")) else verb + "s"
+        return [third_person, stem + "ed", stem + "ing"]
+
+    @staticmethod
+    def _is_word_char(char):
+        return char.isalnum() or char == "_"
+
+    def _plural_end(self, text, end):
+        """End of a whole word that continues a match at end with a plural suffix, or end itself"""
+        for suffix in ("s", "es"):
+            suffix_end = end + len(suffix)
+            if text.startswith(suffix, end) and (suffix_end >= len(text) or not self._is_word_char(text[suffix_end])):
+                return suffix_end
+        return end
+
+    def find_all(self, text):
+        """
+        Scan text once and return every keyword match.
+
+        Returns:
+            list: (start, end, category, value, priority) tuples in order of position
+        """
+        if not self.built:
+            self.build()
+
+        text = text.lower()
+        length = len(text)
+        matches = []
+        node = 0
+        for index, char in enumerate(text):
+            while node and char not in self.transitions[node]:
+                node = self.fail[node]
+            node = self.transitions[node].get(char, 0)
+            for pattern_index in self.outputs[node]:
+                keyword, category, value, priority, whole_word, plural = self.patterns[pattern_index]
+                start = index - len(keyword) + 1
+                end = index + 1
+                if whole_word:
+                    if start > 0 and self._is_word_char(text[start - 1]) and self._is_word_char(keyword[0]):
+                        continue
+                    if plural:
+                        end = self._plural_end(text, end)
+                    if end < length and self._is_word_char(text[end]) and self._is_word_char(keyword[-1]):
+                        continue
+                matches.append((start, end, category, value, priority))
+
+        matches.sort(key=lambda match: (match[0], match[1]))
+        return matches
+
+    def match(self, text):
+        """
+        Scan text once and group matched values by category.
+
+        Returns:
+            dict: category -> list of unique values, ordered by priority then position
+        """
+        grouped = {}
+        for start, end, category, value, priority in self.find_all(text):
+            best = grouped.setdefault(category, {})
+            if value not in best or (priority, start) < best[value]:
+                best[value] = (priority, start)
+
+        return {
+            category: sorted(values, key=lambda value: values[value])
+            for category, values in grouped.items()
+        }
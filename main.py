@@ -3,18 +3,14 @@ import tkinter as tk
 from tkinter import scrolledtext, font as tkFont, Toplevel
 import base64
 import os
-import json
 import threading
 import argparse
-import sys
 import io
 import time
-import re
 import tempfile
 import wave
 import pyaudio
 import openai
-import pygame
 
 from dotenv import load_dotenv
 import pyautogui
@@ -26,6 +22,24 @@ from PIL import ImageTk, Image
 from model_manager import get_model_manager
 from visual_utils import VisualManager
 from qt_overlay import create_overlay
+from gui_loop import QtTkEventLoop
+from overlay_ipc import RemoteOverlay
+from prompts import (COORDINATE_CONTEXT, create_coordinate_system_instruction, get_platform_name,
+                     STEP_RESPONSE_SCHEMA, STRUCTURED_OUTPUT_NOTE)
+from conversation_manager import ConversationManager, WHAT_IS_CLOSING_NOTE, VISUAL_GUIDANCE_NOTE
+from response_parser import (parse_highlight_boxes, has_instruction, is_task_complete, highlight_specs,
+                             parse_structured_response, structured_boxes, RESPONSE_HIGHLIGHT_GROUP)
+from box_refiner import refine_boxes
+from element_index import extract_target
+from element_cache import ElementCache
+from coordinates import CoordinateTransform
+from action_engine import ActionEngine, parse_action_plan, structured_action_plan, TYPE, HOTKEY
+from autonomous import AutonomousLoop, COMPLETE, ABORTED
+from session_recorder import SessionRecorder
+from speech_output import TTSPipeline, warm_audio_cache
+from audio_service import get_audio_service
+from speech_backends import get_speech_backends
+from audio_stream import StreamingRecorder, StreamingTranscriber, STREAM_SAMPLE_RATE, FRAME_SAMPLES
 
 # Initialize GUI safety (for PyAutoGUI)
 pyautogui.FAILSAFE = True  # Move mouse to upper-left corner to abort
@@ -36,47 +50,43 @@ load_dotenv()
 # Initialize OpenAI API
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
+# Prefetched screenshots: how long to wait for one, and how old it may be when used
+PREFETCH_WAIT_TIMEOUT = 5.0  # seconds
+PREFETCH_MAX_AGE = 15.0  # seconds
+
+# Gemini answers visual requests with JSON (step text, boxes, action, completion) instead of free text
+STRUCTURED_OUTPUT = os.getenv("STRUCTURED_OUTPUT", "true").lower() != "false"
+
+# Fixed phrases of educational responses, pre-synthesized for speech
+CANNED_SPEECH_PHRASES = [WHAT_IS_CLOSING_NOTE, VISUAL_GUIDANCE_NOTE, "Learn More:"]
+
 # Speech-to-text and text-to-speech functions
 def record_audio(seconds=5):
     """
     Record audio for a specified number of seconds
-    Returns the audio as a bytes object
+    Returns the path to a temporary WAV file
     """
-    chunk = 1024
-    sample_format = pyaudio.paInt16
-    channels = 1
-    fs = 44100  # Sample rate
-    
-    p = pyaudio.PyAudio()
+    session = get_audio_service().start_recording()
     
     print("Recording...")
     
-    stream = p.open(format=sample_format,
-                    channels=channels,
-                    rate=fs,
-                    frames_per_buffer=chunk,
-                    input=True)
-    
     frames = []
     
     # Record for the specified duration
-    for i in range(0, int(fs / chunk * seconds)):
-        data = stream.read(chunk)
-        frames.append(data)
-    
-    # Stop and close the stream
-    stream.stop_stream()
-    stream.close()
-    p.terminate()
+    try:
+        for i in range(0, int(STREAM_SAMPLE_RATE / FRAME_SAMPLES * seconds)):
+            frames.append(session.read())
+    finally:
+        session.close()
     
     print("Recording complete.")
     
     # Save to a temporary WAV file
     temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.wav')
     wf = wave.open(temp_file.name, 'wb')
-    wf.setnchannels(channels)
-    wf.setsampwidth(p.get_sample_size(sample_format))
-    wf.setframerate(fs)
+    wf.setnchannels(1)
+    wf.setsampwidth(2)  # 16-bit samples
+    wf.setframerate(STREAM_SAMPLE_RATE)
     wf.writeframes(b''.join(frames))
     wf.close()
     
@@ -84,16 +94,16 @@ def record_audio(seconds=5):
 
 def speech_to_text(audio_file_path):
     """
-    Convert speech to text using OpenAI's API
+    Convert speech to text using the selected speech backend
     Returns the transcribed text
     """
     try:
+        with wave.open(audio_file_path, 'rb') as wf:
+            audio_seconds = wf.getnframes() / wf.getframerate()
         with open(audio_file_path, "rb") as audio_file:
-            transcription = openai.audio.transcriptions.create(
-                model="whisper-1",
-                file=audio_file
-            )
-        return transcription.text
+            audio_bytes = audio_file.read()
+        return get_speech_backends().transcribe(audio_bytes, os.path.basename(audio_file_path),
+                                                audio_seconds=audio_seconds)
     except Exception as e:
         print(f"Error in speech to text: {e}")
         return None
@@ -102,57 +112,25 @@ def speech_to_text(audio_file_path):
         if os.path.exists(audio_file_path):
             os.unlink(audio_file_path)
 
-def text_to_speech(text, voice="alloy"):
+def transcribe_audio_chunk(audio_bytes, file_name, prompt=None, audio_seconds=None):
     """
-    Convert text to speech using OpenAI's API
-    Voice options: alloy, echo, fable, onyx, nova, shimmer
-    Returns the path to the generated audio file
+    Transcribe one encoded audio segment
+    The prompt carries the text transcribed so far, for continuity across segments;
+    the segment length decides whether a local or the hosted backend is used
+    Returns the transcribed text or None
     """
     try:
-        # Optimize text for speech to reduce size and processing time
-        # Simplify text by removing markdown, coordinates, etc.
-        simplified_text = re.sub(r'\[[\d\., ]+\]', '', text)  # Remove coordinate patterns
-        simplified_text = re.sub(r'(http|https)://[^\s]*', '', simplified_text)  # Remove URLs
-        simplified_text = re.sub(r'\*\*([^*]+)\*\*', r'\1', simplified_text)  # Remove markdown bold
-        simplified_text = re.sub(r'\n\n', ' ', simplified_text)  # Replace double newlines with space
-        simplified_text = simplified_text.replace('📚 Learn More:', 'Learn More:')
-        
-        # Further limit text length to reduce processing time
-        # Stricter limit than in _speak_response to speed up initial API call
-        if len(simplified_text) > 2000:
-            simplified_text = simplified_text[:2000] + "... and more information is in the text chat."
-        
-        # Create a temporary file for the audio
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.mp3')
-        
-        # Use the recommended streaming approach
-        with openai.audio.speech.with_streaming_response.create(
-            model="tts-1",
-            voice=voice,
-            input=simplified_text,
-            speed=1.1  # Faster speech rate for more natural sound
-        ) as response:
-            # Write the streaming response to the file
-            with open(temp_file.name, 'wb') as f:
-                for chunk in response.iter_bytes():
-                    f.write(chunk)
-        
-        return temp_file.name
+        return get_speech_backends().transcribe(audio_bytes, file_name, prompt, audio_seconds)
     except Exception as e:
-        print(f"Error in text to speech: {e}")
+        print(f"Error in speech to text: {e}")
         return None
 
 def play_audio(file_path):
     """
-    Play an audio file using pygame
+    Play an audio file on the shared mixer (interrupts any other playback)
     """
     try:
-        pygame.mixer.init()
-        pygame.mixer.music.load(file_path)
-        pygame.mixer.music.play()
-        while pygame.mixer.music.get_busy():
-            pygame.time.Clock().tick(10)
-        pygame.mixer.quit()
+        get_audio_service().play_file(file_path)
     except Exception as e:
         print(f"Error playing audio: {e}")
     finally:
@@ -160,145 +138,16 @@ def play_audio(file_path):
         if os.path.exists(file_path):
             os.unlink(file_path)
 
-class ConversationManager:
-    """
-    Manages conversation context, educational content, and intent recognition.
-    Helps provide appropriate responses for users with limited computer knowledge.
-    """
-    def __init__(self):
-        # Conversation history
-        self.conversation_history = []
-        
-        # Current detected language (default to English)
-        self.detected_language = "en"
-        
-        # Map of question types and intents
-        self.intent_keywords = {
-            "how_to": ["how do i", "how to", "how can i", "steps to", "guide for"],
-            "what_is": ["what is", "what are", "explain", "meaning of", "definition of"],
-            "where_is": ["where is", "find", "locate", "show me", "position of"],
-            "when_to": ["when should i", "when to", "best time to"],
-            "why_use": ["why should i", "why use", "purpose of", "benefit of"],
-            "chat": [
-                "hello", "hi", "hey", "greetings", "good morning", "good afternoon", "good evening",
-                "how are you", "how's it going", "what's up",
-                "thank you", "thanks", "great", "cool", "awesome", "ok", "okay",
-                "tell me a joke", "tell me something interesting", "can you chat", "let's talk",
-                "what's the weather", "what time is it", "who are you", "what is your name",
-                "bye", "goodbye", "see you later"
-            ]
-        }
-        
-        # Map of common UI elements and descriptions for education
-        self.ui_elements = {
-            "dock": "The Dock is a bar of icons at the bottom of your Mac screen that gives you quick access to frequently used apps and documents.",
-            "menu bar": "The Menu Bar at the top of your screen contains menus like File, Edit, and View, plus status icons on the right.",
-            "finder": "Finder is a file management application that helps you navigate and organize files on your Mac.",
-            "spotlight": "Spotlight is a quick search feature on Mac that helps you find apps, documents, and information.",
-            "mail": "Mail is the default email application on your Mac that helps you send, receive and manage emails.",
-            "safari": "Safari is the default web browser on your Mac that lets you access the internet and browse websites.",
-            "system preferences": "System Preferences lets you customize settings on your Mac, like display, sound, and user accounts.",
-            "desktop": "The Desktop is the main screen you see when your Mac is running, where you can store files and access applications.",
-            "folder": "Folders help you organize and store files on your computer.",
-            "window": "Windows are rectangular areas on your screen that display apps, documents, or other content.",
-            "button": "Buttons are interactive elements you can click to perform actions.",
-            "icon": "Icons are small images that represent applications, files, or functions on your computer."
-        }
-        
-        # Always apply visual cues flag
-        self.always_visual = True
-        
-    def add_message(self, role, content):
-        """Add a message to the conversation history"""
-        self.conversation_history.append({"role": role, "content": content})
-        
-    def get_last_messages(self, count=5):
-        """Get the last n messages from conversation history"""
-        return self.conversation_history[-count:] if len(self.conversation_history) >= count else self.conversation_history
-        
-    def clear_history(self):
-        """Clear conversation history"""
-        self.conversation_history = []
-    
-    def set_always_visual(self, value):
-        """Set whether to always apply visual cues"""
-        self.always_visual = value
-        
-    def detect_intent(self, user_query):
-        """
-        Detect the user's intent based on their query
-        Returns intent type and whether visual guidance is likely needed
-        """
-        user_query = user_query.lower()
-        
-        # Detect primary intent
-        detected_intent = "general"
-        for intent, keywords in self.intent_keywords.items():
-            if any(keyword in user_query for keyword in keywords):
-                detected_intent = intent
-                break
-        
-        # Determine if visual guidance is needed
-        # Visuals are needed for task-oriented intents, not for "chat" or some "what_is"
-        if detected_intent == "chat":
-            needs_visual = False
-        elif detected_intent == "what_is":
-            # For "what_is", check if it's about a UI element. If not, likely general knowledge.
-            mentioned_elements = [element for element in self.ui_elements.keys() if element in user_query]
-            if not mentioned_elements:
-                needs_visual = False # Likely a general knowledge "what is" question
-            else:
-                needs_visual = True # "What is" about a specific UI element, might need visual
-        else:
-            needs_visual = True  # Default to True for other intents (how_to, where_is etc.)
-        
-        # Check for specific UI elements mentioned
-        mentioned_elements = []
-        for element in self.ui_elements.keys():
-            if element in user_query.lower():
-                mentioned_elements.append(element)
-        
-        return {
-            "primary_intent": detected_intent,
-            "needs_visual": needs_visual,
-            "mentioned_elements": mentioned_elements
-        }
-    
-    def create_educational_response(self, intent_data, ai_response):
-        """
-        Enhance the AI response with educational content based on intent
-        """
-        enhanced_response = ai_response
-        
-        # Add educational content about UI elements mentioned
-        if intent_data["mentioned_elements"]:
-            educational_info = []
-            for element in intent_data["mentioned_elements"]:
-                if element in self.ui_elements:
-                    educational_info.append(f"**{element.title()}**: {self.ui_elements[element]}")
-            
-            if educational_info:
-                enhanced_response += "\n\n📚 Learn More:\n" + "\n".join(educational_info)
-        
-        # For "what_is" questions, add more background when relevant
-        if intent_data["primary_intent"] == "what_is":
-            # Add general computer literacy information if no specific elements mentioned
-            if not intent_data["mentioned_elements"]:
-                enhanced_response += "\n\nI hope that helps explain it clearly! Feel free to ask if you have any other questions."
-        
-        # Add visual guidance encouragement for all responses
-        enhanced_response += "\n\nI've highlighted elements on your screen to help you visualize what I'm explaining. This should make it easier to follow along!"
-            
-        return enhanced_response
-
 class ScreenshotAnalyzerApp:
-    def __init__(self, root=None, use_qt_overlay=True):
+    def __init__(self, root=None, use_qt_overlay=True, overlay_process=False, record_path=None):
         """
         Initialize the desktop automation app
         
         Args:
             root: Optional Tkinter root window
             use_qt_overlay: Whether to use the Qt-based overlay (recommended for macOS)
+            overlay_process: Whether to render the Qt overlay in a separate process
+            record_path: Optional file to record the session to (see session_recorder.py)
         """
         # Create Tkinter root if not provided
         self.root = root if root else tk.Tk()
@@ -311,6 +160,7 @@ class ScreenshotAnalyzerApp:
         self.voice_var = tk.StringVar(value="nova") # Default voice
         self.speech_output_var = tk.BooleanVar(value=True) # Default to speech output ON
         self.educational_var = tk.BooleanVar(value=False) # Default to educational mode OFF
+        self.autonomous_var = tk.BooleanVar(value=False) # Perform whole tasks without Next Step, OFF by default
         self.text_size_var = tk.StringVar(value="Medium") # Default text size
         self.current_font_size = 14 # Default base font size, corresponds to "Medium"
 
@@ -319,6 +169,11 @@ class ScreenshotAnalyzerApp:
         # Set up model manager (handles API connections and keep-warm)
         self.model_manager = get_model_manager()
         self.model_manager.start_keep_warm() # Keep the model warm
+        # Register the fixed guidance block once so each request only carries the user turn
+        self.model_manager.register_system_instruction(COORDINATE_CONTEXT, create_coordinate_system_instruction())
+        
+        # Frames, prompts, responses, boxes and stage timings of each turn, for replay (off by default)
+        self.session_recorder = SessionRecorder.from_env(record_path)
         
         # Set up visual manager (handles Tkinter-based highlights, still needed for capture)
         self.visual_manager = VisualManager(self.root)
@@ -330,11 +185,27 @@ class ScreenshotAnalyzerApp:
         self.qt_overlay = None
         self.qt_app = None
         
-        if self.use_qt_overlay:
+        self.overlay_process = None
+        
+        if self.use_qt_overlay and overlay_process:
+            # Render in a separate process, isolated from model calls, encoding and audio
+            try:
+                self.overlay_process = RemoteOverlay()
+                self.qt_overlay = self.overlay_process
+            except Exception as e:
+                print(f"Could not start overlay process, using in-process overlay: {e}")
+        
+        if self.use_qt_overlay and not self.qt_overlay:
             # Ensure Qt app is created if needed
             # Pass self.root to potentially manage lifecycle better if needed
             self.qt_overlay, self.qt_app = create_overlay(parent_tk_root=self.root)
         
+        # Pump Qt from the Tk main loop so overlay timers and repaints run on schedule
+        self.event_loop = None
+        if self.qt_overlay and not self.overlay_process:
+            self.event_loop = QtTkEventLoop(self.root)
+            self.event_loop.start()
+        
         # AWS S3 setup for image storage
         self.s3_client = None
         self.s3_bucket = os.getenv("S3_BUCKET_NAME")
@@ -346,6 +217,9 @@ class ScreenshotAnalyzerApp:
         # UI elements
         self.setup_ui()
         
+        # Synthesize repeated phrases once so they play instantly later
+        self._warm_speech_cache()
+        
         # Other state variables
         self.last_screenshot_path = None
         self.last_screenshot_s3_url = None
@@ -355,6 +229,11 @@ class ScreenshotAnalyzerApp:
         # State for audio recording
         self.is_recording = False
         self.stop_recording_event = threading.Event()
+        self.prefetched_frame = None  # Screenshot captured while transcribing (see _start_frame_prefetch)
+        self.last_boxes = []  # Boxes of the latest response, in screen coordinates
+        self.element_cache = ElementCache()  # Elements the model located, reused while their pixels match
+        self.last_plan = []  # Actions described by the latest response
+        self.action_engine = ActionEngine(on_step=self._on_action_step)
         self.mic_button_widget = None
         self.cancel_button_widget = None
         
@@ -458,6 +337,19 @@ class ScreenshotAnalyzerApp:
         # Initially, the button might be hidden or disabled until a step is given.
         # For now, let's pack it and we can manage its state later if needed.
         self.next_step_button.pack(pady=(5,0))
+        
+        # Performs the actions of the current step (shown when the response describes any)
+        self.do_it_button = tk.Button(
+            self.next_step_button_frame,
+            text="Do It For Me ⚡",
+            font=("Outfit", 13, "bold"),
+            bg="#E0E0E0",
+            fg="black",
+            relief=tk.FLAT,
+            padx=10,
+            pady=5,
+            command=self._on_do_it_clicked
+        )
 
         # --- Suggestion Buttons ---
         suggestion_frame = tk.Frame(main_frame, bg="#FDFBF7")
@@ -583,7 +475,7 @@ class ScreenshotAnalyzerApp:
 
         self.settings_window = Toplevel(self.root)
         self.settings_window.title("Settings")
-        self.settings_window.geometry("400x450") # Adjusted size
+        self.settings_window.geometry("400x530") # Adjusted size
         self.settings_window.configure(bg="#FDFBF7")
         self.settings_window.transient(self.root) # Keep on top of main window
         self.settings_window.grab_set() # Modal behavior
@@ -633,6 +525,13 @@ class ScreenshotAnalyzerApp:
                                             bg="#FDFBF7", command=self._toggle_educational_mode, font=('Outfit', 11), selectcolor="#E0E0E0")
         educational_check.pack(side=tk.LEFT)
 
+        # --- Autonomous Mode Toggle ---
+        auto_frame = tk.LabelFrame(settings_main_frame, text="Autonomous Mode", padx=10, pady=10, bg="#FDFBF7", font=('Outfit', 12))
+        auto_frame.pack(fill=tk.X, pady=5)
+        autonomous_check = tk.Checkbutton(auto_frame, text="Do whole tasks for me", variable=self.autonomous_var,
+                                          bg="#FDFBF7", font=('Outfit', 11), selectcolor="#E0E0E0")
+        autonomous_check.pack(side=tk.LEFT)
+
         # --- Close Button for Settings ---
         close_button = tk.Button(settings_main_frame, text="Done", command=self.settings_window.destroy, 
                                  bg="#E0E0E0", relief=tk.FLAT, font=('Outfit', 12, 'bold'), padx=10)
@@ -641,6 +540,14 @@ class ScreenshotAnalyzerApp:
     def _on_voice_change(self, selection):
         self.update_status(f"Assistant voice changed to: {selection}")
         # self.voice_var is automatically updated by Tkinter
+        self._warm_speech_cache()
+    
+    def _warm_speech_cache(self):
+        """Pre-synthesize canned phrases for the current voice in the background"""
+        if not self.speech_output_var.get():
+            return
+        # Other repeated segments (e.g. UI element explanations) are cached the first time they're spoken
+        threading.Thread(target=warm_audio_cache, args=(CANNED_SPEECH_PHRASES, self.voice_var.get()), daemon=True).start()
 
     def _toggle_speech_output(self):
         status = "enabled" if self.speech_output_var.get() else "disabled"
@@ -697,6 +604,8 @@ Tap the microphone to ask your question!"""
         # Clear any highlights
         if self.qt_overlay:
             self.qt_overlay.clear_all_highlights()
+        else:
+            self.visual_manager.clear_highlights()
         
         # Show welcome message again
         self._show_welcome_message()
@@ -716,6 +625,9 @@ Tap the microphone to ask your question!"""
         # Stop any background keep-warm threads
         self.model_manager.stop_keep_warm()
         
+        # Stop playback and release the audio devices
+        get_audio_service().shutdown()
+        
         # Exit the application
         self.update_status("Exiting application...")
         self.root.after(500, self.root.quit)  # Give a brief delay to show the exit message
@@ -763,58 +675,51 @@ Tap the microphone to ask your question!"""
         print(f"Status: {message}")
         self.add_message_to_chat("status", message)
         
-    def _record_audio_continuous(self, stop_event):
+    def _record_audio_streaming(self, stop_event):
         """
-        Record audio continuously until stop_event is set.
-        Returns the path to the saved audio file or None.
+        Record 16 kHz mono audio until the user stops talking (or stop_event is set).
+        Speech segments are transcribed while recording continues.
+        Returns the transcription or None.
         """
-        chunk = 1024
-        sample_format = pyaudio.paInt16
-        channels = 1
-        fs = 44100  # Sample rate
+        transcriber = StreamingTranscriber(transcribe_audio_chunk)
+        recorder = StreamingRecorder(transcriber.submit)
         
-        p = pyaudio.PyAudio()
+        # The shared input stream is already open, so recording starts immediately
+        session = get_audio_service().start_recording()
         
-        stream = p.open(format=sample_format,
-                        channels=channels,
-                        rate=fs,
-                        frames_per_buffer=chunk,
-                        input=True)
-        frames = []
+        self.root.after(0, lambda: self.update_status("Recording started... (stops when you finish speaking)"))
         
-        self.root.after(0, lambda: self.update_status("Recording started..."))
-        
-        while not stop_event.is_set():
-            try:
-                data = stream.read(chunk, exception_on_overflow=False)
-                frames.append(data)
-            except IOError as e:
-                # Handle buffer overflow if necessary, though exception_on_overflow=False helps
-                if e.errno == pyaudio.paInputOverflowed:
-                    self.root.after(0, lambda: self.update_status("Warning: Audio input overflowed."))
-                else:
+        try:
+            while not stop_event.is_set():
+                try:
+                    data = session.read()
+                except IOError as e:
+                    # Handle buffer overflow if necessary, though exception_on_overflow=False helps
+                    if e.errno == pyaudio.paInputOverflowed:
+                        self.root.after(0, lambda: self.update_status("Warning: Audio input overflowed."))
+                        continue
                     raise
+                
+                # The recorder stops by itself after trailing silence
+                if not recorder.add_frame(data):
+                    break
+        finally:
+            session.close()
         
-        self.root.after(0, lambda: self.update_status("Recording stopped."))
-        
-        # Stop and close the stream
-        stream.stop_stream()
-        stream.close()
-        p.terminate()
+        recorder.finish()
+        self.root.after(0, lambda: self.update_status("Recording stopped. Transcribing..."))
         
-        if not frames:
-            return None
-
-        # Save to a temporary WAV file
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.wav')
-        wf = wave.open(temp_file.name, 'wb')
-        wf.setnchannels(channels)
-        wf.setsampwidth(p.get_sample_size(sample_format))
-        wf.setframerate(fs)
-        wf.writeframes(b''.join(frames))
-        wf.close()
+        # Capture the screen while the last segments are transcribed, when what was said so far
+        # already looks like a visual turn (capturing minimizes the window, so chat turns skip it)
+        partial_text = transcriber.partial_text() if recorder.speech_started else None
+        if partial_text and self.conversation_manager.detect_intent(partial_text)["needs_visual"]:
+            self._start_frame_prefetch()
         
-        return temp_file.name
+        transcription = transcriber.finish()
+        savings = transcriber.upload_savings(recorder.recorded_seconds)
+        print(f"--- Uploaded {transcriber.uploaded_bytes / 1024:.1f} KB of audio "
+              f"({savings:.0%} less than a 44.1 kHz WAV of {recorder.recorded_seconds:.1f}s) ---")
+        return transcription
 
     def toggle_recording_and_transcribe(self):
         """Toggle audio recording: start if not recording, stop if recording."""
@@ -828,6 +733,9 @@ Tap the microphone to ask your question!"""
             self.is_recording = True
             self.stop_recording_event.clear()
             
+            # Don't talk over the user (or record our own voice)
+            get_audio_service().stop_playback()
+            
             if self.mic_button_widget:
                 self.mic_button_widget.config(text="⏹️", bg="#FFA500", state=tk.NORMAL) # Stop symbol, orange bg
             if self.cancel_button_widget: # Keep cancel button enabled
@@ -837,12 +745,12 @@ Tap the microphone to ask your question!"""
             threading.Thread(target=self._execute_recording_session, daemon=True).start()
 
     def _execute_recording_session(self):
-        """Handles the audio recording process in a separate thread."""
-        audio_file_path = None
+        """Handles the audio recording and streaming transcription in a separate thread."""
+        transcription = None
         try:
-            audio_file_path = self._record_audio_continuous(self.stop_recording_event)
+            transcription = self._record_audio_streaming(self.stop_recording_event)
         except Exception as e:
-            self.root.after(0, lambda: self.update_status(f"Recording error: {e}"))
+            self.root.after(0, lambda e=e: self.update_status(f"Recording error: {e}"))
         finally:
             self.is_recording = False # Ensure this is reset
             # Reset mic button in the main thread
@@ -851,27 +759,14 @@ Tap the microphone to ask your question!"""
                 self.cancel_button_widget.config(state=tk.NORMAL) if self.cancel_button_widget else None
             })
 
-            if audio_file_path:
-                self.root.after(0, self._transcribe_audio_and_process, audio_file_path)
-            else:
-                # This case handles if recording was stopped very quickly with no data
-                self.root.after(0, lambda: self.update_status("Recording session ended. No audio data to process."))
-    
-    def _transcribe_audio_and_process(self, audio_file_path):
-        """Transcribes the audio file and then processes the resulting text."""
-        self.update_status("Transcribing audio...")
-
-        def transcribe_thread_fn():
-            transcription = speech_to_text(audio_file_path) # speech_to_text handles file cleanup
-            
             if transcription:
                 self.root.after(0, lambda t=transcription: self.process_transcribed_speech(t))
                 self.root.after(0, lambda: self.update_status("Transcription processed."))
             else:
+                # No speech was detected, or transcription failed
+                self._discard_prefetched_frame()
                 self.root.after(0, lambda: self.update_status("Transcription failed or was empty."))
-        
-        threading.Thread(target=transcribe_thread_fn, daemon=True).start()
-
+    
     def process_transcribed_speech(self, user_prompt):
         """Processes the transcribed speech as if it were user input."""
         if not user_prompt:
@@ -880,14 +775,14 @@ Tap the microphone to ask your question!"""
         
         self.add_message_to_chat("user", user_prompt)
         
-        # Detect language of user input
-        detected_language = self.detect_language(user_prompt)
+        # Detect intent and language of user input in one pass
+        intent_data = self.conversation_manager.detect_intent(user_prompt)
+        detected_language = intent_data["language"]
         self.conversation_manager.detected_language = detected_language
         if detected_language != "en":
             self.update_status(f"Detected language: {detected_language}")
         
         self.conversation_manager.add_message("user", user_prompt)
-        intent_data = self.conversation_manager.detect_intent(user_prompt)
         self.update_status(f"Detected intent: {intent_data['primary_intent']}, Visual guidance needed: {intent_data['needs_visual']}")
         
         threading.Thread(target=self.process_user_request, args=(user_prompt, intent_data), daemon=True).start()
@@ -897,47 +792,17 @@ Tap the microphone to ask your question!"""
         Detect the language of the input text.
         Returns language code (e.g., 'en', 'ur', 'de')
         """
-        # Simple language detection based on script and common markers
-        # Proper implementation would use a language detection library
-        
-        # Check for common Urdu/Arabic script characters
-        if any('\u0600' <= c <= '\u06FF' for c in text):
-            if any(marker in text for marker in ["کیسے", "ہے", "میں", "کیا"]):
-                return "ur"  # Urdu
-            return "ar"  # Default to Arabic for Arabic script
-        
-        # Check for German markers
-        if any(marker in text.lower() for marker in ["wie ", "ist ", "und ", "ich ", "der ", "das ", "ein ", "eine "]):
-            return "de"  # German
-        
-        # Default to English
-        return "en"
+        return self.conversation_manager.detect_language(text)
 
     def _create_coordinate_prompt(self, task_prompt, intent_data=None):
         """
         Creates a prompt asking the AI to answer the question and provide coordinates if relevant.
         Optimized for Gemini's bounding box format.
         Uses intent data to guide the AI response.
+        For Gemini the fixed rules live in the registered COORDINATE_CONTEXT instruction,
+        so this only builds the per-turn part.
         """
-        platform_map = {"darwin": "macOS", "win32": "Windows", "linux": "Linux"}
-        platform_name = platform_map.get(sys.platform.lower(), sys.platform)
-        
-        # Add macOS-specific guidance
-        mac_specific_guidance = ""
-        if platform_name == "macOS":
-            mac_specific_guidance = """
-MAC-SPECIFIC GUIDANCE:
-- The Dock is at the bottom of the screen with app icons
-- The Apple menu (⌘) is at the top-left corner of the screen
-- Menu bar is always at the top of the screen
-- Applications have their menus in the top menu bar, not in the app window
-- Finder is the file manager (blue face icon)
-- Mission Control shows all open windows
-- Spotlight search is accessed with the magnifying glass icon in the menu bar
-- To close apps, use Command+Q or the red button at the top-left of the window
-- To minimize windows, use the yellow button at the top-left
-- The green button at the top-left maximizes/enters full screen
-"""
+        platform_name = get_platform_name()
 
         recent_messages = self.conversation_manager.get_last_messages(3)
         context_str = "\n".join([f"{msg['role']}: {msg['content']}" for msg in recent_messages[:-1]]) if len(recent_messages) > 1 else ""
@@ -948,8 +813,7 @@ MAC-SPECIFIC GUIDANCE:
 
 """ # Ensure the f-string is properly terminated
         
-        # Check against the new default Pro model and the existing Flash model ID
-        if self.model_manager.active_model_id in ["gemini-2.5-pro-preview-05-06", "gemini-1.5-flash", "gemini-2.5-flash-preview-04-17"]:
+        if self.model_manager.is_gemini_active():
             if intent_data is None:
                 intent_data = self.conversation_manager.detect_intent(task_prompt)
             
@@ -967,38 +831,9 @@ MAC-SPECIFIC GUIDANCE:
                     # Add more as needed
                 }
                 lang_name = language_map.get(detected_lang, "the same language as the user")
-                language_instruction = f"\nIMPORTANT: The user is speaking in {lang_name}. RESPOND IN {lang_name} ONLY. Do not use English."
+                language_instruction = f"IMPORTANT: The user is speaking in {lang_name}. RESPOND IN {lang_name} ONLY. Do not use English.\n\n"
             
-            prompt = f"""You are an AI assistant helping an elderly person with limited computer knowledge learn to use their {platform_name} computer.
-Your primary goal is to guide the user through tasks by providing ONE SINGLE, CLEAR, ACTIONABLE STEP at a time.{language_instruction}
-
-{context_str}User's current request: "{task_prompt}"
-
-{mac_specific_guidance}
-
-USE EXTREMELY SIMPLE LANGUAGE: 
-- Use the simplest words possible - like you're explaining to a child
-- Use very short sentences
-- Avoid all technical terms
-- Use everyday comparisons
-- Be patient and encouraging
-- Never use jargon or abbreviations
-
-COORDINATE SYSTEM:
-- The screen's TOP-LEFT corner is (0,0).
-- Moving RIGHT increases X value (from 0 to 1000).
-- Moving DOWN increases Y value (from 0 to 1000).
-- Give coordinates as [y_min, x_min, y_max, x_max] (normalized 0-1000).
-
-YOUR RESPONSE MUST:
-1. Give ONLY ONE action for the user to do right now - never more than one step
-2. Show coordinates for just ONE element on screen for this action
-3. NEVER list multiple steps - focus only on the immediate next action
-4. For broad requests, focus on just the first logical action
-5. Use words anyone can understand, no technical terms
-6. Be encouraging and patient
-7. Make your bounding box tight around just the element needed
-8. Keep responses brief and to the point - no lengthy explanations
+            prompt = f"""{language_instruction}{context_str}User's current request: "{task_prompt}"
 
 Analyze the screenshot and give the user just the next single step they should take.
 """
@@ -1008,6 +843,9 @@ Analyze the screenshot and give the user just the next single step they should t
             if mail_related:
                 prompt += "\nIf the current action involves the Mail app icon (blue square with white envelope), make the bounding box very precise around just that icon.\n"
             
+            if self._structured_schema():
+                prompt += STRUCTURED_OUTPUT_NOTE
+            
             return prompt
         else:
             # Simplified prompt for other models, emphasizing single step
@@ -1015,12 +853,17 @@ Analyze the screenshot and give the user just the next single step they should t
 {context_str}User asks: "{task_prompt}" 
 Use extremely simple, everyday words like you're explaining to a child. Provide a single instruction and, if relevant, coordinates [[x1, y1, x2, y2]] for ONE key element for that action. Be patient and encouraging."""
 
+    def _structured_schema(self):
+        """Response schema for visual requests in structured output mode, or None for free text"""
+        if STRUCTURED_OUTPUT and self.model_manager.is_gemini_active():
+            return STEP_RESPONSE_SCHEMA
+        return None
+    
     def _create_chat_prompt(self, task_prompt):
         """
         Creates a simpler prompt for general chat interactions.
         """
-        platform_map = {"darwin": "macOS", "win32": "Windows", "linux": "Linux"}
-        platform_name = platform_map.get(sys.platform.lower(), sys.platform)
+        platform_name = get_platform_name()
         
         recent_messages = self.conversation_manager.get_last_messages(3)
         context_str = "\n".join([f"{msg['role']}: {msg['content']}" for msg in recent_messages[:-1]]) if len(recent_messages) > 1 else ""
@@ -1070,30 +913,64 @@ Provide a helpful and friendly chat response.
         # Determine if screenshot and visual analysis are needed
         needs_visual_processing = intent_data.get("needs_visual", True)
         self.update_status(f"Intent: {intent_data.get('primary_intent', 'general')}, Needs visual: {needs_visual_processing}")
+        if self.session_recorder:
+            self.session_recorder.begin_turn(user_prompt, intent_data, self.model_manager.active_model_id)
+        
+        # In autonomous mode tasks are performed step by step without the user
+        if needs_visual_processing and self.autonomous_var.get() and intent_data.get("primary_intent") != "where_is":
+            self._discard_prefetched_frame()
+            self._run_autonomous(user_prompt, intent_data)
+            return
+        
+        # "Where is X" questions the accessibility tree can answer skip the vision call
+        local_response = self._resolve_locally(user_prompt, intent_data) if needs_visual_processing else None
+        if local_response:
+            self._discard_prefetched_frame()
+            intent_data["resolved_locally"] = True
+            self._record_event("response", response=local_response, source="accessibility")
+            self.conversation_manager.add_message("assistant", local_response)
+            self.root.after(0, lambda: self._process_analysis_response(local_response, intent_data, True))
+            return
         
         image_url = None
         if needs_visual_processing:
-            if not self.take_screenshot():
-                 self.root.after(0, lambda: self.add_message_to_chat("error","Failed to take screenshot."))
-                 return # Stop if screenshot fails
-            
-            if not self.last_screenshot_path:
-                self.root.after(0, lambda: self.add_message_to_chat("error", "Screenshot path not set after capture."))
-                return
-            
-            # Use S3 URL if available, otherwise encode as base64
-            image_url = self.last_screenshot_s3_url
-            if not image_url:
-                self.root.after(0, lambda: self.update_status("Encoding image as base64..."))
+            # A frame captured while the speech was being transcribed is used if still fresh
+            image_url = self._take_prefetched_frame()
+            prefetched = image_url is not None
+            capture_start = time.perf_counter()
+            if image_url:
+                self.update_status("Using screenshot captured during transcription")
+            else:
+                if not self.take_screenshot():
+                     self.root.after(0, lambda: self.add_message_to_chat("error","Failed to take screenshot."))
+                     return # Stop if screenshot fails
+                
+                if not self.last_screenshot_path:
+                    self.root.after(0, lambda: self.add_message_to_chat("error", "Screenshot path not set after capture."))
+                    return
+                
                 try:
-                    with open(self.last_screenshot_path, "rb") as img_file:
-                        img_base64 = base64.b64encode(img_file.read()).decode('utf-8')
-                        image_url = f"data:image/png;base64,{img_base64}"
-                        self.root.after(0, lambda: self.update_status("Image encoded as base64"))
+                    image_url = self._get_screenshot_image_url()
                 except Exception as e:
-                    self.root.after(0, lambda: self.add_message_to_chat("error", f"Failed to encode image: {e}"))
+                    self.root.after(0, lambda e=e: self.add_message_to_chat("error", f"Failed to encode image: {e}"))
                     return
+            if self.session_recorder:
+                capture_ms = None if prefetched else (time.perf_counter() - capture_start) * 1000
+                self.session_recorder.frame(self.visual_manager.last_frame, self.visual_manager.last_transform,
+                                            capture_ms=capture_ms, prefetched=prefetched)
+            
+            # An element the model found before is reused if its pixels haven't changed
+            target = self._where_is_target(user_prompt, intent_data)
+            cached_response = self._resolve_from_cache(target)
+            if cached_response:
+                intent_data["resolved_locally"] = True
+                self._record_event("response", response=cached_response, source="element_cache")
+                self.conversation_manager.add_message("assistant", cached_response)
+                self.root.after(0, lambda: self._process_analysis_response(cached_response, intent_data, True))
+                return
+            intent_data["cache_target"] = target
         else:
+            self._discard_prefetched_frame()
             self.update_status("Skipping screenshot for chat-based interaction.")
         
         # Analyze Screenshot or process chat
@@ -1108,34 +985,173 @@ Provide a helpful and friendly chat response.
             
             # Call the AI model using the manager
             # image_url will be None if not needs_visual_processing, model manager should handle this
-            if not needs_visual_processing:
-                # For chat, send a null image parameter
-                response = self.model_manager.call_model(None, prompt)
+            # For visual tasks Gemini gets the cached coordinate instruction
+            context = COORDINATE_CONTEXT if needs_visual_processing and self.model_manager.is_gemini_active() else None
+            
+            # Structured responses are decoded whole, so they aren't streamed; the step is spoken once parsed
+            response_schema = self._structured_schema() if needs_visual_processing else None
+            model_start = time.perf_counter()
+            tts_pipeline = None
+            if self.speech_output_var.get() and not response_schema:
+                # Stream the answer and start speaking the first sentence while the rest is generated
+                tts_pipeline = TTSPipeline(voice=self.voice_var.get(),
+                                           on_error=lambda message: self.root.after(0, lambda: self.update_status(message)))
+                response = ""
+                for chunk in self.model_manager.stream_model(image_url, prompt, context=context):
+                    response += chunk
+                    tts_pipeline.feed(chunk)
             else:
-                # For visual tasks, send the image URL
-                response = self.model_manager.call_model(image_url, prompt)
+                response = self.model_manager.call_model(image_url, prompt, context=context,
+                                                         response_schema=response_schema)
+            self._record_event("response", response=response, source="model", prompt=prompt,
+                               model_ms=(time.perf_counter() - model_start) * 1000,
+                               stats=self.model_manager.last_call_stats)
+            
+            step = parse_structured_response(response) if response_schema else None
+            if step:
+                response = step['step_text']
+            elif response_schema:
+                print("--- Structured response could not be decoded, parsing it as free text ---")
             
             # Educational enhancement is now conditional based on the initial mode and if it's not a pure chat interaction
             enhanced_response = response
             if self.educational_mode and needs_visual_processing: # Only apply if educational mode is on AND it was a visual task
                 enhanced_response = self.conversation_manager.create_educational_response(intent_data, response)
             
+            if tts_pipeline:
+                # Speak the educational additions after the streamed answer
+                tts_pipeline.feed(enhanced_response[len(response):])
+                tts_pipeline.finish()
+            
             # Add to conversation history
             self.conversation_manager.add_message("assistant", enhanced_response)
+            self.conversation_manager.log_turn(user_prompt, intent_data, response,
+                                               had_box=bool(step['boxes']) if step else None)
             
             # Update UI in main thread after model call
-            self.root.after(0, lambda: self._process_analysis_response(enhanced_response, intent_data, needs_visual_processing))
+            already_spoken = tts_pipeline is not None
+            self.root.after(0, lambda: self._process_analysis_response(enhanced_response, intent_data, needs_visual_processing, already_spoken, step))
             
         except Exception as e:
             self.root.after(0, lambda: self.add_message_to_chat("error", f"Analysis error: {e}"))
             
+    def _resolve_locally(self, user_prompt, intent_data):
+        """
+        Answer a "where is X" question from the accessibility element index
+        Returns a response with the element's box in Gemini format, or None to use the vision model
+        """
+        target = self._where_is_target(user_prompt, intent_data)
+        element = self.visual_manager.locate_element(target) if target else None
+        if element is None:
+            return None
+        
+        name = element.name or element.role
+        print(f"--- Resolved '{target}' locally: {element} ---")
+        self.update_status(f"Found {name} without a screenshot")
+        return self._located_response(name, element.x, element.y, element.width, element.height)
+    
+    def _resolve_from_cache(self, target):
+        """
+        Answer from the element cache when the element is still where the model last found it
+        Returns a response with the element's box in Gemini format, or None
+        """
+        frame = self.visual_manager.last_frame
+        if not target or frame is None:
+            return None
+        start_time = time.perf_counter()
+        box = self.element_cache.lookup(target, frame)
+        if box is None:
+            return None
+        print(f"--- Verified cached '{target}' in {(time.perf_counter() - start_time) * 1000:.1f}ms ---")
+        self.update_status(f"Found {target} where it was last time")
+        return self._located_response(target, *self._coordinate_transform().frame_to_screen(*box))
+    
+    def _where_is_target(self, user_prompt, intent_data):
+        """The element an English "where is X" question asks about, or None"""
+        if intent_data.get("primary_intent") != "where_is" or intent_data.get("language", "en") != "en":
+            return None
+        target = extract_target(user_prompt)
+        if not target and intent_data.get("mentioned_elements"):
+            target = intent_data["mentioned_elements"][0]
+        return target
+    
+    def _screen_size(self):
+        """Primary screen size in screen coordinates (pyautogui's, which highlights and clicks use)"""
+        return pyautogui.size()
+    
+    def _coordinate_transform(self):
+        """Transform of the last captured frame (the primary screen before the first capture)"""
+        transform = self.visual_manager.last_transform
+        if transform is None:
+            transform = CoordinateTransform(0, 0, *self._screen_size())
+        return transform
+    
+    def _located_response(self, name, x, y, width, height):
+        """Response for an element located without the vision model, with its box in Gemini format"""
+        box = self._coordinate_transform().screen_to_model(x, y, width, height)
+        return f"I've highlighted {name} on your screen for you {box}. Click it when you're ready."
+    
+    def _get_screenshot_image_url(self):
+        """Return the S3 URL of the last screenshot if available, otherwise encode it as base64"""
+        if self.last_screenshot_s3_url:
+            return self.last_screenshot_s3_url
+        
+        self.root.after(0, lambda: self.update_status("Encoding image as base64..."))
+        with open(self.last_screenshot_path, "rb") as img_file:
+            img_base64 = base64.b64encode(img_file.read()).decode('utf-8')
+        self.root.after(0, lambda: self.update_status("Image encoded as base64"))
+        return f"data:image/png;base64,{img_base64}"
+    
+    def _start_frame_prefetch(self):
+        """
+        Capture and encode a screenshot in the background as soon as recording stops on a
+        likely visual turn, and pre-warm the model context, so both are ready when the
+        transcription arrives.
+        """
+        prefetch = {"ready": threading.Event(), "image_url": None, "captured_at": None}
+        self.prefetched_frame = prefetch
+        
+        def _prefetch_task():
+            start_time = time.perf_counter()
+            try:
+                if self.take_screenshot() and self.last_screenshot_path:
+                    prefetch["image_url"] = self._get_screenshot_image_url()
+                    prefetch["captured_at"] = time.time()
+                    print(f"--- Prefetched frame in {time.perf_counter() - start_time:.2f}s ---")
+            except Exception as e:
+                print(f"Error prefetching frame: {e}")
+            finally:
+                prefetch["ready"].set()
+        
+        threading.Thread(target=_prefetch_task, daemon=True).start()
+        threading.Thread(target=self.model_manager.prewarm_context, args=(COORDINATE_CONTEXT,), daemon=True).start()
+    
+    def _take_prefetched_frame(self, timeout=PREFETCH_WAIT_TIMEOUT):
+        """Wait for and consume the prefetched frame. Returns its image URL, or None if missing or stale."""
+        prefetch = self.prefetched_frame
+        self.prefetched_frame = None
+        if not prefetch or not prefetch["ready"].wait(timeout):
+            return None
+        if not prefetch["image_url"] or time.time() - prefetch["captured_at"] > PREFETCH_MAX_AGE:
+            return None
+        return prefetch["image_url"]
+    
+    def _discard_prefetched_frame(self):
+        """Drop a prefetched frame that won't be used (e.g. chat turns or failed transcription)"""
+        self.prefetched_frame = None
+    
+    def _record_event(self, event_type, **fields):
+        """Add an event to the session recording, if one is being made"""
+        if self.session_recorder:
+            self.session_recorder.event(event_type, **fields)
+    
     def take_screenshot(self):
         """Take screenshot and prepare for analysis. Returns True on success, False on failure."""
         self.root.after(0, lambda: self.update_status("Taking screenshot..."))
         
-        # Clear any existing highlights from the overlay
+        # Clear any existing highlights from the overlay (on the GUI thread)
         if self.qt_overlay:
-            self.qt_overlay.clear_all_highlights()
+            self.root.after(0, self.qt_overlay.clear_all_highlights)
         else:
             self.root.after(0, self.visual_manager.clear_highlights)
         
@@ -1206,8 +1222,9 @@ Provide a helpful and friendly chat response.
             return False
         return True
         
-    def _process_analysis_response(self, response, intent_data=None, was_visual_processing=True):
-        """Process the AI's response, update chat."""
+    def _process_analysis_response(self, response, intent_data=None, was_visual_processing=True, already_spoken=False,
+                                   step=None):
+        """Process the AI's response, update chat. step is the decoded structured response, if any."""
         if not response:
              self.add_message_to_chat("error", "Received empty response from AI.")
              if was_visual_processing: # Only hide if it might have been shown
@@ -1219,28 +1236,37 @@ Provide a helpful and friendly chat response.
         
         if was_visual_processing:
             # Logic to decide if "Next Step" button should be shown.
-            instructional_phrases = ["first,", "next,", "then,", "click on", "now, try", "the next step is", "you should now"]
-            response_lower = response.lower()
-            has_instruction_cue = any(phrase in response_lower for phrase in instructional_phrases)
-            has_coordinates = re.search(r"\[[\d\.,\s]+\]", response) # Check for coordinate pattern
-
-            if has_instruction_cue or has_coordinates:
-                completion_phrases = ["task is complete", "you've successfully", "all done", "that's it!", "you're all set"]
-                if not any(phrase in response_lower for phrase in completion_phrases):
-                    self._show_next_step_button()
-                else:
-                    self._hide_next_step_button() # Task seems complete
+            if step is not None:
+                # Structured responses say so directly
+                gives_step = bool(step['boxes']) or step['action']['kind'] != "none"
+                complete = step['is_complete']
             else:
-                self._hide_next_step_button() # Not clearly a step, so hide it
+                gives_step, complete = has_instruction(response), is_task_complete(response)
+            if gives_step and not complete:
+                self._show_next_step_button()
+            else:
+                self._hide_next_step_button() # Task seems complete, or not clearly a step
 
             # Always try to find coordinates in the response for highlighting
-            self._highlight_from_response(response)
+            # (accessibility boxes are exact, and no frame was captured for them)
+            resolved_locally = bool(intent_data and intent_data.get("resolved_locally"))
+            self._highlight_from_response(response, refine=not resolved_locally,
+                                          cache_target=intent_data.get("cache_target") if intent_data else None,
+                                          step=step)
+            if step is not None:
+                self.last_plan = structured_action_plan(step, self.last_boxes)
+            else:
+                self.last_plan = parse_action_plan(response, self.last_boxes)
+            if self.last_plan:
+                self.do_it_button.pack(pady=(5,0))
+            else:
+                self.do_it_button.pack_forget()
         else:
             # For non-visual (chat) responses, ensure Next Step is hidden
             self._hide_next_step_button()
         
-        # Convert to speech if enabled
-        if self.speech_output_var.get():
+        # Convert to speech if enabled (streamed responses are spoken while they arrive)
+        if self.speech_output_var.get() and not already_spoken:
             threading.Thread(target=self._speak_response, args=(response,), daemon=True).start()
         
         self.update_status("Analysis complete.")
@@ -1248,7 +1274,7 @@ Provide a helpful and friendly chat response.
     def _speak_response(self, text):
         """Convert text to speech and play it"""
         try:
-            # We already simplified the text in the text_to_speech function
+            # The TTS pipeline simplifies each sentence before synthesis
             # No need to repeat the same text cleanup here
             
             # Skip speech for very long responses to speed up interaction
@@ -1260,204 +1286,86 @@ Provide a helpful and friendly chat response.
             # Use the selected voice from the dropdown
             voice = self.voice_var.get()
             
-            # Generate speech in a separate thread to keep UI responsive
-            def generate_and_play():
-                try:
-                    audio_path = text_to_speech(text, voice)
-                    if audio_path:
-                        self.root.after(0, lambda: self.update_status(f"Playing audio response..."))
-                        play_audio(audio_path)
-                    else:
-                        self.root.after(0, lambda: self.update_status("Failed to generate speech."))
-                except Exception as e:
-                    self.root.after(0, lambda: self.update_status(f"Speech playback error: {e}"))
-            
-            # Start speech generation in background thread
-            speech_thread = threading.Thread(target=generate_and_play, daemon=True)
-            speech_thread.start()
+            # Synthesis and playback run on the pipeline's background thread, sentence by sentence
+            tts_pipeline = TTSPipeline(voice=voice,
+                                       on_error=lambda message: self.root.after(0, lambda: self.update_status(message)))
+            tts_pipeline.speak(text)
             
         except Exception as e:
             self.update_status(f"Speech synthesis error: {e}")
         
-    def _highlight_from_response(self, response):
-        """Extract coordinates from response and use them for highlighting."""
+    def _highlight_from_response(self, response, refine=True, cache_target=None, step=None):
+        """
+        Extract every bounding box from the response (or the structured step)
+        and highlight them together. Boxes are snapped to the captured frame
+        if refine; a single box for cache_target is remembered in the element cache.
+        """
         # Print the full response for debugging
         print(f"\n--- FULL AI RESPONSE ---\n{response}\n---END RESPONSE---\n")
         
-        # First try to match Gemini 2.5/1.5 format [y_min, x_min, y_max, x_max]
-        gemini_patterns = [
-            r"\[([\d\.]+),\s*([\d\.]+),\s*([\d\.]+),\s*([\d\.]+)\]",  # Standard [y_min, x_min, y_max, x_max]
-            r"coordinates:?\s*\[([\d\.]+),\s*([\d\.]+),\s*([\d\.]+),\s*([\d\.]+)\]",  # With "coordinates:" prefix
-            r"bounding box:?\s*\[([\d\.]+),\s*([\d\.]+),\s*([\d\.]+),\s*([\d\.]+)\]",  # With "bounding box:" prefix
-        ]
+        # Boxes are relative to the captured monitor (or stitched desktop)
+        transform = self._coordinate_transform()
+        self.last_boxes = []
         
-        for pattern in gemini_patterns:
-            match = re.search(pattern, response)
-            if match:
-                try:
-                    # Extract Gemini coordinates in order: y_min, x_min, y_max, x_max
-                    y_min = float(match.group(1))
-                    x_min = float(match.group(2))
-                    y_max = float(match.group(3))
-                    x_max = float(match.group(4))
-                    
-                    self.update_status(f"Found Gemini coordinates: [{y_min}, {x_min}, {y_max}, {x_max}]")
-                    
-                    # Get screen dimensions
-                    if self.use_qt_overlay and self.qt_overlay:
-                        screen_width = self.qt_overlay.screen_width
-                        screen_height = self.qt_overlay.screen_height
-                        dpr = getattr(self.qt_overlay, 'device_pixel_ratio', 1.0)
-                    else:
-                        screen_width = self.root.winfo_screenwidth()
-                        screen_height = self.root.winfo_screenheight()
-                    
-                    # Calculate pixel coordinates from normalized coordinates (0-1000)
-                    x1 = int(x_min * screen_width / 1000)
-                    y1 = int(y_min * screen_height / 1000)
-                    x2 = int(x_max * screen_width / 1000)
-                    y2 = int(y_max * screen_height / 1000)
-                    width = x2 - x1
-                    height = y2 - y1
-                    
-                    self.update_status(f"Calculated pixel coordinates: x1={x1}, y1={y1}, width={width}, height={height}")
-                    
-                    # Determine what kind of element we're highlighting
-                    is_mail_icon = any(term.lower() in response.lower() for term in ["mail app", "mail icon", "email app"])
-                    is_dock_icon = any(term.lower() in response.lower() for term in ["dock", "taskbar", "launcher"]) or is_mail_icon
-                    
-                    # Handle element-specific adjustments
-                    if is_mail_icon:
-                        # Create more precise boundaries for mail icon (square with center preserved)
-                        center_x = (x1 + x2) / 2
-                        center_y = (y1 + y2) / 2
-                        box_size = min(width, height) * 0.85  # Tighter box
-                        half_size = box_size / 2
-                        x1 = int(center_x - half_size)
-                        y1 = int(center_y - half_size)
-                        width = int(box_size)
-                        height = int(box_size)
-                        self.update_status("Refined coordinates for Mail icon")
-                    elif is_dock_icon and not (width > height * 3 or height > width * 3):
-                        # For other dock icons, make more square if not extremely elongated
-                        center_x = (x1 + x2) / 2
-                        center_y = (y1 + y2) / 2
-                        refined_size = int(min(width, height) * 0.9)  # Use smaller dimension with slight reduction
-                        half_size = refined_size / 2
-                        x1 = int(center_x - half_size)
-                        y1 = int(center_y - half_size)
-                        width = refined_size
-                        height = refined_size
-                        self.update_status("Refined coordinates for dock icon")
-                    
-                    # Ensure minimum size for visibility
-                    min_size = 20 if is_dock_icon else 30
-                    width = max(width, min_size)
-                    height = max(height, min_size)
-                    
-                    # Add highlight with the Qt overlay
-                    if self.use_qt_overlay and self.qt_overlay:
-                        # Extract context for a helpful message
-                        # Find sentence containing coordinates, or a clear instruction nearby
-                        message = "Click here"  # Default
-                        
-                        # Try to find a clear instruction in the text
-                        instruction_patterns = [
-                            r"(?:click|tap|press)(?:\s+on)?\s+(?:the\s+)?([^\.,]+)",  # "click on the X" or "click X"
-                            r"(?:select|choose)(?:\s+the)?\s+([^\.,]+)",  # "select the X"
-                            r"(?:open|launch)(?:\s+the)?\s+([^\.,]+)"  # "open the X"
-                        ]
-                        
-                        for i_pattern in instruction_patterns:
-                            i_match = re.search(i_pattern, response.lower())
-                            if i_match:
-                                action_target = i_match.group(1).strip()
-                                if 5 <= len(action_target) <= 40:  # Reasonable length for a message
-                                    message = f"Click {action_target}"
-                                    break
-                        
-                        # If we still have the default, try to extract message from coordinate context
-                        if message == "Click here":
-                            sentence_with_coords = re.search(r'([^.!?]*' + re.escape(match.group(0)) + r'[^.!?]*[.!?])', response)
-                            if sentence_with_coords:
-                                clean_sentence = re.sub(re.escape(match.group(0)), "", sentence_with_coords.group(1)).strip()
-                                if clean_sentence and 5 <= len(clean_sentence) <= 60:
-                                    message = clean_sentence
-                        
-                        # Add highlight with improved visibility
-                        self.qt_overlay.add_highlight(
-                            x1, y1, width, height,
-                            message,
-                            show_click=True,
-                            flash=True,
-                            fade_out=False
-                        )
-                        self.update_status(f"Added highlight at x={x1}, y={y1}, w={width}, h={height}")
-                    else:
-                        self.update_status("Qt overlay not available for highlighting")
-                    
-                    return  # Successfully processed coordinates
-                except Exception as e:
-                    self.update_status(f"Error processing coordinates: {e}")
-        
-        # Fall back to other coordinate formats if Gemini format not found
-        alternative_patterns = [
-            r"\[\[([\d\.]+),?\s*([\d\.]+),?\s*([\d\.]+),?\s*([\d\.]+)\]\]",  # [[x,y,x,y]]
-            r"coordinates:?\s*\[\[([\d\.]+),?\s*([\d\.]+),?\s*([\d\.]+),?\s*([\d\.]+)\]\]"  # coordinates: [[x,y,x,y]]
-        ]
+        start_time = time.perf_counter()
+        try:
+            if step is not None:
+                boxes = structured_boxes(step, transform.width, transform.height)
+            else:
+                boxes = parse_highlight_boxes(response, transform.width, transform.height,
+                                              image_size=(transform.upload_width, transform.upload_height))
+        except Exception as e:
+            self.update_status(f"Error processing coordinates: {e}")
+            return
+        parse_ms = (time.perf_counter() - start_time) * 1000
+        if not boxes:
+            self._record_event("boxes", boxes=[], refine=refine, parse_ms=parse_ms)
+            self.update_status("No recognizable coordinates found in the response")
+            return
         
-        for pattern in alternative_patterns:
-            match = re.search(pattern, response)
-            if match:
-                try:
-                    # Alternative format - could be [x1,y1,x2,y2] or other arrangement
-                    # Assume x1,y1,x2,y2 format to start
-                    vals = [float(match.group(i)) for i in range(1, 5)]
-                    
-                    # Check if these look like normalized values (0-1)
-                    is_normalized = any('.' in match.group(i) and float(match.group(i)) <= 1.0 for i in range(1, 5))
-                    
-                    # Get screen dimensions
-                    if self.use_qt_overlay and self.qt_overlay:
-                        screen_width = self.qt_overlay.screen_width
-                        screen_height = self.qt_overlay.screen_height
-                    else:
-                        screen_width = self.root.winfo_screenwidth()
-                        screen_height = self.root.winfo_screenheight()
-                    
-                    # Convert to pixel coordinates
-                    if is_normalized:
-                        x1, y1, x2, y2 = [int(vals[0] * screen_width), int(vals[1] * screen_height), 
-                                          int(vals[2] * screen_width), int(vals[3] * screen_height)]
-                    else:
-                        x1, y1, x2, y2 = [int(v) for v in vals]
-                    
-                    # Ensure correct ordering
-                    if x2 < x1: x1, x2 = x2, x1
-                    if y2 < y1: y1, y2 = y2, y1
-                    
-                    width = x2 - x1
-                    height = y2 - y1
-                    
-                    # Ensure minimum size
-                    width = max(width, 30)
-                    height = max(height, 30)
-                    
-                    # Add highlight
-                    if self.use_qt_overlay and self.qt_overlay:
-                        self.qt_overlay.add_highlight(
-                            x1, y1, width, height,
-                            "Click here",
-                            show_click=True,
-                            flash=True,
-                            fade_out=False
-                        )
-                        self.update_status(f"Added highlight using alternative coordinates")
-                    return
-                except Exception as e:
-                    self.update_status(f"Error processing alternative coordinates: {e}")
+        # Snap the boxes to the UI elements in the captured frame
+        frame = self.visual_manager.last_frame
+        refine_ms = 0.0
+        if refine and frame is not None:
+            refine_ms = refine_boxes(boxes, frame, transform.scale_x, transform.scale_y)
+            snapped = sum(1 for box in boxes if box.get('snapped'))
+            print(f"--- Snapped {snapped}/{len(boxes)} box(es) to UI elements in {refine_ms:.1f}ms ---")
+        self.last_boxes = transform.boxes_to_screen(boxes)
+        # Remember where the model found the element, to answer the same question without it
+        if refine and frame is not None and cache_target and len(boxes) == 1:
+            box = boxes[0]
+            self.element_cache.store(cache_target, frame,
+                                     transform.screen_to_frame(box['x'], box['y'], box['width'], box['height']))
+        
+        for box in boxes:
+            self.update_status(f"Found {box['source']} box: x1={box['x']}, y1={box['y']}, "
+                               f"width={box['width']}, height={box['height']}")
+        
+        overlay_start = time.perf_counter()
+        if not (self.use_qt_overlay and self.qt_overlay):
+            # Tkinter fallback overlay, animated on the Tk event loop
+            self.visual_manager.remove_group(RESPONSE_HIGHLIGHT_GROUP)
+            self.visual_manager.highlight_areas([
+                {
+                    'x': box['x'], 'y': box['y'], 'width': box['width'], 'height': box['height'],
+                    'message': box['message'],
+                    'show_click': index == 0,
+                    'duration': None,
+                }
+                for index, box in enumerate(boxes)
+            ], group=RESPONSE_HIGHLIGHT_GROUP)
+            self.update_status(f"Added {len(boxes)} highlight(s) with the Tkinter overlay")
+        else:
+            # Replace the previous response's highlights in one repaint; the first step is drawn on top
+            with self.qt_overlay.batch():
+                self.qt_overlay.remove_group(RESPONSE_HIGHLIGHT_GROUP, fade=False)
+                self.qt_overlay.add_highlights(highlight_specs(boxes), group=RESPONSE_HIGHLIGHT_GROUP)
+            self.update_status(f"Added {len(boxes)} highlight(s)")
         
-        self.update_status("No recognizable coordinates found in the response")
+        # Boxes are recorded in screen coordinates, as replay produces them
+        self._record_event("boxes", refine=refine, parse_ms=parse_ms, refine_ms=refine_ms,
+                           overlay_ms=(time.perf_counter() - overlay_start) * 1000,
+                           boxes=[[round(box[key]) for key in ('x', 'y', 'width', 'height')] for box in boxes])
         
     def _show_next_step_button(self):
         """Makes the 'Next Step' button visible."""
@@ -1468,6 +1376,84 @@ Provide a helpful and friendly chat response.
         """Hides the 'Next Step' button."""
         self.next_step_button_frame.pack_forget()
 
+    def _on_do_it_clicked(self):
+        """Perform the actions of the current step, then offer the next step"""
+        plan, self.last_plan = self.last_plan, []
+        if not plan:
+            return
+        self._hide_next_step_button()
+        self.do_it_button.pack_forget()
+        # Highlights would show up in the frame differences that verify each action
+        if self.use_qt_overlay and self.qt_overlay:
+            self.qt_overlay.remove_group(RESPONSE_HIGHLIGHT_GROUP, fade=False)
+        self.visual_manager.remove_group(RESPONSE_HIGHLIGHT_GROUP)
+        self.update_status(f"Performing {len(plan)} action(s)...")
+        threading.Thread(target=self._run_action_plan, args=(plan,), daemon=True).start()
+    
+    def _run_action_plan(self, plan):
+        time.sleep(0.1)  # Let the overlay repaint without the highlights
+        result = self.action_engine.run(plan, transform=self._coordinate_transform())
+        if result.aborted:
+            message = "Stopped: the mouse was moved into a screen corner."
+        elif result.completed:
+            message = f"Done: {len(result.steps)} action(s) in {result.total_ms / 1000:.1f}s."
+        else:
+            message = (f"Stopped after {len(result.steps)} of {len(plan)} action(s): "
+                       f"the screen didn't change as expected.")
+        self.update_status(message)
+        self.root.after(0, lambda: self.add_message_to_chat("assistant", message))
+        self.root.after(0, self._show_next_step_button)
+    
+    def _on_action_step(self, action, step):
+        """After each performed action: forget cached elements around where it happened"""
+        frame = self.visual_manager.last_frame
+        if frame is None or action.x is None or action.kind in (TYPE, HOTKEY):
+            return
+        radius = 50
+        region = self._coordinate_transform().screen_to_frame(action.x - radius, action.y - radius, 2 * radius, 2 * radius)
+        self.element_cache.invalidate_region(*region)
+    
+    def _run_autonomous(self, user_prompt, intent_data):
+        """Run a task with the capture-act-verify loop (on the request thread)"""
+        self.update_status("Autonomous mode: working on it (move the mouse into a screen corner to stop)...")
+        context = COORDINATE_CONTEXT if self.model_manager.is_gemini_active() else None
+        
+        def model(prompt, image_url):
+            return self.model_manager.call_model(image_url, self._create_coordinate_prompt(prompt, intent_data),
+                                                 context=context, response_schema=self._structured_schema())
+        
+        def on_step(step):
+            message = f"Step {step['step']}: {step['response']}"
+            self.root.after(0, lambda: self.add_message_to_chat("assistant", message))
+            print(f"--- Autonomous step {step['step']}: capture={step['capture']:.0f}ms model={step['model']:.0f}ms "
+                  f"parse={step['parse']:.1f}ms act={step['act']:.0f}ms settle={step['settle']:.0f}ms ---")
+        
+        # The app window stays out of the way (and out of the frames) for the whole task
+        self.root.after(0, self.root.iconify)
+        time.sleep(0.3)
+        loop = AutonomousLoop(self._capture_for_loop, model, self.action_engine, on_step=on_step)
+        try:
+            result = loop.run(user_prompt)
+        finally:
+            self.root.after(0, self.root.deiconify)
+        print(f"--- Autonomous run: {result.format()} ---")
+        
+        if result.status == COMPLETE:
+            message = f"All done in {len(result.steps)} step(s)."
+        elif result.status == ABORTED:
+            message = "Stopped: the mouse was moved into a screen corner."
+        else:
+            message = f"I stopped after {len(result.steps)} step(s) ({result.status.replace('_', ' ')}). Let's continue together."
+        self.conversation_manager.add_message("assistant", message)
+        self.root.after(0, lambda: self.add_message_to_chat("assistant", message))
+        self.update_status(message)
+    
+    def _capture_for_loop(self):
+        """Capture the screen for the autonomous loop: (PNG data URL, BGRA pixels, CoordinateTransform)"""
+        img_bytes, _, _, _ = self.visual_manager.capture_screen(draw_grid=False)
+        return (f"data:image/png;base64,{base64.b64encode(img_bytes).decode('utf-8')}",
+                self.visual_manager.last_frame, self.visual_manager.last_transform)
+    
     def _on_next_step_clicked(self):
         """Handles the 'Next Step' button click."""
         user_prompt = "Okay, I've done that. What's the next step?"
@@ -1504,10 +1490,21 @@ Provide a helpful and friendly chat response.
         """Run the application main loop"""
         self.root.mainloop()
         
+        if self.event_loop:
+            self.event_loop.stop()
+            print(f"Event loop: {self.event_loop.metrics.format()}")
+        if self.overlay_process:
+            self.overlay_process.close()
+        if self.session_recorder:
+            self.session_recorder.close()
+        
         # Stop any background keep-warm threads
         print("Stopping keep-warm thread...")
         self.model_manager.stop_keep_warm()
         
+        # Release the audio devices
+        get_audio_service().shutdown()
+        
         # Clean up Qt if it was created and we own the app instance
         if self.qt_app:
              print("Attempting to quit Qt application...")
@@ -1517,6 +1514,8 @@ def main():
     """Main entry point"""
     parser = argparse.ArgumentParser(description="AI Desktop Assistant")
     parser.add_argument("--no-qt", action="store_true", help="Disable Qt overlay (use Tkinter only)")
+    parser.add_argument("--overlay-process", action="store_true", help="Render the Qt overlay in a separate process")
+    parser.add_argument("--record", metavar="PATH", help="Record the session for replay with session_recorder.py")
     args = parser.parse_args()
     
     # Decide whether to use Qt overlay based on flag and platform (optional)
@@ -1530,7 +1529,8 @@ def main():
     root = tk.Tk()
     
     # Create and run app
-    app = ScreenshotAnalyzerApp(root, use_qt_overlay=use_qt)
+    app = ScreenshotAnalyzerApp(root, use_qt_overlay=use_qt, overlay_process=args.overlay_process,
+                                record_path=args.record)
     
     # Start the Tkinter event loop using app.run() which calls root.mainloop()
     app.run()
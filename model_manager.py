@@ -1,5 +1,6 @@
 import threading
 import time
+import datetime
 import replicate
 import os
 from dotenv import load_dotenv
@@ -21,6 +22,22 @@ LLAVA_VERSION_HASH = "80537f9eead1a5bfa72d5ac6ea6414379be41d4d4f6679fd776e9535d1
 GEMINI_MODEL_ID = "gemini-2.5-pro-preview-05-06"
 GEMINI_FLASH_ID = "gemini-1.5-flash" # Keeping 1.5 Flash as the alternative Flash model
 GEMINI_2_5_FLASH_MODEL_ID = "gemini-2.5-flash-preview-04-17"
+GEMINI_MODEL_IDS = [GEMINI_MODEL_ID, GEMINI_FLASH_ID, GEMINI_2_5_FLASH_MODEL_ID]
+
+# Gemini context caching for fixed system instructions
+GEMINI_CACHE_TTL = 3600  # seconds a cached context lives on the server
+GEMINI_CACHE_REFRESH_MARGIN = 60  # refresh this many seconds before expiry
+GEMINI_CACHE_RETRY_BACKOFF = 30  # seconds before retrying a failed cache creation, doubling per failure
+GEMINI_CACHE_RETRY_MAX_BACKOFF = 1800
+# Rejections that won't change on retry: the instruction is below the minimum cacheable size,
+# or the model can't cache contexts at all
+GEMINI_CACHE_UNSUPPORTED_MARKERS = ("min_total_token_count", "too small", "does not support",
+                                    "not supported", "unsupported")
+
+def _is_cache_unsupported_error(error):
+    """Whether a context cache creation error is a permanent rejection rather than a transient failure"""
+    message = str(error).lower()
+    return any(marker in message for marker in GEMINI_CACHE_UNSUPPORTED_MARKERS)
 
 class ModelManager:
     def __init__(self):
@@ -53,6 +70,124 @@ class ModelManager:
         self.warm_up_interval = 300  # seconds (5 minutes)
         self.warm_up_thread = None
         self.stop_warm_up = threading.Event()
+        
+        # Fixed system instructions, registered once and reused on every call
+        self.system_instructions = {}  # Context name -> instruction text
+        self.context_models = {}  # (model_id, context name) -> cached model entry
+        self.caching_unsupported = set()  # Model IDs that rejected context caching for good
+        self.caching_backoff = {}  # Model ID -> seconds to wait after its last transient failure
+        self.context_lock = threading.Lock()
+        
+        # Stats for the most recent call (latency and token usage)
+        self.last_call_stats = {}
+    
+    def is_gemini_active(self):
+        """Whether the active model is one of the Gemini models"""
+        return self.active_model_id in GEMINI_MODEL_IDS
+    
+    def _get_gemini_model(self, model_id):
+        """Return the base Gemini model object for a model ID"""
+        if model_id == GEMINI_FLASH_ID:  # This is 1.5 Flash
+            return self.gemini_flash_1_5_model
+        elif model_id == GEMINI_2_5_FLASH_MODEL_ID:  # This is 2.5 Flash
+            return self.gemini_2_5_flash_model
+        return self.gemini_model  # Default to Pro (GEMINI_MODEL_ID)
+    
+    def register_system_instruction(self, name, instruction):
+        """
+        Register a fixed instruction block under a context name.
+        
+        Gemini calls made with this context send the block once as a cached
+        context (or system instruction) per model instead of repeating it in
+        every request, so each request only carries the user turn and image.
+        """
+        with self.context_lock:
+            if self.system_instructions.get(name) == instruction:
+                return
+            self.system_instructions[name] = instruction
+            # Drop stale entries built from a previous version of this instruction
+            for key in [key for key in self.context_models if key[1] == name]:
+                self._discard_context_entry(self.context_models.pop(key))
+    
+    def _discard_context_entry(self, entry):
+        """Delete the server-side cache behind a context entry, if any"""
+        cache = entry.get('cache')
+        if cache is not None:
+            try:
+                cache.delete()
+            except Exception as e:
+                print(f"Error deleting cached context: {e}")
+    
+    def _create_context_entry(self, model_id, name):
+        """Create a cached context for a model, falling back to a plain system instruction"""
+        instruction = self.system_instructions[name]
+        if model_id not in self.caching_unsupported:
+            try:
+                from google.generativeai import caching
+                cache = caching.CachedContent.create(
+                    model=f"models/{model_id}",
+                    display_name=f"ai-assistant-{name}",
+                    system_instruction=instruction,
+                    ttl=datetime.timedelta(seconds=GEMINI_CACHE_TTL)
+                )
+                print(f"Created cached context '{name}' for {model_id}")
+                self.caching_backoff.pop(model_id, None)
+                return {
+                    'model': genai.GenerativeModel.from_cached_content(cached_content=cache),
+                    'cache': cache,
+                    'expires_at': time.time() + GEMINI_CACHE_TTL
+                }
+            except Exception as e:
+                if _is_cache_unsupported_error(e):
+                    print(f"Context caching unavailable for {model_id}, using system instruction: {e}")
+                    self.caching_unsupported.add(model_id)
+                else:
+                    # Network or quota trouble: use the system instruction for now and retry later
+                    backoff = self.caching_backoff.get(model_id, GEMINI_CACHE_RETRY_BACKOFF)
+                    self.caching_backoff[model_id] = min(backoff * 2, GEMINI_CACHE_RETRY_MAX_BACKOFF)
+                    print(f"Error creating cached context '{name}' for {model_id}, retrying in {backoff}s: {e}")
+                    return {
+                        'model': genai.GenerativeModel(model_name=model_id, system_instruction=instruction),
+                        'cache': None,
+                        'expires_at': time.time() + backoff + GEMINI_CACHE_REFRESH_MARGIN
+                    }
+        
+        return {
+            'model': genai.GenerativeModel(model_name=model_id, system_instruction=instruction),
+            'cache': None,
+            'expires_at': None  # System instructions never expire
+        }
+    
+    def _get_context_model(self, model_id, name):
+        """Return a model bound to the named context, refreshing it when it is about to expire"""
+        with self.context_lock:
+            key = (model_id, name)
+            entry = self.context_models.get(key)
+            if entry and entry['expires_at'] is not None and \
+                    time.time() >= entry['expires_at'] - GEMINI_CACHE_REFRESH_MARGIN:
+                print(f"Cached context '{name}' for {model_id} is expiring, refreshing")
+                self._discard_context_entry(entry)
+                entry = None
+            if entry is None:
+                entry = self._create_context_entry(model_id, name)
+                self.context_models[key] = entry
+            return entry
+    
+    def prewarm_context(self, name):
+        """Build (or refresh) the active model's context ahead of a call, off the critical path"""
+        if not self.is_gemini_active() or name not in self.system_instructions:
+            return
+        try:
+            self._get_context_model(self.active_model_id, name)
+        except Exception as e:
+            print(f"Error pre-warming context '{name}': {e}")
+    
+    def _invalidate_context(self, model_id, name):
+        """Forget a context entry so the next call rebuilds it"""
+        with self.context_lock:
+            entry = self.context_models.pop((model_id, name), None)
+        if entry:
+            self._discard_context_entry(entry)
     
     def switch_model(self, model_type="gemini"):
         """Switch between supported models"""
@@ -82,79 +217,162 @@ class ModelManager:
             self.active_version_hash = None
             return "Gemini 2.5 Flash (Default)"
     
-    def call_model(self, image_url, prompt, temperature=0.9):
-        """Call the current active model with image and prompt"""
+    def _load_image(self, image_url):
+        """Load a PIL image from a base64 data URL or a remote URL"""
+        from PIL import Image
+        import base64
+        import io
+        
+        # For base64 images
+        if image_url.startswith('data:image'):
+            # Extract the base64 part after the comma
+            if ',' in image_url:
+                base64_data = image_url.split(',')[1]
+            else:
+                base64_data = image_url
+            
+            # Decode base64 to bytes and open image
+            return Image.open(io.BytesIO(base64.b64decode(base64_data)))
+        
+        # For URL images
+        import requests
+        response = requests.get(image_url)
+        return Image.open(io.BytesIO(response.content))
+    
+    def _generate_gemini(self, image_url, prompt, temperature, context, stream=False, response_schema=None):
+        """
+        Send a request to the active Gemini model, optionally bound to a registered context
+        and constrained to JSON matching response_schema
+        Returns (response, whether the context was used)
+        """
+        model_id = self.active_model_id
+        contents = [self._load_image(image_url), prompt] if image_url else [prompt]
+        generation_config = {"temperature": min(temperature, 1.0)}
+        if response_schema is not None:
+            generation_config["response_mime_type"] = "application/json"
+            generation_config["response_schema"] = response_schema
+        
+        use_context = context is not None and context in self.system_instructions
+        model = self._get_context_model(model_id, context)['model'] if use_context else self._get_gemini_model(model_id)
+        
+        try:
+            return model.generate_content(contents, generation_config=generation_config, stream=stream), use_context
+        except Exception:
+            if not use_context:
+                raise
+            # The cached context may have been evicted server-side; rebuild it once
+            self._invalidate_context(model_id, context)
+            model = self._get_context_model(model_id, context)['model']
+            return model.generate_content(contents, generation_config=generation_config, stream=stream), use_context
+    
+    def _record_call_stats(self, context, latency, response=None, first_chunk_latency=None):
+        """Store latency and token usage of the last call in last_call_stats"""
+        usage = getattr(response, 'usage_metadata', None)
+        self.last_call_stats = {
+            'model': self.active_model_id,
+            'context': context,
+            'latency': latency,
+            'first_chunk_latency': first_chunk_latency,
+            'input_tokens': getattr(usage, 'prompt_token_count', None),
+            'cached_tokens': getattr(usage, 'cached_content_token_count', None),
+            'output_tokens': getattr(usage, 'candidates_token_count', None),
+            'error': None
+        }
+    
+    def _record_call_error(self, error):
+        """Store a failed call in last_call_stats; the error text is also returned to the caller"""
+        self.last_call_stats = {'model': self.active_model_id, 'error': error}
+        return error
+    
+    def _run_replicate(self, image_url, prompt, temperature, context):
+        """Run the active Replicate model (LLaVA or CogAgent) and return its raw output"""
+        # Replicate models have no system instruction, so inline the context
+        if context is not None and context in self.system_instructions:
+            prompt = f"{self.system_instructions[context]}\n\n{prompt}"
+        
+        return self.client.run(
+            f"{self.active_model_id}:{self.active_version_hash}",
+            input={
+                "image": image_url,
+                "prompt": prompt,
+                "temperature": temperature
+            }
+        )
+    
+    def call_model(self, image_url, prompt, temperature=0.9, context=None, response_schema=None):
+        """
+        Call the current active model with image and prompt
+        
+        Args:
+            image_url: Base64 data URL or remote URL of the screenshot, or None for text-only calls
+            prompt: Per-turn prompt text
+            temperature: Sampling temperature
+            context: Optional name of a registered system instruction to send with the prompt
+            response_schema: Optional schema for a JSON response (Gemini only; other models answer in free text)
+        """
         try:
+            start_time = time.perf_counter()
+            
             # Use Gemini models
-            if self.active_model_id in [GEMINI_MODEL_ID, GEMINI_FLASH_ID, GEMINI_2_5_FLASH_MODEL_ID]:
+            if self.is_gemini_active():
                 if not self.gemini_model and not self.gemini_flash_1_5_model and not self.gemini_2_5_flash_model:
-                    return "Error: Gemini models not initialized. Please set GEMINI_API_KEY."
-                
-                # For base64 images
-                if image_url.startswith('data:image'):
-                    # If it's a base64 image directly in the URL
-                    from PIL import Image
-                    import base64
-                    import io
-                    
-                    # Extract the base64 part after the comma
-                    if ',' in image_url:
-                        base64_data = image_url.split(',')[1]
-                    else:
-                        base64_data = image_url
-                    
-                    # Decode base64 to bytes
-                    image_bytes = base64.b64decode(base64_data)
-                    
-                    # Open image from bytes
-                    image = Image.open(io.BytesIO(image_bytes))
-                else:
-                    # For URL images
-                    import requests
-                    from PIL import Image
-                    from io import BytesIO
-                    
-                    response = requests.get(image_url)
-                    image = Image.open(BytesIO(response.content))
-                
-                # Call the appropriate Gemini model based on active_model_id
-                if self.active_model_id == GEMINI_FLASH_ID: # This is 1.5 Flash
-                    gemini_response = self.gemini_flash_1_5_model.generate_content(
-                        [image, prompt],
-                        generation_config={"temperature": min(temperature, 1.0)}
-                    )
-                elif self.active_model_id == GEMINI_2_5_FLASH_MODEL_ID: # This is 2.5 Flash
-                    gemini_response = self.gemini_2_5_flash_model.generate_content(
-                        [image, prompt],
-                        generation_config={"temperature": min(temperature, 1.0)}
-                    )
-                else:  # Default to Pro (GEMINI_MODEL_ID)
-                    gemini_response = self.gemini_model.generate_content(
-                        [image, prompt],
-                        generation_config={"temperature": min(temperature, 1.0)}
-                    )
-                return gemini_response.text
+                    return self._record_call_error("Error: Gemini models not initialized. Please set GEMINI_API_KEY.")
+                gemini_response, used_context = self._generate_gemini(image_url, prompt, temperature, context,
+                                                                      response_schema=response_schema)
+                text = gemini_response.text
+                self._record_call_stats(context if used_context else None, time.perf_counter() - start_time, gemini_response)
+                return text
             
             # Use Replicate models (LLaVA or CogAgent)
-            output = self.client.run(
-                f"{self.active_model_id}:{self.active_version_hash}",
-                input={
-                    "image": image_url,
-                    "prompt": prompt,
-                    "temperature": temperature
-                }
-            )
+            output = self._run_replicate(image_url, prompt, temperature, context)
             
             # Handle streaming response if LLaVA (which returns a generator)
             if self.active_model_id == LLAVA_MODEL_ID and hasattr(output, '__iter__'):
                 full_response = ""
                 for chunk in output:
                     full_response += chunk
-                return full_response
-                
+                output = full_response
+            
+            self._record_call_stats(None, time.perf_counter() - start_time)
             return output
         except Exception as e:
-            return f"Model API Error: {e}"
+            return self._record_call_error(f"Model API Error: {e}")
+    
+    def stream_model(self, image_url, prompt, temperature=0.9, context=None):
+        """
+        Call the current active model and yield the response text as it is generated.
+        Takes the same arguments as call_model; errors are yielded as a final text chunk.
+        """
+        start_time = time.perf_counter()
+        first_chunk_latency = None
+        try:
+            if self.is_gemini_active():
+                if not self.gemini_model and not self.gemini_flash_1_5_model and not self.gemini_2_5_flash_model:
+                    yield self._record_call_error("Error: Gemini models not initialized. Please set GEMINI_API_KEY.")
+                    return
+                gemini_response, used_context = self._generate_gemini(image_url, prompt, temperature, context, stream=True)
+                for chunk in gemini_response:
+                    try:
+                        text = chunk.text
+                    except ValueError:
+                        continue  # Chunks without text parts (e.g. the final finish reason)
+                    if first_chunk_latency is None:
+                        first_chunk_latency = time.perf_counter() - start_time
+                    yield text
+                self._record_call_stats(context if used_context else None, time.perf_counter() - start_time,
+                                        gemini_response, first_chunk_latency)
+                return
+            
+            # LLaVA yields tokens as they arrive, CogAgent returns the whole text
+            output = self._run_replicate(image_url, prompt, temperature, context)
+            chunks = [output] if isinstance(output, str) or not hasattr(output, '__iter__') else output
+            for chunk in chunks:
+                if first_chunk_latency is None:
+                    first_chunk_latency = time.perf_counter() - start_time
+                yield str(chunk)
+            self._record_call_stats(None, time.perf_counter() - start_time, first_chunk_latency=first_chunk_latency)
+        except Exception as e:
+            yield self._record_call_error(f"Model API Error: {e}")
     
     def start_keep_warm(self):
         """Start thread to periodically ping model to keep it warm"""
@@ -182,7 +400,7 @@ class ModelManager:
             try:
                 print(f"Sending warm-up ping to {self.active_model_id}...")
                 # Use a minimal prompt for keep-warm
-                if self.active_model_id in [GEMINI_MODEL_ID, GEMINI_FLASH_ID, GEMINI_2_5_FLASH_MODEL_ID]:
+                if self.is_gemini_active():
                     if self.active_model_id == GEMINI_FLASH_ID and self.gemini_flash_1_5_model: # 1.5 Flash
                         self.gemini_flash_1_5_model.generate_content("warm-up ping")
                     elif self.active_model_id == GEMINI_2_5_FLASH_MODEL_ID and self.gemini_2_5_flash_model: # 2.5 Flash
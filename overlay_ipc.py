@@ -0,0 +1,259 @@
+import time
+import struct
+import threading
+import multiprocessing
+from contextlib import contextmanager
+
+from spatial_index import SpatialIndex
+
+# Command opcodes
+OP_ADD = 1
+OP_REMOVE = 2
+OP_REMOVE_GROUP = 3
+OP_CLEAR = 4
+OP_SHUTDOWN = 5
+OP_HELLO = 6  # Renderer -> app: screen geometry
+
+# Flags of OP_ADD
+FLAG_FLASH = 1
+FLAG_FADE_OUT = 2
+FLAG_SHOW_CLICK = 4
+FLAG_FADE = 8
+
+# Fixed-size parts of the messages (little-endian)
+ADD_FORMAT = struct.Struct("<BIiiiiBIh")  # op, id, x, y, width, height, flags, duration ms, z
+REMOVE_FORMAT = struct.Struct("<BIB")  # op, id, fade
+REMOVE_GROUP_FORMAT = struct.Struct("<BB")  # op, fade (followed by the group string)
+OPCODE_FORMAT = struct.Struct("<B")
+HELLO_FORMAT = struct.Struct("<Biid")  # op, screen width, screen height, device pixel ratio
+STRING_LENGTH_FORMAT = struct.Struct("<H")
+
+POLL_INTERVAL = 5  # ms between checks for new commands in the renderer
+HELLO_TIMEOUT = 10  # seconds to wait for the renderer to start
+
+def _pack_string(text):
+    data = (text or "").encode("utf-8")[:0xFFFF]
+    return STRING_LENGTH_FORMAT.pack(len(data)) + data
+
+def _unpack_string(data, offset):
+    (length,) = STRING_LENGTH_FORMAT.unpack_from(data, offset)
+    offset += STRING_LENGTH_FORMAT.size
+    return data[offset:offset + length].decode("utf-8"), offset + length
+
+def encode_add(highlight_id, x, y, width, height, message=None, flash=True, fade_out=True,
+               show_click=False, duration=3000, z=0, group=None, fade=True):
+    flags = ((FLAG_FLASH if flash else 0) | (FLAG_FADE_OUT if fade_out else 0) |
+             (FLAG_SHOW_CLICK if show_click else 0) | (FLAG_FADE if fade else 0))
+    return (ADD_FORMAT.pack(OP_ADD, highlight_id, int(x), int(y), int(width), int(height), flags, int(duration), z) +
+            _pack_string(group) + _pack_string(message))
+
+def encode_remove(highlight_id, fade=True):
+    return REMOVE_FORMAT.pack(OP_REMOVE, highlight_id, int(fade))
+
+def encode_remove_group(group, fade=True):
+    return REMOVE_GROUP_FORMAT.pack(OP_REMOVE_GROUP, int(fade)) + _pack_string(group)
+
+def decode_commands(data):
+    """Yield (opcode, fields) for every command in a message"""
+    offset = 0
+    while offset < len(data):
+        (op,) = OPCODE_FORMAT.unpack_from(data, offset)
+        if op == OP_ADD:
+            _, highlight_id, x, y, width, height, flags, duration, z = ADD_FORMAT.unpack_from(data, offset)
+            group, offset = _unpack_string(data, offset + ADD_FORMAT.size)
+            message, offset = _unpack_string(data, offset)
+            yield op, {
+                'id': highlight_id, 'x': x, 'y': y, 'width': width, 'height': height,
+                'message': message or None, 'group': group or None, 'duration': duration, 'z': z,
+                'flash': bool(flags & FLAG_FLASH), 'fade_out': bool(flags & FLAG_FADE_OUT),
+                'show_click': bool(flags & FLAG_SHOW_CLICK), 'fade': bool(flags & FLAG_FADE),
+            }
+        elif op == OP_REMOVE:
+            _, highlight_id, fade = REMOVE_FORMAT.unpack_from(data, offset)
+            offset += REMOVE_FORMAT.size
+            yield op, {'id': highlight_id, 'fade': bool(fade)}
+        elif op == OP_REMOVE_GROUP:
+            _, fade = REMOVE_GROUP_FORMAT.unpack_from(data, offset)
+            group, offset = _unpack_string(data, offset + REMOVE_GROUP_FORMAT.size)
+            yield op, {'group': group, 'fade': bool(fade)}
+        elif op in (OP_CLEAR, OP_SHUTDOWN):
+            offset += OPCODE_FORMAT.size
+            yield op, {}
+        else:
+            raise ValueError(f"Unknown overlay command: {op}")
+
+def run_overlay_process(conn):
+    """Renderer process: show an OverlayWindow and apply commands received on conn"""
+    import sys
+    from PyQt5.QtCore import QTimer
+    from PyQt5.QtWidgets import QApplication
+    from qt_overlay import create_overlay
+
+    overlay, app = create_overlay()
+    app = app or QApplication.instance()
+    conn.send_bytes(HELLO_FORMAT.pack(OP_HELLO, overlay.screen_width, overlay.screen_height,
+                                      getattr(overlay, 'device_pixel_ratio', 1.0)))
+    local_ids = {}  # App highlight id -> overlay highlight id
+
+    def apply(op, fields):
+        if op == OP_ADD:
+            highlight_id = fields.pop('id')
+            local_ids[highlight_id] = overlay.add_highlight(**fields)
+        elif op == OP_REMOVE:
+            local_id = local_ids.pop(fields['id'], None)
+            if local_id:
+                overlay.remove_highlight(local_id, fields['fade'])
+        elif op == OP_REMOVE_GROUP:
+            overlay.remove_group(fields['group'], fields['fade'])
+        elif op == OP_CLEAR:
+            overlay.clear_all_highlights()
+            local_ids.clear()
+        elif op == OP_SHUTDOWN:
+            app.quit()
+
+    def poll():
+        try:
+            while conn.poll():
+                # Each message is one batch, repainted together
+                with overlay.batch():
+                    for op, fields in decode_commands(conn.recv_bytes()):
+                        apply(op, fields)
+        except (EOFError, OSError):
+            app.quit()  # The app went away
+
+    timer = QTimer()
+    timer.timeout.connect(poll)
+    timer.start(POLL_INTERVAL)
+    sys.exit(app.exec_())
+
+class RemoteOverlay:
+    """
+    OverlayWindow running in a separate renderer process.
+
+    Has the same highlight API as OverlayWindow, but every call is encoded as
+    a compact binary command and sent over a pipe, so highlight animations
+    don't compete with model calls, image encoding and audio for this
+    process's GIL. Commands issued inside batch() travel as one message and
+    are repainted together. Safe to call from any thread. Hit-testing is
+    answered from a local index of the highlights sent, without a round trip.
+    """
+    def __init__(self):
+        context = multiprocessing.get_context("spawn")  # Don't fork a process holding Tk and audio state
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=run_overlay_process, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+        if not self.conn.poll(HELLO_TIMEOUT):
+            self.process.terminate()
+            raise RuntimeError("Overlay process did not start")
+        _, self.screen_width, self.screen_height, self.device_pixel_ratio = HELLO_FORMAT.unpack(self.conn.recv_bytes())
+        print(f"Overlay process started: {self.screen_width}x{self.screen_height}, DPR: {self.device_pixel_ratio}")
+
+        self.lock = threading.RLock()
+        self.next_id = 1
+        self.batch_depth = 0
+        self.pending = []
+        self.spatial = SpatialIndex()  # Highlight id -> rectangle, as sent
+        self.shown = {}  # Highlight id -> (z, group, expiry time or None)
+
+    def _send(self, command):
+        with self.lock:
+            self.pending.append(command)
+            if self.batch_depth == 0:
+                self._flush()
+
+    def _flush(self):
+        if not self.pending:
+            return
+        data = b''.join(self.pending)
+        self.pending = []
+        try:
+            self.conn.send_bytes(data)
+        except (OSError, ValueError) as e:
+            print(f"Overlay process unavailable: {e}")
+
+    @contextmanager
+    def batch(self):
+        """Group commands into one message"""
+        with self.lock:
+            self.batch_depth += 1
+            try:
+                yield self
+            finally:
+                self.batch_depth -= 1
+                if self.batch_depth == 0:
+                    self._flush()
+
+    def add_highlight(self, x, y, width, height, message=None, flash=True,
+                      fade_out=True, show_click=False, duration=3000, z=0, group=None, fade=True):
+        """Add a rectangular highlight (see OverlayWindow.add_highlight); returns its ID"""
+        with self.lock:
+            highlight_id = self.next_id
+            self.next_id += 1
+            self._send(encode_add(highlight_id, x, y, width, height, message, flash, fade_out,
+                                  show_click, duration, z, group, fade))
+            self.spatial.insert(highlight_id, x, y, width, height)
+            self.shown[highlight_id] = (z, group, time.monotonic() + duration / 1000 if fade_out else None)
+        return highlight_id
+
+    def add_highlights(self, highlights, group=None):
+        with self.batch():
+            return [self.add_highlight(**dict({'group': group}, **spec)) for spec in highlights]
+
+    def remove_highlight(self, highlight_id, fade=True):
+        with self.lock:
+            self._forget(highlight_id)
+            self._send(encode_remove(highlight_id, fade))
+
+    def remove_highlights(self, highlight_ids, fade=True):
+        with self.batch():
+            for highlight_id in list(highlight_ids):
+                self.remove_highlight(highlight_id, fade)
+
+    def remove_group(self, group, fade=True):
+        with self.lock:
+            for highlight_id in [key for key, shown in self.shown.items() if shown[1] == group]:
+                self._forget(highlight_id)
+            self._send(encode_remove_group(group, fade))
+
+    def clear_all_highlights(self):
+        with self.lock:
+            self.spatial.clear()
+            self.shown.clear()
+            self._send(OPCODE_FORMAT.pack(OP_CLEAR))
+
+    def _forget(self, highlight_id):
+        self.spatial.remove(highlight_id)
+        self.shown.pop(highlight_id, None)
+
+    def _live(self, highlight_ids):
+        """Drop expired highlights from the local index; returns the live ones"""
+        now = time.monotonic()
+        live = []
+        for highlight_id in highlight_ids:
+            expires_at = self.shown[highlight_id][2]
+            if expires_at is not None and now >= expires_at:
+                self._forget(highlight_id)
+            else:
+                live.append(highlight_id)
+        return live
+
+    def highlight_at(self, x, y):
+        """ID of the topmost highlight containing a point, or None"""
+        with self.lock:
+            hits = self._live(self.spatial.query_point(x, y))
+            return max(hits, key=lambda key: (self.shown[key][0], key)) if hits else None
+
+    def highlights_in(self, x, y, width, height):
+        """IDs of the highlights overlapping an area"""
+        with self.lock:
+            return self._live(self.spatial.query_rect(x, y, width, height))
+
+    def close(self):
+        """Stop the renderer process"""
+        self._send(OPCODE_FORMAT.pack(OP_SHUTDOWN))
+        self.process.join(timeout=2)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.conn.close()
@@ -0,0 +1,104 @@
+import sys
+
+# Context name for the fixed coordinate-guidance instruction registered with the ModelManager
+COORDINATE_CONTEXT = "coordinate"
+
+# macOS-specific guidance included in the coordinate instruction
+MAC_SPECIFIC_GUIDANCE = """
+MAC-SPECIFIC GUIDANCE:
+- The Dock is at the bottom of the screen with app icons
+- The Apple menu (⌘) is at the top-left corner of the screen
+- Menu bar is always at the top of the screen
+- Applications have their menus in the top menu bar, not in the app window
+- Finder is the file manager (blue face icon)
+- Mission Control shows all open windows
+- Spotlight search is accessed with the magnifying glass icon in the menu bar
+- To close apps, use Command+Q or the red button at the top-left of the window
+- To minimize windows, use the yellow button at the top-left
+- The green button at the top-left maximizes/enters full screen
+"""
+
+def get_platform_name():
+    """Return a readable name for the current platform"""
+    platform_map = {"darwin": "macOS", "win32": "Windows", "linux": "Linux"}
+    return platform_map.get(sys.platform.lower(), sys.platform)
+
+def create_coordinate_system_instruction(platform_name=None):
+    """
+    Build the fixed instruction block for visual guidance with Gemini.
+
+    This part never changes between turns (simple-language rules, coordinate
+    system and platform guidance), so it is registered once as a system
+    instruction and only the user turn is sent with each request.
+    """
+    platform_name = platform_name or get_platform_name()
+    mac_specific_guidance = MAC_SPECIFIC_GUIDANCE if platform_name == "macOS" else ""
+
+    return f"""You are an AI assistant helping an elderly person with limited computer knowledge learn to use their {platform_name} computer.
+Your primary goal is to guide the user through tasks by providing ONE SINGLE, CLEAR, ACTIONABLE STEP at a time.
+{mac_specific_guidance}
+USE EXTREMELY SIMPLE LANGUAGE:
+- Use the simplest words possible - like you're explaining to a child
+- Use very short sentences
+- Avoid all technical terms
+- Use everyday comparisons
+- Be patient and encouraging
+- Never use jargon or abbreviations
+
+COORDINATE SYSTEM:
+- The screen's TOP-LEFT corner is (0,0).
+- Moving RIGHT increases X value (from 0 to 1000).
+- Moving DOWN increases Y value (from 0 to 1000).
+- Give coordinates as [y_min, x_min, y_max, x_max] (normalized 0-1000).
+
+YOUR RESPONSE MUST:
+1. Give ONLY ONE action for the user to do right now - never more than one step
+2. Show coordinates for just ONE element on screen for this action
+3. NEVER list multiple steps - focus only on the immediate next action
+4. For broad requests, focus on just the first logical action
+5. Use words anyone can understand, no technical terms
+6. Be encouraging and patient
+7. Make your bounding box tight around just the element needed
+8. Keep responses brief and to the point - no lengthy explanations
+"""
+
+# Structured output mode: Gemini answers with JSON of this schema instead of free text
+STEP_ACTIONS = ["click", "double_click", "right_click", "type", "hotkey", "scroll", "drag", "none"]
+STEP_RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "step_text": {"type": "STRING",
+                      "description": "The single next step for the user, in simple words, without coordinates"},
+        "boxes": {
+            "type": "ARRAY",
+            "description": "The screen elements the step refers to, in the order they are used",
+            "items": {
+                "type": "OBJECT",
+                "properties": {
+                    "label": {"type": "STRING", "description": "Short name of the element, e.g. 'Mail icon'"},
+                    "box_2d": {"type": "ARRAY", "items": {"type": "INTEGER"},
+                               "description": "[y_min, x_min, y_max, x_max] normalized to 0-1000"},
+                },
+                "required": ["label", "box_2d"],
+            },
+        },
+        "action": {
+            "type": "OBJECT",
+            "properties": {
+                "kind": {"type": "STRING", "format": "enum", "enum": STEP_ACTIONS},
+                "text": {"type": "STRING",
+                         "description": "Text to type, keys to press (e.g. 'command+space') or scroll direction (up or down)"},
+            },
+            "required": ["kind"],
+        },
+        "is_complete": {"type": "BOOLEAN", "description": "True when the user's task is already done"},
+    },
+    "required": ["step_text", "boxes", "action", "is_complete"],
+}
+
+# Added to the turn prompt in structured output mode
+STRUCTURED_OUTPUT_NOTE = """
+Answer in the JSON format: put what to tell the user in step_text (no coordinates there),
+a tight box for each element the step uses in boxes, the action the step asks for
+(or "none") in action, and set is_complete to true only when the task is already done.
+"""
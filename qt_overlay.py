@@ -1,15 +1,65 @@
 from PyQt5.QtWidgets import QApplication, QMainWindow, QWidget
-from PyQt5.QtCore import Qt, QRect, QTimer, pyqtSlot, QPoint
-from PyQt5.QtGui import QPainter, QPen, QColor, QFont
+from PyQt5.QtCore import Qt, QRect, QTimer, QElapsedTimer, pyqtSlot, QPoint
+from PyQt5.QtGui import QPainter, QPen, QColor, QFont, QFontMetrics, QRegion
 import sys
 import platform
+from contextlib import contextmanager, ExitStack
+
+from spatial_index import SpatialIndex
+from coordinates import overlay_scale, screen_to_overlay
+
+CLICK_INDICATOR_TEXT = "CLICK HERE"
+
+
+# Animation timing (milliseconds)
+ANIMATION_INTERVAL = 33  # Tick of the shared animation timer (~30 fps)
+FLASH_INTERVAL = 400  # Time between flash toggles
+FLASH_CYCLES = 5  # Number of on/off cycles
+FADE_DURATION = 200  # Fade in / fade out time
+
+MAX_TRACKED_HIGHLIGHTS = 256  # Ids a MultiScreenOverlay keeps before pruning the removed ones
+
+class HighlightRecord:
+    """One highlight in the overlay scene"""
+    __slots__ = ('id', 'rect', 'message', 'show_click_indicator', 'z', 'group', 'sequence',
+                 'visible', 'opacity', 'fade_from', 'fade_to', 'fade_start', 'removing',
+                 'flash_toggles', 'next_toggle', 'expires_at', 'bounds')
+
+    def __init__(self, highlight_id, rect, message=None, show_click_indicator=False, z=0, group=None, sequence=0):
+        self.id = highlight_id
+        self.rect = rect
+        self.message = message
+        self.show_click_indicator = show_click_indicator
+        self.z = z
+        self.group = group
+        self.sequence = sequence  # Insertion order, breaks z ties
+        self.visible = True  # Flash state
+        self.opacity = 1.0
+        self.fade_from = 1.0
+        self.fade_to = 1.0
+        self.fade_start = None  # Clock time the current fade started, None when not fading
+        self.removing = False  # Fading out before removal
+        self.flash_toggles = 0  # Remaining visibility toggles
+        self.next_toggle = 0
+        self.expires_at = None
+        self.bounds = rect
+
+    @property
+    def animating(self):
+        return self.fade_start is not None or self.flash_toggles > 0 or self.expires_at is not None
 
 class OverlayWindow(QMainWindow):
     """
     Transparent window overlay for displaying visual cues on screen
     This overlay stays on top of all other windows and can highlight areas with rectangles
+
+    Highlights are kept as a retained scene of HighlightRecords, drawn in
+    z-order and optionally grouped (e.g. all steps of one response). Only the
+    regions of highlights that change are repainted; flashing, fades and
+    auto-removal are driven by one shared timer that runs only while something
+    is animating, and changes made inside batch() are repainted together.
     """
-    def __init__(self):
+    def __init__(self, screen=None):
         super().__init__()
         
         # Configure window to be frameless and stay on top
@@ -24,21 +74,40 @@ class OverlayWindow(QMainWindow):
         self.is_mac = platform.system() == "Darwin"
         
         # Get screen dimensions
-        self.setup_screen_geometry()
+        self.setup_screen_geometry(screen)
         
-        # Initialize highlight data
-        self.highlights = {}  # Dictionary of all active highlights
-        self.active_timers = {}  # Track active flashing timers by id
+        # Scene state
+        self.highlights = {}  # Highlight id -> HighlightRecord
+        self.spatial = SpatialIndex()  # Highlight id -> painted bounds, for repaints and hit-testing
+        self.next_sequence = 0
+        self.batch_depth = 0
+        self.pending_dirty = QRegion()
         
         # Set default visual properties
         self.highlight_color = QColor(255, 0, 0, 200)  # Semi-transparent red
         self.highlight_thickness = 3
         self.text_color = QColor(255, 0, 0, 255)  # Solid red
         
-    def setup_screen_geometry(self):
-        """Setup the overlay to cover the primary screen"""
+        # Cached drawing resources
+        self.highlight_pen = QPen(self.highlight_color)
+        self.highlight_pen.setWidth(self.highlight_thickness)
+        self.text_pen = QPen(self.text_color)
+        self.message_font = QFont("Arial", 12, QFont.Bold)
+        self.click_font = QFont("Arial", 14, QFont.Bold)
+        self.message_metrics = QFontMetrics(self.message_font)
+        self.click_metrics = QFontMetrics(self.click_font)
+        
+        # One timer drives every animation
+        self.clock = QElapsedTimer()
+        self.clock.start()
+        self.animation_timer = QTimer(self)
+        self.animation_timer.setInterval(ANIMATION_INTERVAL)
+        self.animation_timer.timeout.connect(self._animate)
+        
+    def setup_screen_geometry(self, screen=None):
+        """Setup the overlay to cover a screen (the primary screen by default)"""
         # Get primary screen
-        screen = QApplication.primaryScreen()
+        screen = screen or QApplication.primaryScreen()
         if not screen:
             # Fallback to first screen if no primary
             screens = QApplication.screens()
@@ -47,71 +116,137 @@ class OverlayWindow(QMainWindow):
             else:
                 # No screens available, use default size
                 self.setGeometry(0, 0, 1920, 1080)
+                self.screen_left, self.screen_top = 0, 0
+                self.screen_width, self.screen_height = 1920, 1080
+                self.device_pixel_ratio = 1.0
+                self.coordinate_scale = 1.0
                 return
                 
         # Get screen geometry
         geometry = screen.geometry()
+        self.screen_left = geometry.x()  # Position on the virtual desktop
+        self.screen_top = geometry.y()
         self.screen_width = geometry.width()
         self.screen_height = geometry.height()
         
         # Set window to cover entire screen
         self.setGeometry(geometry)
         
-        # Store device pixel ratio for macOS retina displays
+        # Highlights arrive in screen coordinates (pyautogui's), which are physical pixels
+        # except on macOS; the window is laid out in logical pixels
         self.device_pixel_ratio = screen.devicePixelRatio()
+        self.coordinate_scale = overlay_scale(self.device_pixel_ratio)
         
         print(f"Overlay set to: {geometry.width()}x{geometry.height()}, DPR: {self.device_pixel_ratio}")
+    
+    def to_window(self, x, y, width=0, height=0):
+        """Global screen box -> box in this window's logical coordinates"""
+        return screen_to_overlay(x, y, width, height, self.screen_left, self.screen_top, self.coordinate_scale)
+    
+    def screen_extent(self):
+        """(left, top, width, height) of the covered screen in screen coordinates"""
+        return (self.screen_left, self.screen_top,
+                self.screen_width * self.coordinate_scale, self.screen_height * self.coordinate_scale)
         
     def paintEvent(self, event):
-        """Draw all highlights on the overlay"""
+        """Draw the highlights that intersect the region being repainted, lowest z first"""
         painter = QPainter(self)
-        # Clear background with transparent color
-        painter.fillRect(self.rect(), Qt.transparent)
+        region = event.region()
         
-        # Draw all active highlights
-        for highlight_id, highlight_data in self.highlights.items():
-            # Extract highlight data
-            rect = highlight_data['rect']
-            message = highlight_data.get('message')
-            
-            # Set pen for outline
-            pen = QPen(self.highlight_color)
-            pen.setWidth(self.highlight_thickness)
-            painter.setPen(pen)
+        # Clear only the dirty region to transparent
+        painter.setCompositionMode(QPainter.CompositionMode_Source)
+        for rect in region.rects():
+            painter.fillRect(rect, Qt.transparent)
+        painter.setCompositionMode(QPainter.CompositionMode_SourceOver)
+        
+        dirty = region.boundingRect()
+        records = [self.highlights[highlight_id] for highlight_id in
+                   self.spatial.query_rect(dirty.x(), dirty.y(), dirty.width(), dirty.height())]
+        for record in sorted(records, key=lambda r: (r.z, r.sequence)):
+            if not record.visible or record.opacity <= 0 or not region.intersects(record.bounds):
+                continue
+            painter.setOpacity(record.opacity)
+            rect = record.rect
             
             # Draw rectangle
+            painter.setPen(self.highlight_pen)
             painter.drawRect(rect)
             
             # Draw optional message above rectangle
-            if message:
-                painter.setFont(QFont("Arial", 12, QFont.Bold))
-                painter.setPen(self.text_color)
-                text_x = rect.x() + (rect.width() // 2) - (len(message) * 4)  # Rough center
-                text_y = rect.y() - 10
-                painter.drawText(text_x, text_y, message)
+            if record.message:
+                painter.setFont(self.message_font)
+                painter.setPen(self.text_pen)
+                painter.drawText(self._message_rect(rect, record.message), Qt.AlignCenter, record.message)
                 
             # Draw "CLICK HERE" indicator in the middle of the rect if specified
-            if highlight_data.get('show_click_indicator', False):
-                click_message = "CLICK HERE"
-                painter.setFont(QFont("Arial", 14, QFont.Bold))
-                painter.setPen(self.text_color)
-                text_x = rect.x() + (rect.width() // 2) - (len(click_message) * 4)  # Rough center
-                text_y = rect.y() + (rect.height() // 2)
-                painter.drawText(text_x, text_y, click_message)
+            if record.show_click_indicator:
+                painter.setFont(self.click_font)
+                painter.setPen(self.text_pen)
+                painter.drawText(self._click_rect(rect), Qt.AlignCenter, CLICK_INDICATOR_TEXT)
+    
+    def _message_rect(self, rect, message):
+        """Area of the message text centered above a highlight"""
+        text_rect = self.message_metrics.boundingRect(message)
+        text_rect.moveCenter(QPoint(rect.center().x(), rect.y() - 10 - text_rect.height() // 2))
+        return text_rect
+    
+    def _click_rect(self, rect):
+        """Area of the "CLICK HERE" text centered in a highlight"""
+        text_rect = self.click_metrics.boundingRect(CLICK_INDICATOR_TEXT)
+        text_rect.moveCenter(rect.center())
+        return text_rect
+    
+    def _bounds(self, record):
+        """Everything a highlight paints: the outline (with pen width) and its texts"""
+        margin = self.highlight_thickness
+        bounds = record.rect.adjusted(-margin, -margin, margin, margin)
+        if record.message:
+            bounds = bounds.united(self._message_rect(record.rect, record.message).adjusted(-2, -2, 2, 2))
+        if record.show_click_indicator:
+            bounds = bounds.united(self._click_rect(record.rect).adjusted(-2, -2, 2, 2))
+        return bounds
+    
+    # --- Batching and repaint scheduling ---
+    
+    @contextmanager
+    def batch(self):
+        """Group scene changes so they are repainted together"""
+        self.batch_depth += 1
+        try:
+            yield self
+        finally:
+            self.batch_depth -= 1
+            if self.batch_depth == 0:
+                self._flush_dirty()
+    
+    def _invalidate(self, record):
+        self.pending_dirty += record.bounds
+        if self.batch_depth == 0:
+            self._flush_dirty()
+    
+    def _flush_dirty(self):
+        if not self.pending_dirty.isEmpty():
+            self.update(self.pending_dirty)
+            self.pending_dirty = QRegion()
+    
+    # --- Scene changes ---
     
     def add_highlight(self, x, y, width, height, message=None, flash=True, 
-                     fade_out=True, show_click=False, duration=3000):
+                     fade_out=True, show_click=False, duration=3000, z=0, group=None, fade=True):
         """
         Add a rectangular highlight to the overlay
         
         Args:
-            x, y: Top-left coordinates
+            x, y: Top-left coordinates (global screen coordinates, as for pyautogui)
             width, height: Dimensions of highlight
             message: Optional text to display with highlight
             flash: Whether to flash the highlight
             fade_out: Whether to automatically remove after duration
             show_click: Whether to show "CLICK HERE" text
             duration: How long to display highlight in ms (if fade_out is True)
+            z: Drawing order, higher values are drawn on top
+            group: Optional group name, for removing related highlights together
+            fade: Whether to fade in now and fade out when removed
             
         Returns:
             str: ID of the highlight for later reference
@@ -120,117 +255,151 @@ class OverlayWindow(QMainWindow):
         import uuid
         highlight_id = str(uuid.uuid4())
         
-        # Account for device pixel ratio on macOS Retina displays
-        if hasattr(self, 'device_pixel_ratio') and self.device_pixel_ratio > 1.0:
-            # Log original coordinates for debugging
-            print(f"Original coordinates: x={x}, y={y}, w={width}, h={height}")
-            
-            # Apply scaling factor
-            # On macOS with Retina, logical coordinates are different from pixel coordinates
-            if self.is_mac:
-                # On macOS, don't scale coordinates or we'll get double-scaling
-                pass
-            else:
-                # On other platforms, we might need to scale
-                x = int(x * self.device_pixel_ratio)
-                y = int(y * self.device_pixel_ratio)
-                width = int(width * self.device_pixel_ratio)
-                height = int(height * self.device_pixel_ratio)
-            
-            print(f"Adjusted coordinates: x={x}, y={y}, w={width}, h={height}, DPR={self.device_pixel_ratio}")
-        
-        # Store highlight data
-        self.highlights[highlight_id] = {
-            'rect': QRect(x, y, width, height),
-            'message': message,
-            'show_click_indicator': show_click
-        }
-        
-        # Update display
-        self.update()
+        # Screen coordinates -> this window's logical coordinates
+        x, y, width, height = self.to_window(x, y, width, height)
         
-        # Setup flashing if requested
+        # Store the highlight record
+        now = self.clock.elapsed()
+        record = HighlightRecord(highlight_id, QRect(int(x), int(y), int(width), int(height)),
+                                 message, show_click, z, group, self.next_sequence)
+        self.next_sequence += 1
         if flash:
-            self._setup_flashing(highlight_id)
-            
-        # Setup auto-removal if requested
+            record.flash_toggles = FLASH_CYCLES * 2  # Each cycle is two toggles
+            record.next_toggle = now + FLASH_INTERVAL
         if fade_out:
-            QTimer.singleShot(duration, lambda: self.remove_highlight(highlight_id))
+            record.expires_at = now + duration
+        if fade:
+            self._start_fade(record, 0.0, 1.0, now)
+        record.bounds = self._bounds(record)
+        self.highlights[highlight_id] = record
+        bounds = record.bounds
+        self.spatial.insert(highlight_id, bounds.x(), bounds.y(), bounds.width(), bounds.height())
+        
+        # Repaint just this highlight
+        self._invalidate(record)
+        if record.animating:
+            self._start_animation()
             
         return highlight_id
     
-    def _setup_flashing(self, highlight_id, cycles=5, interval=400):
-        """Setup flashing animation for a highlight"""
-        if highlight_id not in self.highlights:
-            return
-            
-        # Create timer for flashing
-        timer = QTimer(self)
-        self.active_timers[highlight_id] = {
-            'timer': timer,
-            'visible': True,
-            'cycles': cycles,
-            'count': 0
-        }
+    def add_highlights(self, highlights, group=None):
+        """
+        Add several highlights with a single repaint
         
-        # Connect timer to flash function
-        timer.timeout.connect(lambda: self._flash_step(highlight_id))
-        timer.start(interval)
+        Args:
+            highlights: Iterable of dicts with add_highlight keyword arguments
+            group: Group applied to highlights that don't name one
+            
+        Returns:
+            list: IDs of the new highlights
+        """
+        with self.batch():
+            return [self.add_highlight(**dict({'group': group}, **spec)) for spec in highlights]
     
-    def _flash_step(self, highlight_id):
-        """One step in the flashing animation"""
-        if highlight_id not in self.active_timers or highlight_id not in self.highlights:
+    def remove_highlight(self, highlight_id, fade=True):
+        """Remove a specific highlight (fading it out first if requested)"""
+        record = self.highlights.get(highlight_id)
+        if record is None:
             return
-            
-        # Toggle visibility
-        timer_data = self.active_timers[highlight_id]
-        timer_data['visible'] = not timer_data['visible']
-        
-        # Handle visibility change
-        if timer_data['visible']:
-            # Just update display to show highlight
-            pass
-        else:
-            # Temporarily remove from display dict (not from self.highlights)
-            # This achieves hiding without removing
-            pass
-            
-        # Update display
-        self.update()
-        
-        # Increment counter
-        timer_data['count'] += 1
-        
-        # Check if we're done flashing
-        if timer_data['count'] >= timer_data['cycles'] * 2:  # *2 because each cycle is two timer events
-            timer_data['timer'].stop()
-            del self.active_timers[highlight_id]
-    
-    def remove_highlight(self, highlight_id):
-        """Remove a specific highlight"""
-        if highlight_id in self.highlights:
-            del self.highlights[highlight_id]
-            
-            # Also stop any associated timer
-            if highlight_id in self.active_timers:
-                self.active_timers[highlight_id]['timer'].stop()
-                del self.active_timers[highlight_id]
-                
-            # Update display
-            self.update()
+        if fade and record.opacity > 0 and record.visible:
+            if not record.removing:
+                record.removing = True
+                record.flash_toggles = 0
+                record.expires_at = None
+                self._start_fade(record, record.opacity, 0.0, self.clock.elapsed())
+                self._start_animation()
+            return
+        del self.highlights[highlight_id]
+        self.spatial.remove(highlight_id)
+        self._invalidate(record)
+    
+    def remove_highlights(self, highlight_ids, fade=True):
+        """Remove several highlights with a single repaint"""
+        with self.batch():
+            for highlight_id in list(highlight_ids):
+                self.remove_highlight(highlight_id, fade)
+    
+    def remove_group(self, group, fade=True):
+        """Remove every highlight in a group"""
+        self.remove_highlights([r.id for r in self.highlights.values() if r.group == group], fade)
+    
+    def set_z(self, highlight_id, z):
+        """Move a highlight up or down in the drawing order"""
+        record = self.highlights.get(highlight_id)
+        if record and record.z != z:
+            record.z = z
+            self._invalidate(record)
     
     def clear_all_highlights(self):
-        """Remove all highlights"""
-        # Stop all timers
-        for timer_data in self.active_timers.values():
-            timer_data['timer'].stop()
-            
-        # Clear dictionaries
-        self.highlights.clear()
-        self.active_timers.clear()
+        """Remove all highlights immediately"""
+        with self.batch():
+            for record in self.highlights.values():
+                self.pending_dirty += record.bounds
+            self.highlights.clear()
+            self.spatial.clear()
+        self.animation_timer.stop()
+    
+    # --- Hit-testing ---
+    
+    def highlight_at(self, x, y):
+        """ID of the topmost highlight whose rectangle contains a point (screen coordinates), or None"""
+        x, y, _, _ = self.to_window(x, y)
+        hits = [self.highlights[highlight_id] for highlight_id in self.spatial.query_point(x, y)]
+        hits = [record for record in hits if not record.removing and record.rect.contains(int(x), int(y))]
+        if not hits:
+            return None
+        return max(hits, key=lambda r: (r.z, r.sequence)).id
+    
+    def highlights_in(self, x, y, width, height):
+        """IDs of the highlights whose rectangles overlap an area (screen coordinates)"""
+        x, y, width, height = self.to_window(x, y, width, height)
+        area = QRect(int(x), int(y), int(width), int(height))
+        return [highlight_id for highlight_id in self.spatial.query_rect(x, y, width, height)
+                if self.highlights[highlight_id].rect.intersects(area)]
+    
+    # --- Animation ---
+    
+    def _start_fade(self, record, start, end, now):
+        record.fade_from = start
+        record.fade_to = end
+        record.fade_start = now
+        record.opacity = start
+    
+    def _start_animation(self):
+        if not self.animation_timer.isActive():
+            self.animation_timer.start()
+    
+    def _animate(self):
+        """Shared timer tick: advance fades and flashing, remove expired highlights"""
+        now = self.clock.elapsed()
+        animating = False
+        with self.batch():
+            for record in list(self.highlights.values()):
+                if record.expires_at is not None and now >= record.expires_at:
+                    self.remove_highlight(record.id)
+                if record.id not in self.highlights:
+                    continue
+                
+                if record.fade_start is not None:
+                    progress = min(1.0, (now - record.fade_start) / FADE_DURATION)
+                    record.opacity = record.fade_from + (record.fade_to - record.fade_from) * progress
+                    if progress >= 1.0:
+                        record.fade_start = None
+                        if record.removing:
+                            self.remove_highlight(record.id, fade=False)
+                            continue
+                    self._invalidate(record)
+                
+                if record.flash_toggles and now >= record.next_toggle:
+                    record.visible = not record.visible
+                    record.flash_toggles -= 1
+                    record.next_toggle = now + FLASH_INTERVAL
+                    self._invalidate(record)
+                
+                animating = animating or record.animating
         
-        # Update display
-        self.update()
+        if not animating:
+            self.animation_timer.stop()
         
     def highlight_grid_cell(self, grid_rows, grid_cols, row, col, message=None):
         """
@@ -242,26 +411,124 @@ class OverlayWindow(QMainWindow):
             message: Optional message to display
         """
         # Calculate cell dimensions
-        cell_width = self.screen_width / grid_cols
-        cell_height = self.screen_height / grid_rows
+        left, top, width, height = self.screen_extent()
+        cell_width = width / grid_cols
+        cell_height = height / grid_rows
         
         # Calculate position
-        x = col * cell_width
-        y = row * cell_height
+        x = left + col * cell_width
+        y = top + row * cell_height
         
         # Add highlight
         return self.add_highlight(x, y, cell_width, cell_height, message, flash=True)
 
+class MultiScreenOverlay:
+    """
+    One OverlayWindow per screen, behind the OverlayWindow highlight API.
+
+    Coordinates are global screen coordinates; each highlight goes to the
+    window of the screen containing its center, which maps it to its own
+    logical coordinates.
+    screen_width and screen_height describe the primary screen, as for a
+    single OverlayWindow.
+    """
+    def __init__(self, screens):
+        self.windows = [OverlayWindow(screen) for screen in screens]
+        primary = QApplication.primaryScreen()
+        self.primary = next((w for w, s in zip(self.windows, screens) if s is primary), self.windows[0])
+        self.screen_width = self.primary.screen_width
+        self.screen_height = self.primary.screen_height
+        self.device_pixel_ratio = self.primary.device_pixel_ratio
+        self.coordinate_scale = self.primary.coordinate_scale
+        self.owners = {}  # Highlight id -> OverlayWindow
+    
+    def show(self):
+        for window in self.windows:
+            window.show()
+    
+    def window_at(self, x, y):
+        """The window of the screen containing a global point (the primary one if none does)"""
+        for window in self.windows:
+            left, top, width, height = window.screen_extent()
+            if left <= x < left + width and top <= y < top + height:
+                return window
+        return self.primary
+    
+    @contextmanager
+    def batch(self):
+        with ExitStack() as stack:
+            for window in self.windows:
+                stack.enter_context(window.batch())
+            yield self
+    
+    def add_highlight(self, x, y, width, height, message=None, **options):
+        window = self.window_at(x + width / 2, y + height / 2)
+        highlight_id = window.add_highlight(x, y, width, height, message, **options)
+        if len(self.owners) >= MAX_TRACKED_HIGHLIGHTS:
+            self._forget_removed()
+        self.owners[highlight_id] = window
+        return highlight_id
+    
+    def add_highlights(self, highlights, group=None):
+        with self.batch():
+            return [self.add_highlight(**dict({'group': group}, **spec)) for spec in highlights]
+    
+    def remove_highlight(self, highlight_id, fade=True):
+        window = self.owners.pop(highlight_id, None)
+        if window:
+            window.remove_highlight(highlight_id, fade)
+    
+    def remove_highlights(self, highlight_ids, fade=True):
+        with self.batch():
+            for highlight_id in list(highlight_ids):
+                self.remove_highlight(highlight_id, fade)
+    
+    def remove_group(self, group, fade=True):
+        for window in self.windows:
+            window.remove_group(group, fade)
+        self._forget_removed()
+    
+    def set_z(self, highlight_id, z):
+        window = self.owners.get(highlight_id)
+        if window:
+            window.set_z(highlight_id, z)
+    
+    def clear_all_highlights(self):
+        for window in self.windows:
+            window.clear_all_highlights()
+        self.owners.clear()
+    
+    def highlight_at(self, x, y):
+        window = self.window_at(x, y)
+        return window.highlight_at(x, y)
+    
+    def highlights_in(self, x, y, width, height):
+        found = []
+        for window in self.windows:
+            found.extend(window.highlights_in(x, y, width, height))
+        return found
+    
+    def highlight_grid_cell(self, grid_rows, grid_cols, row, col, message=None):
+        return self.primary.highlight_grid_cell(grid_rows, grid_cols, row, col, message)
+    
+    def _forget_removed(self):
+        self.owners = {highlight_id: window for highlight_id, window in self.owners.items()
+                       if highlight_id in window.highlights}
+
 # Function to create and show the overlay window
-def create_overlay(parent_tk_root=None):
-    """Create and return an OverlayWindow instance"""
+def create_overlay(parent_tk_root=None, all_screens=True):
+    """Create and return an overlay: an OverlayWindow, or a MultiScreenOverlay with several screens"""
     # Ensure application exists
     app = None
     if not QApplication.instance():
         app = QApplication(sys.argv)
     
-    # Create overlay window
-    overlay = OverlayWindow()
+    # Create overlay window(s)
+    screens = QApplication.screens()
+    if all_screens and len(screens) > 1:
+        overlay = MultiScreenOverlay(screens)
+    else:
+        overlay = OverlayWindow()
     overlay.show()
     
     return overlay, app
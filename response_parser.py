@@ -0,0 +1,230 @@
+import re
+import json
+
+# Gemini format [y_min, x_min, y_max, x_max], normalized to 0-1000
+# (also matches "coordinates: [...]" and "bounding box: [...]", but not [[...]])
+GEMINI_BOX_PATTERN = re.compile(r"(?<!\[)\[([\d\.]+),\s*([\d\.]+),\s*([\d\.]+),\s*([\d\.]+)\]")
+
+# Other formats, e.g. [[x1,y1,x2,y2]] in pixels or normalized to 0-1
+ALTERNATIVE_BOX_PATTERN = re.compile(r"\[\[([\d\.]+),?\s*([\d\.]+),?\s*([\d\.]+),?\s*([\d\.]+)\]\]")
+
+# Instructions that name the element to click, for highlight messages
+INSTRUCTION_PATTERNS = [
+    r"(?:click|tap|press)(?:\s+on)?\s+(?:the\s+)?([^\.,]+)",  # "click on the X" or "click X"
+    r"(?:select|choose)(?:\s+the)?\s+([^\.,]+)",  # "select the X"
+    r"(?:open|launch)(?:\s+the)?\s+([^\.,]+)"  # "open the X"
+]
+
+# Sentences of a response; the dots of decimal coordinates don't end a sentence
+SENTENCE_PATTERN = re.compile(r"[^\n]+?(?:[.!?](?=\s|$)|$)", re.MULTILINE)
+
+# Phrases of a response that gives the user a step, and of one that ends the task
+INSTRUCTION_CUES = ["first,", "next,", "then,", "click on", "now, try", "the next step is", "you should now"]
+COMPLETION_PHRASES = ["task is complete", "you've successfully", "all done", "that's it!", "you're all set"]
+
+# Overlay group of the highlights for the current response
+RESPONSE_HIGHLIGHT_GROUP = "response"
+
+MAIL_TERMS = ["mail app", "mail icon", "email app"]
+DOCK_TERMS = ["dock", "taskbar", "launcher"]
+
+def _sentence_around(text, start, end):
+    """The sentence containing text[start:end]"""
+    sentence_start = max(text.rfind(mark, 0, start) for mark in ".!?\n") + 1
+    ends = [position for position in (text.find(mark, end) for mark in ".!?\n") if position != -1]
+    sentence_end = min(ends) + 1 if ends else len(text)
+    return text[sentence_start:sentence_end]
+
+def refine_box(x1, y1, width, height, context):
+    """
+    Square off and tighten boxes around icons mentioned in the context
+    Returns (x1, y1, width, height, is_dock_icon)
+    """
+    lowered = context.lower()
+    is_mail_icon = any(term in lowered for term in MAIL_TERMS)
+    is_dock_icon = any(term in lowered for term in DOCK_TERMS) or is_mail_icon
+
+    if is_mail_icon:
+        # Create more precise boundaries for mail icon (square with center preserved)
+        center_x = x1 + width / 2
+        center_y = y1 + height / 2
+        box_size = min(width, height) * 0.85  # Tighter box
+        half_size = box_size / 2
+        x1 = int(center_x - half_size)
+        y1 = int(center_y - half_size)
+        width = int(box_size)
+        height = int(box_size)
+    elif is_dock_icon and not (width > height * 3 or height > width * 3):
+        # For other dock icons, make more square if not extremely elongated
+        center_x = x1 + width / 2
+        center_y = y1 + height / 2
+        refined_size = int(min(width, height) * 0.9)  # Use smaller dimension with slight reduction
+        half_size = refined_size / 2
+        x1 = int(center_x - half_size)
+        y1 = int(center_y - half_size)
+        width = refined_size
+        height = refined_size
+
+    # Ensure minimum size for visibility
+    min_size = 20 if is_dock_icon else 30
+    return x1, y1, max(width, min_size), max(height, min_size), is_dock_icon
+
+def highlight_message(text, box_text):
+    """A short message for a highlight: the instruction in the text, or the sentence around the box"""
+    instruction_text = GEMINI_BOX_PATTERN.sub(".", text).lower()  # A box ends the element name
+    for pattern in INSTRUCTION_PATTERNS:
+        match = re.search(pattern, instruction_text)
+        if match:
+            action_target = re.sub(r'\s+(?:at|in|on)$', '', match.group(1).strip())
+            if 5 <= len(action_target) <= 40:  # Reasonable length for a message
+                return f"Click {action_target}"
+
+    sentence_with_coords = re.search(r'([^.!?]*' + re.escape(box_text) + r'[^.!?]*[.!?])', text)
+    if sentence_with_coords:
+        clean_sentence = sentence_with_coords.group(1).replace(box_text, "").strip()
+        if clean_sentence and 5 <= len(clean_sentence) <= 60:
+            return clean_sentence
+    return "Click here"
+
+def parse_highlight_boxes(response, screen_width, screen_height, image_size=None):
+    """
+    Extract every bounding box in a model response, in order of appearance
+
+    Gemini boxes are used when present, otherwise the alternative formats.
+    Boxes are converted to screen pixels and refined per element; with several
+    boxes each one's message comes from its own sentence and is numbered.
+    Pixel boxes are in the image the model saw: image_size (width, height)
+    scales them to the screen when the upload was resized.
+
+    Returns a list of dicts with x, y, width, height, message, is_dock_icon, source,
+    model_box (the unrefined x, y, width, height) and span (the box's position in the response)
+    """
+    matches = list(GEMINI_BOX_PATTERN.finditer(response))
+    source = "gemini"
+    if not matches:
+        matches = list(ALTERNATIVE_BOX_PATTERN.finditer(response))
+        source = "alternative"
+
+    boxes = []
+    for match in matches:
+        values = [float(match.group(i)) for i in range(1, 5)]
+        if source == "gemini":
+            # Calculate pixel coordinates from normalized coordinates (0-1000)
+            y_min, x_min, y_max, x_max = values
+            x1 = int(x_min * screen_width / 1000)
+            y1 = int(y_min * screen_height / 1000)
+            x2 = int(x_max * screen_width / 1000)
+            y2 = int(y_max * screen_height / 1000)
+        else:
+            # Assume x1,y1,x2,y2, normalized to 0-1 if they look like it
+            is_normalized = any('.' in match.group(i) and float(match.group(i)) <= 1.0 for i in range(1, 5))
+            if is_normalized:
+                x1, y1 = int(values[0] * screen_width), int(values[1] * screen_height)
+                x2, y2 = int(values[2] * screen_width), int(values[3] * screen_height)
+            elif image_size:
+                scale_x, scale_y = screen_width / image_size[0], screen_height / image_size[1]
+                x1, y1 = int(values[0] * scale_x), int(values[1] * scale_y)
+                x2, y2 = int(values[2] * scale_x), int(values[3] * scale_y)
+            else:
+                x1, y1, x2, y2 = [int(v) for v in values]
+
+        # Ensure correct ordering
+        if x2 < x1: x1, x2 = x2, x1
+        if y2 < y1: y1, y2 = y2, y1
+
+        # A single box is described by the whole response, several by their own sentences
+        context = response if len(matches) == 1 else _sentence_around(response, match.start(), match.end())
+        model_box = (x1, y1, x2 - x1, y2 - y1)  # Before any refinement
+        if source == "gemini":
+            x1, y1, width, height, is_dock_icon = refine_box(x1, y1, x2 - x1, y2 - y1, context)
+            message = highlight_message(context, match.group(0))
+        else:
+            x1, y1, width, height, is_dock_icon = x1, y1, max(x2 - x1, 30), max(y2 - y1, 30), False
+            message = "Click here"
+        if len(matches) > 1:
+            message = f"{len(boxes) + 1} - {message}"
+
+        boxes.append({
+            'x': x1, 'y': y1, 'width': width, 'height': height,
+            'message': message, 'is_dock_icon': is_dock_icon, 'source': source,
+            'model_box': model_box, 'span': match.span(),
+        })
+    return boxes
+
+def parse_structured_response(response):
+    """
+    Decode a structured output (JSON mode) response
+    Returns a dict with step_text, boxes (each with label and box_2d), action (kind, text)
+    and is_complete, or None when the response isn't valid structured output
+    """
+    text = response.strip()
+    if text.startswith("```"):
+        text = text.strip("`").strip()
+        if text.startswith("json"):
+            text = text[4:].strip()
+    if not text.startswith("{"):
+        return None  # Free text
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return None
+    if not isinstance(data, dict) or not isinstance(data.get("step_text"), str):
+        return None
+    boxes = [box for box in data.get("boxes") or []
+             if isinstance(box, dict) and isinstance(box.get("box_2d"), list) and len(box["box_2d"]) == 4]
+    action = data.get("action") if isinstance(data.get("action"), dict) else {}
+    return {
+        'step_text': data["step_text"].strip(),
+        'boxes': boxes,
+        'action': {'kind': action.get("kind") or "none", 'text': action.get("text") or ""},
+        'is_complete': bool(data.get("is_complete")),
+    }
+
+def structured_boxes(step, screen_width, screen_height):
+    """
+    Boxes of a structured response in screen pixels, in the same form as
+    parse_highlight_boxes (source "structured", no span); messages come from the labels
+    """
+    boxes = []
+    for item in step['boxes']:
+        y_min, x_min, y_max, x_max = [float(value) for value in item["box_2d"]]
+        x1, x2 = sorted((int(x_min * screen_width / 1000), int(x_max * screen_width / 1000)))
+        y1, y2 = sorted((int(y_min * screen_height / 1000), int(y_max * screen_height / 1000)))
+        label = str(item.get("label") or "").strip()
+        # A single box is described by the whole step, several by their own labels
+        context = f"{label} {step['step_text']}" if len(step['boxes']) == 1 else label
+        model_box = (x1, y1, x2 - x1, y2 - y1)
+        x1, y1, width, height, is_dock_icon = refine_box(x1, y1, x2 - x1, y2 - y1, context)
+        message = f"Click {label}" if 0 < len(label) <= 40 else "Click here"
+        if len(step['boxes']) > 1:
+            message = f"{len(boxes) + 1} - {message}"
+        boxes.append({
+            'x': x1, 'y': y1, 'width': width, 'height': height,
+            'message': message, 'is_dock_icon': is_dock_icon, 'source': "structured",
+            'model_box': model_box,
+        })
+    return boxes
+
+def highlight_specs(boxes):
+    """Overlay highlights for parsed boxes: all flash and stay up, the first step is on top with a click cue"""
+    return [
+        {
+            'x': box['x'], 'y': box['y'], 'width': box['width'], 'height': box['height'],
+            'message': box['message'],
+            'show_click': index == 0,
+            'flash': True,
+            'fade_out': False,
+            'z': len(boxes) - index,
+        }
+        for index, box in enumerate(boxes)
+    ]
+
+def is_task_complete(response):
+    """Whether a response says the task is finished"""
+    lowered = response.lower()
+    return any(phrase in lowered for phrase in COMPLETION_PHRASES)
+
+def has_instruction(response):
+    """Whether a response gives the user a step: an instruction cue or a box"""
+    lowered = response.lower()
+    return any(cue in lowered for cue in INSTRUCTION_CUES) or bool(re.search(r"\[[\d\.,\s]+\]", response))
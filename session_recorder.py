@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+Record assistant sessions and replay their local stages for performance regression testing.
+
+A recording is one append-only file of length-prefixed records: JSON events (turns, prompts,
+responses, parsed boxes and per-stage timings) and captured frames. Frames are stored as the
+XOR of the previous frame compressed with zlib, so unchanged pixels cost almost nothing, with
+a full keyframe at the start of each session, on size changes and every KEYFRAME_INTERVAL
+frames. A recording cut short by a crash is read up to its last complete record.
+
+Replay reruns the local stages (parse, refine, overlay commands) on the recorded frames and
+model responses, so parser and renderer changes can be timed on real sessions without any
+model call, and reports boxes that no longer match the recording.
+
+Usage:
+    python main.py --record session.rec           # Record (or set SESSION_RECORD=session.rec)
+    python session_recorder.py info session.rec
+    python session_recorder.py replay session.rec --runs 5 [--overlay qt]
+"""
+import argparse
+import json
+import os
+import platform
+import queue
+import statistics
+import struct
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+
+import numpy as np
+
+from coordinates import CoordinateTransform
+from response_parser import (parse_highlight_boxes, parse_structured_response, structured_boxes, highlight_specs,
+                             RESPONSE_HIGHLIGHT_GROUP)
+from box_refiner import refine_boxes
+
+MAGIC = b"AIREC1\n"
+RECORD_FORMAT = struct.Struct("<BdI")  # kind, wall clock time, payload length
+FRAME_FORMAT = struct.Struct("<IIIBB")  # turn, width, height, channels, keyframe
+REC_EVENT = 1  # UTF-8 JSON
+REC_FRAME = 2  # FRAME_FORMAT header, then the zlib-compressed frame (or XOR with the previous one)
+KEYFRAME_INTERVAL = 20
+COMPRESS_LEVEL = 1  # Fast; XOR diffs are mostly zeros and compress well anyway
+
+class SessionRecorder:
+    """
+    Appends a session to a recording file.
+
+    Calls return immediately: frame diffs, compression and writes happen on
+    a background thread, so recording doesn't slow down the turns it times.
+    Events belong to the current turn (see begin_turn).
+    """
+    def __init__(self, path):
+        self.path = path
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, "ab")
+        if new_file:
+            self.file.write(MAGIC)
+        self.turn = 0
+        self.turn_lock = threading.Lock()
+        self.queue = queue.Queue()
+        self.previous_frame = None  # Writer thread only
+        self.frames_since_keyframe = 0
+        self.writer = threading.Thread(target=self._write_loop, daemon=True)
+        self.writer.start()
+        self.event("session", platform=platform.system(), started=time.time())
+        print(f"Recording session to {path}")
+
+    @classmethod
+    def from_env(cls, path=None):
+        """A recorder for path or the SESSION_RECORD environment variable, or None when neither is set"""
+        path = path or os.getenv("SESSION_RECORD")
+        if not path:
+            return None
+        try:
+            return cls(path)
+        except OSError as e:
+            print(f"Could not open session recording {path}: {e}")
+            return None
+
+    def begin_turn(self, prompt, intent_data=None, model=None):
+        """Start a new turn; returns its number"""
+        with self.turn_lock:
+            self.turn += 1
+            turn = self.turn
+        self.event("turn", turn=turn, prompt=prompt, intent=intent_data, model=model)
+        return turn
+
+    def event(self, event_type, **fields):
+        fields["type"] = event_type
+        fields.setdefault("turn", self.turn)
+        self.queue.put((REC_EVENT, time.time(), fields))
+
+    def frame(self, pixels, transform, capture_ms=None, prefetched=False):
+        """Record a captured frame (H x W x C uint8 array) and where it sits on the desktop"""
+        if pixels is None:
+            return
+        self.queue.put((REC_FRAME, time.time(), (self.turn, pixels)))
+        self.event("capture", transform=transform_fields(transform), capture_ms=capture_ms, prefetched=prefetched)
+
+    def close(self):
+        self.queue.put(None)
+        self.writer.join(timeout=10)
+        self.file.close()
+
+    def _write_loop(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            kind, timestamp, data = item
+            try:
+                payload = self._encode_frame(*data) if kind == REC_FRAME else \
+                    json.dumps(data, default=str).encode("utf-8")
+                self.file.write(RECORD_FORMAT.pack(kind, timestamp, len(payload)))
+                self.file.write(payload)
+                self.file.flush()
+            except Exception as e:
+                print(f"Error writing session record: {e}")
+
+    def _encode_frame(self, turn, pixels):
+        pixels = np.ascontiguousarray(pixels, dtype=np.uint8)
+        height, width = pixels.shape[:2]
+        channels = pixels.shape[2] if pixels.ndim == 3 else 1
+        previous = self.previous_frame
+        keyframe = (previous is None or previous.shape != pixels.shape or
+                    self.frames_since_keyframe >= KEYFRAME_INTERVAL)
+        data = pixels if keyframe else np.bitwise_xor(pixels, previous)
+        self.frames_since_keyframe = 0 if keyframe else self.frames_since_keyframe + 1
+        self.previous_frame = pixels
+        return (FRAME_FORMAT.pack(turn, width, height, channels, keyframe) +
+                zlib.compress(data.tobytes(), COMPRESS_LEVEL))
+
+def transform_fields(transform):
+    if transform is None:
+        return None
+    return [transform.left, transform.top, transform.width, transform.height, transform.frame_width,
+            transform.frame_height, transform.upload_width, transform.upload_height]
+
+def read_records(path):
+    """
+    Yield (kind, timestamp, data) for every complete record: event dicts,
+    and (turn, pixels) for frames, decoded against the previous frame
+    """
+    previous = None
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a session recording")
+        while True:
+            header = f.read(RECORD_FORMAT.size)
+            if len(header) < RECORD_FORMAT.size:
+                return
+            kind, timestamp, length = RECORD_FORMAT.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length:
+                return  # Cut short while recording
+            if kind == REC_EVENT:
+                event = json.loads(payload.decode("utf-8"))
+                if event["type"] == "session":
+                    previous = None  # A new session starts with a keyframe
+                yield kind, timestamp, event
+            elif kind == REC_FRAME:
+                turn, width, height, channels, keyframe = FRAME_FORMAT.unpack_from(payload)
+                data = np.frombuffer(zlib.decompress(payload[FRAME_FORMAT.size:]), dtype=np.uint8)
+                if not keyframe:
+                    data = np.bitwise_xor(data, previous.reshape(-1))
+                shape = (height, width, channels) if channels > 1 else (height, width)
+                previous = data.reshape(shape)
+                yield kind, timestamp, (turn, previous)
+
+def load_turns(path):
+    """Turns of a recording with a response, as dicts of their events plus 'frame'"""
+    turns = []
+    current = {}
+    frame = None
+    for kind, timestamp, data in read_records(path):
+        if kind == REC_FRAME:
+            frame = data[1]
+            continue
+        event_type = data["type"]
+        if event_type == "session":
+            frame = None
+        elif event_type == "turn":
+            current = {"turn": data, "frame": None, "capture": None, "response": None, "boxes": None}
+            turns.append(current)
+        elif event_type == "capture":
+            current["capture"], current["frame"] = data, frame
+        elif event_type in ("response", "boxes"):
+            current[event_type] = data
+    return [turn for turn in turns if turn.get("response")]
+
+# --- Replay ---
+
+class OverlayCommandLog:
+    """Stands in for the overlay during replay: keeps the commands a turn would send"""
+    def __init__(self):
+        self.commands = []
+
+    @contextmanager
+    def batch(self):
+        yield self
+
+    def remove_group(self, group, fade=True):
+        self.commands.append(("remove_group", group))
+
+    def add_highlights(self, highlights, group=None):
+        self.commands.append(("add_highlights", group, highlights))
+        return [str(i) for i in range(len(highlights))]
+
+def run_local_stages(turn, overlay):
+    """Parse, refine and send overlay commands for a recorded turn; returns (boxes, timings in ms)"""
+    response = turn["response"]["response"]
+    recorded = turn["boxes"] or {}
+    fields = (turn["capture"] or {}).get("transform") or recorded.get("transform")
+    transform = CoordinateTransform(*fields) if fields else CoordinateTransform(0, 0, 1920, 1080)
+    frame = turn["frame"]
+
+    start = time.perf_counter()
+    step = parse_structured_response(response)
+    if step:
+        boxes = structured_boxes(step, transform.width, transform.height)
+    else:
+        boxes = parse_highlight_boxes(response, transform.width, transform.height,
+                                      image_size=(transform.upload_width, transform.upload_height))
+    parsed = time.perf_counter()
+    if boxes and frame is not None and recorded.get("refine", True):
+        refine_boxes(boxes, frame, transform.scale_x, transform.scale_y)
+    refined = time.perf_counter()
+    transform.boxes_to_screen(boxes)
+    if boxes:
+        with overlay.batch():
+            overlay.remove_group(RESPONSE_HIGHLIGHT_GROUP, fade=False)
+            overlay.add_highlights(highlight_specs(boxes), group=RESPONSE_HIGHLIGHT_GROUP)
+    drawn = time.perf_counter()
+    return boxes, {"parse": (parsed - start) * 1000, "refine": (refined - parsed) * 1000,
+                   "overlay": (drawn - refined) * 1000}
+
+def _box_tuple(box):
+    return tuple(round(box[key]) for key in ("x", "y", "width", "height"))
+
+def replay(path, runs=3, overlay=None, pump=None):
+    """
+    Rerun the local stages of every recorded turn `runs` times
+    Returns a list of per-turn dicts: turn, recorded timings, replayed medians, mismatched boxes
+    """
+    overlay = overlay or OverlayCommandLog()
+    report = []
+    for turn in load_turns(path):
+        samples = {"parse": [], "refine": [], "overlay": []}
+        for _ in range(runs):
+            boxes, timings = run_local_stages(turn, overlay)
+            if pump:
+                started = time.perf_counter()
+                pump()  # Let a real overlay paint
+                timings["overlay"] += (time.perf_counter() - started) * 1000
+            for stage, value in timings.items():
+                samples[stage].append(value)
+        recorded = turn["boxes"] or {}
+        expected = [tuple(box) for box in recorded.get("boxes", [])]
+        replayed = [_box_tuple(box) for box in boxes]
+        report.append({
+            "turn": turn["turn"]["turn"],
+            "prompt": turn["turn"].get("prompt"),
+            "recorded": {stage: recorded.get(f"{stage}_ms") for stage in samples},
+            "replayed": {stage: statistics.median(values) for stage, values in samples.items()},
+            "boxes": len(replayed),
+            "changed": turn["boxes"] is not None and expected != replayed,
+        })
+    return report
+
+def _ms(value):
+    return f"{value:7.2f}" if value is not None else "      -"
+
+def print_replay_report(report):
+    print(f"{'turn':>4}  {'boxes':>5}  {'parse ms (rec/now)':>18}  {'refine ms':>16}  {'overlay ms':>16}  prompt")
+    for row in report:
+        stages = "  ".join(f"{_ms(row['recorded'][stage])}/{_ms(row['replayed'][stage]).strip():<8}"
+                           for stage in ("parse", "refine", "overlay"))
+        flag = "  BOXES CHANGED" if row["changed"] else ""
+        print(f"{row['turn']:>4}  {row['boxes']:>5}  {stages}  {(row['prompt'] or '')[:40]}{flag}")
+    for stage in ("parse", "refine", "overlay"):
+        recorded = [row["recorded"][stage] for row in report if row["recorded"][stage] is not None]
+        replayed = [row["replayed"][stage] for row in report]
+        print(f"Total {stage}: recorded {sum(recorded):.2f}ms, replayed {sum(replayed):.2f}ms")
+    changed = sum(1 for row in report if row["changed"])
+    if changed:
+        print(f"{changed} turn(s) produced different boxes than when recorded")
+
+def print_info(path):
+    """Summary of a recording: sessions, turns, frames and their compressed size"""
+    sessions = turns = frames = keyframes = 0
+    stage_ms = {}
+    with open(path, "rb") as f:
+        f.read(len(MAGIC))
+        while True:
+            header = f.read(RECORD_FORMAT.size)
+            if len(header) < RECORD_FORMAT.size:
+                break
+            kind, _, length = RECORD_FORMAT.unpack(header)
+            payload = f.read(length)
+            if kind == REC_FRAME:
+                frames += 1
+                keyframes += FRAME_FORMAT.unpack_from(payload)[4]
+                continue
+            event = json.loads(payload.decode("utf-8"))
+            sessions += event["type"] == "session"
+            turns += event["type"] == "turn"
+            for key, value in event.items():
+                if key.endswith("_ms") and isinstance(value, (int, float)):
+                    stage_ms.setdefault(key[:-3], []).append(value)
+    print(f"{path}: {os.path.getsize(path) / 1024:.0f} KiB, {sessions} session(s), {turns} turn(s), "
+          f"{frames} frame(s) ({keyframes} keyframes)")
+    for stage, values in stage_ms.items():
+        print(f"  {stage}: median {statistics.median(values):.1f}ms, max {max(values):.1f}ms over {len(values)}")
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Inspect and replay recorded assistant sessions")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    info_parser = subparsers.add_parser("info", help="Summarize a recording")
+    info_parser.add_argument("recording")
+    replay_parser = subparsers.add_parser("replay", help="Rerun parse, refine and overlay stages of a recording")
+    replay_parser.add_argument("recording")
+    replay_parser.add_argument("--runs", type=int, default=3, help="Replays per turn (the median is reported)")
+    replay_parser.add_argument("--overlay", choices=["log", "qt"], default="log",
+                               help="Send overlay commands to a command log or a real Qt overlay")
+    args = parser.parse_args()
+
+    if args.command == "info":
+        print_info(args.recording)
+        return
+
+    overlay, pump = None, None
+    if args.overlay == "qt":
+        from qt_overlay import create_overlay
+        overlay, qt_app = create_overlay(all_screens=False)
+        pump = qt_app.processEvents
+    print_replay_report(replay(args.recording, args.runs, overlay, pump))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+A simulated desktop and stub model for exercising the autonomous loop and the
+action engine without touching the real screen, mouse or any model.
+"""
+import io
+import json
+import time
+import base64
+
+import numpy as np
+import pyautogui
+from PIL import Image
+
+from box_refiner import to_grayscale
+from action_engine import ActionEngine, DIFF_STEP
+from autonomous import AutonomousLoop, MAX_STEPS
+from coordinates import CoordinateTransform
+
+class SimulatedDesktop:
+    """
+    A fake screen of buttons that stands in for both pyautogui and the screen
+    capture. Clicking the next button of the task marks it as pressed (it
+    changes color); the stub model reads the same state to answer.
+    """
+    FailSafeException = pyautogui.FailSafeException
+
+    def __init__(self, buttons=("Mail", "New Message", "Send"), width=1280, height=800, render_delay=0.0):
+        self.width = width
+        self.height = height
+        self.render_delay = render_delay  # Seconds before a click shows up, like a real app
+        self.buttons = []  # (name, x, y, width, height)
+        for i, name in enumerate(buttons):
+            self.buttons.append((name, 100 + i * 300, 300 + (i % 2) * 200, 160, 60))
+        self.pressed = 0  # Number of buttons pressed so far (in order)
+        self.pointer = (width // 2, height // 2)
+        self.pressed_at = None
+        self.log = []
+
+    # Input driver (the parts of pyautogui the action engine uses)
+
+    def easeOutQuad(self, t):
+        return t
+
+    def failSafeCheck(self):
+        if self.pointer in ((0, 0), (self.width - 1, 0), (0, self.height - 1), (self.width - 1, self.height - 1)):
+            raise self.FailSafeException("Pointer in a screen corner")
+
+    def moveTo(self, x, y, duration=0.0, tween=None, _pause=True):
+        self.pointer = (int(x), int(y))
+        self.failSafeCheck()
+
+    def click(self, _pause=True):
+        self.log.append(('click', self.pointer))
+        if self.pressed < len(self.buttons):
+            name, x, y, width, height = self.buttons[self.pressed]
+            if x <= self.pointer[0] < x + width and y <= self.pointer[1] < y + height:
+                self.pressed += 1
+                self.pressed_at = time.perf_counter()
+
+    def doubleClick(self, _pause=True):
+        self.click()
+
+    def rightClick(self, _pause=True):
+        self.log.append(('right_click', self.pointer))
+
+    def write(self, text, interval=0.0, _pause=True):
+        self.log.append(('write', text))
+
+    def press(self, key, _pause=True):
+        self.log.append(('press', key))
+
+    def hotkey(self, *keys, _pause=True):
+        self.log.append(('hotkey', keys))
+
+    def scroll(self, amount, _pause=True):
+        self.log.append(('scroll', amount))
+
+    def dragTo(self, x, y, duration=0.0, button='left', _pause=True):
+        self.log.append(('drag', self.pointer, (int(x), int(y))))
+        self.pointer = (int(x), int(y))
+
+    # Screen
+
+    def next_button(self):
+        return self.buttons[self.pressed] if self.pressed < len(self.buttons) else None
+
+    def frame(self):
+        """Current screen as a BGRA array"""
+        pixels = np.full((self.height, self.width, 4), 235, dtype=np.uint8)
+        shown = self.pressed
+        if self.pressed_at is not None and time.perf_counter() - self.pressed_at < self.render_delay:
+            shown -= 1  # The last click hasn't been drawn yet
+        for i, (name, x, y, width, height) in enumerate(self.buttons):
+            color = (60, 160, 60, 255) if i < shown else (200, 120, 40, 255)
+            pixels[y:y + height, x:x + width] = color
+        return pixels
+
+    def diff_frame(self, monitor=None):
+        return to_grayscale(self.frame()[::DIFF_STEP, ::DIFF_STEP]).astype(np.int16)
+
+    def capture(self):
+        """(image_url, pixels, transform) like the app's capture"""
+        pixels = self.frame()
+        output = io.BytesIO()
+        Image.fromarray(pixels[..., [2, 1, 0]]).save(output, format="PNG", compress_level=1)
+        return (f"data:image/png;base64,{base64.b64encode(output.getvalue()).decode('utf-8')}", pixels,
+                CoordinateTransform(0, 0, self.width, self.height))
+
+class StubModel:
+    """
+    Answers like Gemini would on the simulated desktop: the next button to click, with its box,
+    in free text or as structured output
+    """
+    def __init__(self, desktop, latency=0.0, structured=False):
+        self.desktop = desktop
+        self.latency = latency  # Seconds per call, to model network time
+        self.structured = structured
+        self.calls = 0
+
+    def __call__(self, prompt, image_url):
+        self.calls += 1
+        time.sleep(self.latency)
+        button = self.desktop.next_button()
+        if button is None:
+            if self.structured:
+                return json.dumps({"step_text": "The task is complete, you're all set!", "boxes": [],
+                                   "action": {"kind": "none"}, "is_complete": True})
+            return "The task is complete, you're all set!"
+        name, x, y, width, height = button
+        box = [round(y * 1000 / self.desktop.height), round(x * 1000 / self.desktop.width),
+               round((y + height) * 1000 / self.desktop.height), round((x + width) * 1000 / self.desktop.width)]
+        if self.structured:
+            return json.dumps({"step_text": f"Click on the {name} button.", "boxes": [{"label": name, "box_2d": box}],
+                               "action": {"kind": "click"}, "is_complete": False})
+        return f"Click on the {name} button {box}."
+
+def run_simulated(buttons=("Mail", "New Message", "Send"), model_latency=0.0, render_delay=0.0,
+                  max_steps=MAX_STEPS, motion="instant", structured=False):
+    """Run the loop against a simulated desktop with the stub model; returns (LoopResult, desktop)"""
+    desktop = SimulatedDesktop(buttons, render_delay=render_delay)
+    engine = ActionEngine(driver=desktop, capture=desktop.diff_frame, motion=motion)
+    loop = AutonomousLoop(desktop.capture, StubModel(desktop, model_latency, structured), engine, max_steps=max_steps)
+    return loop.run("Send an email"), desktop
@@ -0,0 +1,95 @@
+import math
+
+# Side of a grid cell in pixels; UI elements are mostly smaller, so a box covers few cells
+CELL_SIZE = 128
+
+class SpatialIndex:
+    """
+    Uniform grid index of axis-aligned boxes, for hit-testing and overlap queries.
+
+    Each box is registered in every grid cell it covers, so a point query
+    only looks at the boxes of one cell and a rectangle query at the boxes of
+    the cells it spans, instead of scanning everything. Inserting, moving and
+    removing a box only touch the cells it covers. Keys are any hashable
+    (highlight ids, cache keys); boxes are (x, y, width, height).
+    """
+    def __init__(self, cell_size=CELL_SIZE):
+        self.cell_size = cell_size
+        self.boxes = {}  # Key -> (x, y, width, height)
+        self.cells = {}  # (column, row) -> set of keys
+
+    def _cell_range(self, x, y, width, height):
+        size = self.cell_size
+        return (math.floor(x / size), math.floor(y / size),
+                math.floor((x + max(width, 0)) / size), math.floor((y + max(height, 0)) / size))
+
+    def insert(self, key, x, y, width, height):
+        """Add a box, or move it if the key is already indexed"""
+        if key in self.boxes:
+            self.remove(key)
+        self.boxes[key] = (x, y, width, height)
+        col1, row1, col2, row2 = self._cell_range(x, y, width, height)
+        for col in range(col1, col2 + 1):
+            for row in range(row1, row2 + 1):
+                self.cells.setdefault((col, row), set()).add(key)
+
+    def remove(self, key):
+        box = self.boxes.pop(key, None)
+        if box is None:
+            return False
+        col1, row1, col2, row2 = self._cell_range(*box)
+        for col in range(col1, col2 + 1):
+            for row in range(row1, row2 + 1):
+                keys = self.cells.get((col, row))
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self.cells[(col, row)]
+        return True
+
+    def get(self, key):
+        return self.boxes.get(key)
+
+    def clear(self):
+        self.boxes.clear()
+        self.cells.clear()
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def __contains__(self, key):
+        return key in self.boxes
+
+    def query_point(self, x, y):
+        """Keys of the boxes containing a point"""
+        keys = self.cells.get((math.floor(x / self.cell_size), math.floor(y / self.cell_size)), ())
+        hits = []
+        for key in keys:
+            box_x, box_y, width, height = self.boxes[key]
+            if box_x <= x < box_x + width and box_y <= y < box_y + height:
+                hits.append(key)
+        return hits
+
+    def query_rect(self, x, y, width, height):
+        """Keys of the boxes overlapping a rectangle"""
+        col1, row1, col2, row2 = self._cell_range(x, y, width, height)
+        if (col2 - col1 + 1) * (row2 - row1 + 1) > len(self.cells):
+            candidates = self.boxes  # Larger than the occupied grid: checking every box is cheaper
+        else:
+            candidates = set()
+            for col in range(col1, col2 + 1):
+                for row in range(row1, row2 + 1):
+                    candidates.update(self.cells.get((col, row), ()))
+        hits = []
+        for key in candidates:
+            box_x, box_y, box_width, box_height = self.boxes[key]
+            if box_x < x + width and x < box_x + box_width and box_y < y + height and y < box_y + box_height:
+                hits.append(key)
+        return hits
+
+    def overlapping(self, key):
+        """Keys of the other boxes overlapping an indexed box"""
+        box = self.boxes.get(key)
+        if box is None:
+            return []
+        return [other for other in self.query_rect(*box) if other != key]
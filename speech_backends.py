@@ -0,0 +1,369 @@
+import io
+import os
+import sys
+import time
+import wave
+import struct
+import socket
+import shutil
+import tempfile
+import threading
+import subprocess
+from array import array
+
+import openai
+
+# All TTS backends return 24 kHz 16-bit mono PCM (the shared mixer's format)
+TTS_SAMPLE_RATE = 24000
+TTS_SPEED = 1.1  # Faster speech rate for more natural sound (applied by every backend)
+ESPEAK_WORDS_PER_MINUTE = 175  # espeak's default rate, scaled by TTS_SPEED
+
+# Latency budgets used to pick a backend (seconds)
+STT_LATENCY_BUDGET = float(os.getenv("STT_LATENCY_BUDGET", "1.5"))
+TTS_LATENCY_BUDGET = float(os.getenv("TTS_LATENCY_BUDGET", "1.0"))
+
+# Connectivity check
+CONNECTIVITY_HOST = ("api.openai.com", 443)
+CONNECTIVITY_TTL = 30  # seconds a connectivity result is reused
+
+def _read_wav(audio_bytes):
+    """(channels, sample width, rate, little-endian frames) of WAV bytes"""
+    with wave.open(io.BytesIO(audio_bytes), 'rb') as wf:
+        return wf.getnchannels(), wf.getsampwidth(), wf.getframerate(), wf.readframes(wf.getnframes())
+
+def _read_aiff(audio_bytes):
+    """(channels, sample width, rate, little-endian frames) of uncompressed AIFF/AIFC bytes (macOS voices)"""
+    is_aifc = audio_bytes[8:12] == b'AIFC'
+    channels = sample_width = rate = frames = None
+    byte_order = 'big'
+    position = 12
+    while position + 8 <= len(audio_bytes):
+        chunk_id = audio_bytes[position:position + 4]
+        size = struct.unpack('>I', audio_bytes[position + 4:position + 8])[0]
+        chunk = audio_bytes[position + 8:position + 8 + size]
+        if chunk_id == b'COMM':
+            channels, frame_count, bits = struct.unpack('>hIh', chunk[:8])
+            sample_width = (bits + 7) // 8
+            # Sample rate is an 80-bit IEEE extended float
+            exponent = struct.unpack('>H', chunk[8:10])[0] & 0x7FFF
+            mantissa = int.from_bytes(chunk[10:18], 'big')
+            rate = round(mantissa * 2.0 ** (exponent - 16383 - 63))
+            compression = chunk[18:22] if is_aifc else b'NONE'
+            if compression == b'sowt':
+                byte_order = 'little'
+            elif compression not in (b'NONE', b'twos'):
+                raise ValueError(f"Unsupported AIFF compression: {compression!r}")
+        elif chunk_id == b'SSND':
+            offset = struct.unpack('>I', chunk[:4])[0]
+            frames = chunk[8 + offset:]
+        position += 8 + size + (size & 1)  # Chunks are padded to an even length
+    if channels is None or frames is None:
+        raise ValueError("AIFF data has no COMM or SSND chunk")
+    frames = frames[:frame_count * channels * sample_width]
+    if byte_order == 'big' and sample_width == 2:
+        samples = array('h')
+        samples.frombytes(frames)
+        if sys.byteorder == 'little':
+            samples.byteswap()
+        frames = samples.tobytes()
+    return channels, sample_width, rate, frames
+
+def audio_to_pcm(audio_bytes, target_rate=TTS_SAMPLE_RATE):
+    """Convert WAV or AIFF bytes to 16-bit mono PCM at target_rate (linear resampling)"""
+    if audio_bytes[:4] == b'RIFF':
+        channels, sample_width, rate, frames = _read_wav(audio_bytes)
+    elif audio_bytes[:4] == b'FORM' and audio_bytes[8:12] in (b'AIFF', b'AIFC'):
+        channels, sample_width, rate, frames = _read_aiff(audio_bytes)
+    else:
+        raise ValueError("Unrecognized audio format (expected WAV or AIFF)")
+    if sample_width != 2:
+        raise ValueError(f"Unsupported sample width: {sample_width * 8} bits")
+
+    samples = array('h')
+    samples.frombytes(frames)
+    if channels > 1:
+        samples = array('h', (sum(samples[i:i + channels]) // channels for i in range(0, len(samples), channels)))
+    if rate == target_rate or not samples:
+        return samples.tobytes()
+
+    count = int(len(samples) * target_rate / rate)
+    step = rate / target_rate
+    last = len(samples) - 1
+    resampled = array('h', bytes(2 * count))
+    for i in range(count):
+        position = i * step
+        index = int(position)
+        fraction = position - index
+        next_index = index + 1 if index < last else last
+        resampled[i] = int(samples[index] + (samples[next_index] - samples[index]) * fraction)
+    return resampled.tobytes()
+
+class SpeechBackend:
+    """
+    Base class for speech backends.
+
+    Subclasses set name, is_local and quality (higher is better), and provide
+    a latency prior: overhead seconds plus seconds per unit of work (audio
+    seconds for STT, characters for TTS). Observed latencies refine the prior.
+    """
+    name = "base"
+    is_local = False
+    quality = 0
+    latency_overhead = 1.0
+    latency_per_unit = 0.0
+
+    def __init__(self):
+        self.latency_scale = 1.0  # Running ratio of observed to predicted latency
+
+    def is_available(self):
+        return True
+
+    def estimate_latency(self, units):
+        return (self.latency_overhead + self.latency_per_unit * units) * self.latency_scale
+
+    def record_latency(self, units, seconds, weight=0.3):
+        predicted = self.latency_overhead + self.latency_per_unit * units
+        if predicted > 0:
+            self.latency_scale += weight * (seconds / predicted - self.latency_scale)
+
+class SpeechToTextBackend(SpeechBackend):
+    def transcribe(self, audio_bytes, file_name, prompt=None):
+        """Return the transcribed text, or None"""
+        raise NotImplementedError
+
+class TextToSpeechBackend(SpeechBackend):
+    def synthesize(self, text, voice):
+        """Return 24 kHz 16-bit mono PCM bytes, or None"""
+        raise NotImplementedError
+
+class OpenAIWhisperSTT(SpeechToTextBackend):
+    """OpenAI's hosted whisper-1 model"""
+    name = "openai-whisper"
+    quality = 2
+    latency_overhead = 0.8
+    latency_per_unit = 0.05
+
+    def is_available(self):
+        return bool(os.getenv("OPENAI_API_KEY"))
+
+    def transcribe(self, audio_bytes, file_name, prompt=None):
+        request = {"model": "whisper-1", "file": (file_name, audio_bytes)}
+        if prompt:
+            request["prompt"] = prompt
+        return openai.audio.transcriptions.create(**request).text
+
+class FasterWhisperSTT(SpeechToTextBackend):
+    """Local CPU Whisper via the optional faster-whisper package"""
+    name = "faster-whisper"
+    is_local = True
+    quality = 2
+    latency_overhead = 0.1
+    latency_per_unit = 0.25  # CPU seconds per second of audio for a small model
+
+    def __init__(self, model_size=None):
+        super().__init__()
+        self.model_size = model_size or os.getenv("LOCAL_STT_MODEL", "base.en")
+        self.model = None
+        self.lock = threading.Lock()
+
+    def is_available(self):
+        try:
+            import faster_whisper  # noqa: F401
+            return True
+        except ImportError:
+            return False
+
+    def transcribe(self, audio_bytes, file_name, prompt=None):
+        with self.lock:
+            if self.model is None:
+                from faster_whisper import WhisperModel
+                self.model = WhisperModel(self.model_size, device="cpu", compute_type="int8")
+            segments, _ = self.model.transcribe(io.BytesIO(audio_bytes), initial_prompt=prompt, beam_size=1)
+            return " ".join(segment.text.strip() for segment in segments)
+
+class OpenAITTS(TextToSpeechBackend):
+    """OpenAI's hosted tts-1 voices"""
+    name = "openai-tts"
+    quality = 3
+    latency_overhead = 0.5
+    latency_per_unit = 0.002
+
+    def is_available(self):
+        return bool(os.getenv("OPENAI_API_KEY"))
+
+    def synthesize(self, text, voice):
+        with openai.audio.speech.with_streaming_response.create(
+            model="tts-1",
+            voice=voice,
+            input=text,
+            response_format="pcm",
+            speed=TTS_SPEED
+        ) as response:
+            return b''.join(response.iter_bytes())
+
+class Pyttsx3TTS(TextToSpeechBackend):
+    """Local system voices via pyttsx3 (NSSpeechSynthesizer, SAPI5 or espeak)"""
+    name = "pyttsx3"
+    is_local = True
+    quality = 1
+    latency_overhead = 0.15
+    latency_per_unit = 0.001
+
+    def __init__(self):
+        super().__init__()
+        self.engine = None
+        self.lock = threading.Lock()  # pyttsx3 engines aren't thread-safe
+
+    def is_available(self):
+        try:
+            import pyttsx3  # noqa: F401
+            return True
+        except ImportError:
+            return False
+
+    def synthesize(self, text, voice):
+        with self.lock:
+            if self.engine is None:
+                import pyttsx3
+                self.engine = pyttsx3.init()
+                self.engine.setProperty('rate', int(self.engine.getProperty('rate') * TTS_SPEED))
+            # The macOS driver (NSSpeechSynthesizer) writes AIFF whatever the extension; others write WAV
+            suffix = '.aiff' if sys.platform == 'darwin' else '.wav'
+            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
+            temp_file.close()
+            try:
+                self.engine.save_to_file(text, temp_file.name)
+                self.engine.runAndWait()
+                with open(temp_file.name, 'rb') as f:
+                    return audio_to_pcm(f.read())
+            finally:
+                os.unlink(temp_file.name)
+
+class EspeakTTS(TextToSpeechBackend):
+    """Local espeak-ng / espeak command line synthesizer"""
+    name = "espeak"
+    is_local = True
+    quality = 0
+    latency_overhead = 0.05
+    latency_per_unit = 0.0005
+
+    def __init__(self):
+        super().__init__()
+        self.command = shutil.which("espeak-ng") or shutil.which("espeak")
+
+    def is_available(self):
+        return self.command is not None
+
+    def synthesize(self, text, voice):
+        # "--" ends the options, so text starting with "-" is spoken rather than parsed
+        command = [self.command, "--stdout", "-s", str(int(ESPEAK_WORDS_PER_MINUTE * TTS_SPEED)), "--", text]
+        result = subprocess.run(command, capture_output=True, timeout=30, check=True)
+        return audio_to_pcm(result.stdout)
+
+class SpeechBackendSelector:
+    """
+    Picks speech backends per request from a latency budget and connectivity.
+
+    Among available backends (network ones only when online), the highest
+    quality one whose estimated latency fits the budget wins, ties going to
+    the faster one; if none fits, the fastest is used. With the default
+    priors short utterances are transcribed locally when a local model is
+    installed, skipping the network round trip, and everything stays local
+    when offline.
+    """
+    def __init__(self, stt_backends=None, tts_backends=None):
+        self.stt_backends = stt_backends if stt_backends is not None else [OpenAIWhisperSTT(), FasterWhisperSTT()]
+        self.tts_backends = tts_backends if tts_backends is not None else [OpenAITTS(), Pyttsx3TTS(), EspeakTTS()]
+        self.stt_budget = STT_LATENCY_BUDGET
+        self.tts_budget = TTS_LATENCY_BUDGET
+        self.online = None
+        self.online_checked_at = 0.0
+        self.force_offline = os.getenv("SPEECH_OFFLINE", "").lower() in ("1", "true", "yes")
+        self.available = {}  # Backend name -> cached is_available() result
+
+    def is_online(self):
+        """Whether the speech API is reachable (cached for a short time)"""
+        if self.force_offline:
+            return False
+        now = time.time()
+        if self.online is None or now - self.online_checked_at > CONNECTIVITY_TTL:
+            try:
+                socket.create_connection(CONNECTIVITY_HOST, timeout=0.5).close()
+                self.online = True
+            except OSError:
+                self.online = False
+            self.online_checked_at = now
+        return self.online
+
+    def _is_available(self, backend):
+        if backend.name not in self.available:
+            self.available[backend.name] = backend.is_available()
+        return self.available[backend.name]
+
+    def _choose(self, backends, units, budget):
+        online = self.is_online()
+        candidates = [b for b in backends if self._is_available(b) and (b.is_local or online)]
+        if not candidates:
+            return None
+        within_budget = [b for b in candidates if b.estimate_latency(units) <= budget]
+        if within_budget:
+            return max(within_budget, key=lambda b: (b.quality, -b.estimate_latency(units)))
+        return min(candidates, key=lambda b: b.estimate_latency(units))
+
+    def choose_stt(self, audio_seconds):
+        return self._choose(self.stt_backends, audio_seconds, self.stt_budget)
+
+    def choose_tts(self, text):
+        return self._choose(self.tts_backends, len(text), self.tts_budget)
+
+    def _run(self, backends, backend, units, call):
+        """
+        Run a call on a backend, falling back to the other backends on failure
+        Returns (result, backend that produced it), or (None, None)
+        """
+        ordered = [backend] + [b for b in backends if b is not backend and self._is_available(b)]
+        for candidate in ordered:
+            if not candidate.is_local and not self.is_online():
+                continue
+            start_time = time.perf_counter()
+            try:
+                result = call(candidate)
+            except Exception as e:
+                print(f"Speech backend {candidate.name} failed: {e}")
+                continue
+            candidate.record_latency(units, time.perf_counter() - start_time)
+            if result:
+                return result, candidate
+        return None, None
+
+    def transcribe(self, audio_bytes, file_name, prompt=None, audio_seconds=None):
+        """Transcribe audio with the best backend for its length"""
+        audio_seconds = audio_seconds if audio_seconds is not None else 5.0
+        backend = self.choose_stt(audio_seconds)
+        if backend is None:
+            print("No speech-to-text backend available")
+            return None
+        text, _ = self._run(self.stt_backends, backend, audio_seconds,
+                            lambda b: b.transcribe(audio_bytes, file_name, prompt))
+        return text
+
+    def synthesize(self, text, voice, backend=None):
+        """
+        Synthesize text with the given backend, or the best one for its length
+        Returns (pcm_bytes, backend name); the name tells which voice the audio is in
+        """
+        backend = backend or self.choose_tts(text)
+        if backend is None:
+            print("No text-to-speech backend available")
+            return None, None
+        pcm_bytes, used = self._run(self.tts_backends, backend, len(text), lambda b: b.synthesize(text, voice))
+        return pcm_bytes, used.name if used else None
+
+# Singleton instance for easy import
+_selector = None
+
+def get_speech_backends():
+    global _selector
+    if _selector is None:
+        _selector = SpeechBackendSelector()
+    return _selector
@@ -0,0 +1,169 @@
+import re
+import time
+import queue
+import threading
+
+from audio_cache import get_audio_cache
+from audio_service import get_audio_service
+from speech_backends import get_speech_backends, TTS_SAMPLE_RATE, TTS_SPEED
+MAX_SPOKEN_CHARS = 2000  # Longer responses are cut off, the rest is only in the chat
+TRUNCATION_NOTICE = "... and more information is in the text chat."
+
+# Sentence boundaries: end punctuation followed by whitespace, or a blank line
+SENTENCE_END_PATTERN = re.compile(r'(?<=[.!?:])\s+|\n{2,}')
+
+def simplify_for_speech(text):
+    """Remove coordinates, URLs and markdown that shouldn't be read aloud"""
+    simplified_text = re.sub(r'\[[\d\., ]+\]', '', text)  # Remove coordinate patterns
+    simplified_text = re.sub(r'(http|https)://[^\s]*', '', simplified_text)  # Remove URLs
+    simplified_text = re.sub(r'\*\*([^*]+)\*\*', r'\1', simplified_text)  # Remove markdown bold
+    simplified_text = re.sub(r'\n\n', ' ', simplified_text)  # Replace double newlines with space
+    simplified_text = simplified_text.replace('📚 Learn More:', 'Learn More:')
+    simplified_text = re.sub(r'[ \t]{2,}', ' ', simplified_text)  # Collapse gaps left by removals
+    return simplified_text.strip()
+
+def synthesize_cached(text, voice, synthesize_fn=None, cache=None, backend=None):
+    """
+    Return audio for the text from the cache, synthesizing and storing it on a miss
+    Without a synthesize_fn the given backend is used (or the one the speech backend
+    selector picks), falling back to others only if it fails; the backend's name
+    becomes part of the cached voice (voices differ per backend)
+    """
+    if synthesize_fn is not None:
+        pcm_bytes = cache.get(text, voice, TTS_SPEED) if cache else None
+        if pcm_bytes is None:
+            pcm_bytes = synthesize_fn(text, voice)
+            if pcm_bytes and cache:
+                cache.put(text, voice, TTS_SPEED, pcm_bytes)
+        return pcm_bytes
+
+    backends = get_speech_backends()
+    backend = backend or backends.choose_tts(text)
+    if backend is None:
+        return None
+    pcm_bytes = cache.get(text, f"{backend.name}:{voice}", TTS_SPEED) if cache else None
+    if pcm_bytes is None:
+        pcm_bytes, used = backends.synthesize(text, voice, backend)
+        if pcm_bytes and cache:
+            cache.put(text, f"{used}:{voice}", TTS_SPEED, pcm_bytes)
+    return pcm_bytes
+
+def split_sentences(text):
+    """Split a complete text into the same sentences the pipeline would speak"""
+    splitter = SentenceSplitter()
+    return splitter.feed(text) + splitter.flush()
+
+def warm_audio_cache(phrases, voice, synthesize_fn=None):
+    """Synthesize canned phrases ahead of time (only those not cached yet)"""
+    cache = get_audio_cache()
+    for phrase in phrases:
+        for sentence in split_sentences(phrase):
+            spoken = simplify_for_speech(sentence)
+            if spoken:
+                synthesize_cached(spoken, voice, synthesize_fn, cache)
+
+class SentenceSplitter:
+    """
+    Incrementally splits streamed text into sentences.
+    Very short fragments (e.g. "1.") are merged into the following sentence.
+    """
+    def __init__(self, min_chars=12):
+        self.min_chars = min_chars
+        self.buffer = ""
+
+    def feed(self, text):
+        """Add streamed text and return any sentences completed by it"""
+        self.buffer += text
+        sentences = []
+        pending = ""
+        position = 0
+        for match in SENTENCE_END_PATTERN.finditer(self.buffer):
+            pending += self.buffer[position:match.start()] + " "
+            position = match.end()
+            if len(pending.strip()) >= self.min_chars:
+                sentences.append(pending.strip())
+                pending = ""
+        self.buffer = pending + self.buffer[position:]
+        return sentences
+
+    def flush(self):
+        """Return whatever text is left once the stream has ended"""
+        rest = self.buffer.strip()
+        self.buffer = ""
+        return [rest] if rest else []
+
+class TTSPipeline:
+    """
+    Speaks a response while it is still being generated.
+
+    Text is fed as it streams from the model; each completed sentence is
+    synthesized on a worker thread and queued on the shared mixer, so the first
+    sentence plays while later ones are still being generated or synthesized.
+    Starting a new pipeline interrupts the previous one's audio. Without a
+    synthesize_fn the speech backend selector picks a backend for the first
+    sentence and every sentence of the response uses it, so the voice doesn't
+    change partway through; another backend is only used when it fails.
+    """
+    def __init__(self, synthesize_fn=None, voice="alloy", playback=None, on_error=None, use_cache=True):
+        self.synthesize_fn = synthesize_fn
+        self.voice = voice
+        self.playback = playback or get_audio_service().begin_playback()
+        self.on_error = on_error
+        self.cache = get_audio_cache() if use_cache else None
+        self.backend = None  # Picked for the first sentence, then kept for the whole response
+        self.splitter = SentenceSplitter()
+        self.sentences = queue.Queue()
+        self.started_at = time.perf_counter()
+        self.first_audio_at = None
+        self.spoken_chars = 0
+        self.thread = threading.Thread(target=self._synthesize_loop, daemon=True)
+        self.thread.start()
+
+    def feed(self, text):
+        """Add streamed response text"""
+        for sentence in self.splitter.feed(text):
+            self.sentences.put(sentence)
+
+    def finish(self):
+        """Mark the end of the response; remaining text is spoken in the background"""
+        for sentence in self.splitter.flush():
+            self.sentences.put(sentence)
+        self.sentences.put(None)
+
+    def speak(self, text):
+        """Speak a complete text (sentence by sentence)"""
+        self.feed(text)
+        self.finish()
+
+    def _synthesize_loop(self):
+        while True:
+            sentence = self.sentences.get()
+            if sentence is None or not self.playback.active:
+                return  # Finished, or preempted by a newer response
+            spoken = simplify_for_speech(sentence)
+            if not spoken or self.spoken_chars >= MAX_SPOKEN_CHARS:
+                continue
+            self.spoken_chars += len(spoken)
+            if self.spoken_chars >= MAX_SPOKEN_CHARS:
+                spoken += " " + TRUNCATION_NOTICE
+            if self.synthesize_fn is None and self.backend is None:
+                self.backend = get_speech_backends().choose_tts(spoken)
+            pcm_bytes = synthesize_cached(spoken, self.voice, self.synthesize_fn, self.cache, self.backend)
+            if not pcm_bytes:
+                if self.on_error:
+                    self.on_error(f"Failed to synthesize: {spoken[:40]}")
+                continue
+            self.playback.enqueue(pcm_bytes)
+            if self.first_audio_at is None:
+                self.first_audio_at = time.perf_counter()
+
+    def wait(self, timeout=None):
+        """Wait until every sentence has been synthesized and queued"""
+        self.thread.join(timeout)
+
+    @property
+    def time_to_first_audio(self):
+        """Seconds from pipeline creation until the first segment was queued (None if none yet)"""
+        if self.first_audio_at is None:
+            return None
+        return self.first_audio_at - self.started_at
@@ -0,0 +1,96 @@
+import time
+import threading
+
+from autonomous import AutonomousLoop, COMPLETE, BUDGET_EXHAUSTED, ABORTED, STOPPED
+from action_engine import ActionEngine
+from simulated_desktop import SimulatedDesktop, StubModel, run_simulated
+
+BUTTONS = ("Mail", "New Message", "Send")
+
+def assert_clicked(desktop, count):
+    """The click log holds one click near the center of each of the first count buttons, in order"""
+    assert [kind for kind, _ in desktop.log] == ['click'] * count
+    for (_, (click_x, click_y)), (_, x, y, width, height) in zip(desktop.log, desktop.buttons):
+        assert abs(click_x - (x + width / 2)) <= 2 and abs(click_y - (y + height / 2)) <= 2
+
+def test_completes_task():
+    result, desktop = run_simulated(BUTTONS)
+    assert result.status == COMPLETE
+    assert len(result.steps) == len(BUTTONS) + 1  # One click per button, then the completion answer
+    assert [step['actions'] for step in result.steps] == [1, 1, 1, 0]
+    assert desktop.pressed == len(BUTTONS)
+    assert_clicked(desktop, len(BUTTONS))
+
+def test_completes_task_structured():
+    result, desktop = run_simulated(BUTTONS, structured=True)
+    assert result.status == COMPLETE
+    assert len(result.steps) == len(BUTTONS) + 1
+    assert_clicked(desktop, len(BUTTONS))
+
+def test_completes_with_render_delay():
+    result, desktop = run_simulated(BUTTONS, render_delay=0.05)
+    assert result.status == COMPLETE
+    assert desktop.pressed == len(BUTTONS)
+
+def test_budget_exhausted():
+    result, desktop = run_simulated(BUTTONS, max_steps=2)
+    assert result.status == BUDGET_EXHAUSTED
+    assert len(result.steps) == 2
+    assert_clicked(desktop, 2)
+
+def make_loop(desktop, on_step=None):
+    engine = ActionEngine(driver=desktop, capture=desktop.diff_frame, motion="instant")
+    return AutonomousLoop(desktop.capture, StubModel(desktop), engine, on_step=on_step)
+
+def test_aborted_before_first_step():
+    desktop = SimulatedDesktop(BUTTONS)
+    desktop.pointer = (0, 0)  # Mouse already in a screen corner
+    result = make_loop(desktop).run("Send an email")
+    assert result.status == ABORTED
+    assert result.steps == []
+    assert desktop.log == []
+
+def test_aborted_between_steps():
+    desktop = SimulatedDesktop(BUTTONS)
+
+    def on_step(step):
+        desktop.pointer = (desktop.width - 1, 0)  # The user moves the mouse into a corner
+
+    result = make_loop(desktop, on_step).run("Send an email")
+    assert result.status == ABORTED
+    assert len(result.steps) == 1
+    assert_clicked(desktop, 1)
+
+def test_aborted_during_model_call():
+    desktop = SimulatedDesktop(BUTTONS)
+    loop = AutonomousLoop(desktop.capture, StubModel(desktop, latency=5.0),
+                          ActionEngine(driver=desktop, capture=desktop.diff_frame, motion="instant"))
+    threading.Timer(0.2, lambda: setattr(desktop, 'pointer', (0, desktop.height - 1))).start()
+    started = time.perf_counter()
+    result = loop.run("Send an email")
+    assert result.status == ABORTED
+    assert time.perf_counter() - started < 1.0  # Not after the 5 s model call
+    assert result.steps == []
+    assert desktop.log == []
+
+def test_aborted_while_settling():
+    desktop = SimulatedDesktop(BUTTONS)
+    # Clicks that never show up keep the engine polling for a change
+    engine = ActionEngine(driver=desktop, capture=desktop.diff_frame, motion="instant",
+                          no_change_timeout=5.0, settle_timeout=5.0)
+    desktop.click = lambda _pause=True: desktop.log.append(('click', desktop.pointer))
+    loop = AutonomousLoop(desktop.capture, StubModel(desktop), engine)
+    threading.Timer(0.3, lambda: setattr(desktop, 'pointer', (0, 0))).start()
+    started = time.perf_counter()
+    result = loop.run("Send an email")
+    assert result.status == ABORTED
+    assert time.perf_counter() - started < 1.5
+    assert len(result.steps) == 1
+    assert_clicked(desktop, 1)
+
+def test_stop():
+    desktop = SimulatedDesktop(BUTTONS)
+    loop = AutonomousLoop(desktop.capture, StubModel(desktop, latency=5.0),
+                          ActionEngine(driver=desktop, capture=desktop.diff_frame, motion="instant"))
+    threading.Timer(0.2, loop.stop).start()
+    assert loop.run("Send an email").status == STOPPED
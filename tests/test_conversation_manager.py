@@ -0,0 +1,39 @@
+import json
+
+from conversation_manager import ConversationManager
+
+def manager(monkeypatch, log_path=None):
+    monkeypatch.delenv("INTENT_CLASSIFIER_PATH", raising=False)
+    monkeypatch.delenv("KEYWORD_PACKS", raising=False)
+    if log_path:
+        monkeypatch.setenv("INTENT_LOG_PATH", str(log_path))
+    else:
+        monkeypatch.delenv("INTENT_LOG_PATH", raising=False)
+    return ConversationManager()
+
+def test_plural_element_keeps_what_is_visual(monkeypatch):
+    intent = manager(monkeypatch).detect_intent("what are the icons in this window")
+    assert intent["primary_intent"] == "what_is"
+    assert sorted(intent["mentioned_elements"]) == ["icon", "window"]
+    assert intent["needs_visual"] is True
+
+def test_inflected_intent_verbs(monkeypatch):
+    conversation = manager(monkeypatch)
+    assert conversation.detect_intent("where is it located")["primary_intent"] == "where_is"
+    assert conversation.detect_intent("I am finding it hard to see the dock")["primary_intent"] == "where_is"
+    assert conversation.detect_intent("explaining the menu bar please")["primary_intent"] == "what_is"
+
+def test_log_turn_keeps_predictions_apart_from_labels(monkeypatch, tmp_path):
+    log_path = tmp_path / "turns.jsonl"
+    conversation = manager(monkeypatch, log_path)
+    visual = conversation.detect_intent("where is the dock")
+    chat = conversation.detect_intent("hello")
+    conversation.log_turn("where is the dock", visual, "Here it is [900, 400, 960, 600].")
+    conversation.log_turn("hello", chat, "Hi! How can I help?")
+    conversation.log_turn("where is the dock", visual, "Click the dock.", had_box=True)
+    records = [json.loads(line) for line in log_path.read_text(encoding="utf-8").splitlines()]
+    assert [record["intent"] for record in records] == [None, None, None]
+    assert [record["predicted_intent"] for record in records] == ["where_is", "chat", "where_is"]
+    assert [record["predicted_needs_visual"] for record in records] == [True, False, True]
+    assert [record["had_box"] for record in records] == [True, False, True]
+    assert [record["needs_visual"] for record in records] == [True, None, True]
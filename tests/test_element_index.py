@@ -0,0 +1,113 @@
+import threading
+
+from element_index import ElementIndex, FakeElementProvider, ScreenElement, extract_target
+
+def element(name, x=0, y=0, width=10, height=10, role="push button", app="fake"):
+    return ScreenElement(name, role, x, y, width, height, app)
+
+class CountingProvider(FakeElementProvider):
+    """A fake provider that records which applications were walked"""
+    def __init__(self, elements=None):
+        super().__init__(elements)
+        self.walked = []
+
+    def list_elements(self, app_key, app):
+        self.walked.append(app_key)
+        return super().list_elements(app_key, app)
+
+def test_extract_target():
+    assert extract_target("Where is Safari?") == "Safari"
+    assert extract_target("where's the Mail app") == "Mail"
+    assert extract_target("Can you find my downloads folder") == "downloads folder"
+    assert extract_target("show me the settings icon!") == "settings"
+    assert extract_target("How do I send an email?") is None
+
+def test_find_prefers_exact_name_over_smaller_match():
+    index = ElementIndex(FakeElementProvider([
+        element("Safari", width=64, height=64, role="icon"),
+        element("Safari Help", width=20, height=10, role="menu item"),
+    ]))
+    index.refresh(force=True)
+    assert index.find("safari").name == "Safari"
+
+def test_find_picks_smallest_containing_element():
+    index = ElementIndex(FakeElementProvider([
+        element("Mail settings window", width=800, height=600),
+        element("Mail settings", width=30, height=30, role="toggle button"),
+        element("Open mail settings now", width=100, height=20),
+    ]))
+    index.refresh(force=True)
+    assert index.find("settings mail").name == "Mail settings"
+    assert index.find("mail settings window").name == "Mail settings window"
+    assert index.find("toggle button").name == "Mail settings"  # Roles are indexed too
+    assert index.find("calendar") is None
+    assert index.find("!?") is None
+
+def test_refresh_limits_and_orders_stale_apps():
+    provider = CountingProvider([element(f"Button {app}", app=app) for app in "abcde"])
+    index = ElementIndex(provider, refresh_interval=60, max_apps_per_refresh=2)
+    assert index.refresh() == 2
+    assert index.refresh() == 2
+    assert index.refresh() == 1
+    assert sorted(provider.walked) == list("abcde")
+    assert index.refresh() == 0  # Nothing is stale yet
+    assert len(index) == 5
+
+    # Once stale, the least recently walked apps go first
+    for app in "abcde":
+        index.app_walked_at[app] -= 120
+    index.app_walked_at["d"] -= 10
+    index.app_walked_at["b"] -= 5
+    provider.walked.clear()
+    assert index.refresh() == 2
+    assert provider.walked == ["d", "b"]
+
+def test_refresh_drops_closed_apps():
+    provider = FakeElementProvider([element("Safari", app="safari"), element("Mail", app="mail")])
+    index = ElementIndex(provider)
+    index.refresh(force=True)
+    assert index.find("mail").name == "Mail"
+    provider.elements = [element("Safari", app="safari")]
+    index.refresh()
+    assert index.find("mail") is None
+    assert index.find("safari").name == "Safari"
+    assert "mail" not in index.app_walked_at
+
+def test_unchanged_apps_are_not_reindexed():
+    provider = FakeElementProvider([element("Send", app="mail"), element("Reload", app="safari")])
+    index = ElementIndex(provider)
+    index.refresh(force=True)
+    mail_elements = index.app_elements["mail"]
+    provider.elements = [element("Send", app="mail"), element("Reload", x=50, app="safari")]
+    index.refresh(force=True)
+    assert index.app_elements["mail"] is mail_elements
+    assert index.find("reload").x == 50
+
+def test_changed_app_replaces_its_words():
+    provider = FakeElementProvider([element("Inbox", app="mail")])
+    index = ElementIndex(provider)
+    index.refresh(force=True)
+    provider.elements = [element("Outbox", app="mail")]
+    index.refresh(force=True)
+    assert index.find("inbox") is None
+    assert index.find("outbox").name == "Outbox"
+
+def test_concurrent_refresh_is_skipped():
+    started, release = threading.Event(), threading.Event()
+
+    class SlowProvider(CountingProvider):
+        def list_elements(self, app_key, app):
+            started.set()
+            release.wait(5)
+            return super().list_elements(app_key, app)
+
+    provider = SlowProvider([element("Safari")])
+    index = ElementIndex(provider)
+    warm_up = threading.Thread(target=index.refresh, kwargs={"force": True})
+    warm_up.start()
+    assert started.wait(5)
+    assert index.refresh() == 0  # Returns at once instead of walking the same apps
+    release.set()
+    warm_up.join(5)
+    assert provider.walked == ["fake"]
+    assert index.find("safari").name == "Safari"
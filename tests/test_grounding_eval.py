@@ -0,0 +1,59 @@
+import json
+
+from PIL import Image
+
+from grounding_eval import GroundingEvaluator, load_results
+
+class FlakyManager:
+    """Stands in for a ModelManager whose first call fails"""
+    def __init__(self):
+        self.calls = 0
+        self.last_call_stats = {}
+
+    def call_model(self, image_url, prompt, context=None, response_schema=None):
+        self.calls += 1
+        if self.calls == 1:
+            self.last_call_stats = {"model": "gemini", "error": "Model API Error: quota"}
+            return "Model API Error: quota"
+        self.last_call_stats = {"model": "gemini", "latency": 0.1, "input_tokens": 10, "output_tokens": 5, "error": None}
+        return "Click on the target [100, 100, 200, 200]."
+
+def make_corpus(tmp_path):
+    Image.new("RGB", (100, 100), "white").save(tmp_path / "screen.png")
+    return [{"id": "button", "image": "screen.png", "prompt": "Where is the button?", "target": [10, 10, 10, 10]}]
+
+class FakeManagerEvaluator(GroundingEvaluator):
+    """Sends every model call to the given manager instead of a real ModelManager"""
+    def __init__(self, corpus, manager):
+        super().__init__(str(corpus), str(corpus / "results.jsonl"), concurrency=1)
+        self.manager = manager
+
+    def _manager(self, model):
+        return self.manager
+
+def evaluator_with(tmp_path, manager):
+    return FakeManagerEvaluator(tmp_path, manager)
+
+def test_failed_call_is_stored_with_error(tmp_path):
+    samples = make_corpus(tmp_path)
+    evaluator = evaluator_with(tmp_path, FlakyManager())
+    evaluator._run_one("gemini", "full", samples[0])
+    result = load_results(str(tmp_path / "results.jsonl"))
+    assert [r["error"] for r in result.values()] == ["Model API Error: quota"]
+
+def test_resume_retries_failed_results(tmp_path):
+    samples = make_corpus(tmp_path)
+    manager = FlakyManager()
+    evaluator = evaluator_with(tmp_path, manager)
+    evaluator._run_one("gemini", "full", samples[0])
+
+    resumed = evaluator_with(tmp_path, manager)
+    assert resumed.run(samples, ["gemini"], ["full"]) == 1
+    assert manager.calls == 2
+    (result,) = load_results(str(tmp_path / "results.jsonl")).values()
+    assert result["error"] is None and result["input_tokens"] == 10
+
+    again = evaluator_with(tmp_path, manager)
+    assert again.run(samples, ["gemini"], ["full"]) == 0
+    with open(tmp_path / "results.jsonl", encoding="utf-8") as f:
+        assert len([json.loads(line) for line in f]) == 2
@@ -0,0 +1,63 @@
+import pytest
+
+from intent_classifier import IntentClassifier, evaluate, load_jsonl
+
+EXAMPLES = [
+    {"text": "How do I open my email?", "intent": "how_to", "needs_visual": True},
+    {"text": "How can I change the wallpaper?", "intent": "how_to", "needs_visual": True},
+    {"text": "How to take a screenshot", "intent": "how_to", "needs_visual": True},
+    {"text": "Where is the trash?", "intent": "where_is", "needs_visual": True},
+    {"text": "Where is the settings app?", "intent": "where_is", "needs_visual": True},
+    {"text": "Find the downloads folder", "intent": "where_is", "needs_visual": True},
+    {"text": "Hello there", "intent": "chat", "needs_visual": False},
+    {"text": "Thanks a lot", "intent": "chat", "needs_visual": False},
+    {"text": "Good morning!", "intent": "chat", "needs_visual": False},
+]
+
+def trained():
+    return IntentClassifier().train(EXAMPLES, epochs=40)
+
+def test_predicts_training_intents():
+    classifier = trained()
+    for example in EXAMPLES:
+        prediction = classifier.predict(example["text"])
+        assert prediction["primary_intent"] == example["intent"]
+        assert (prediction["needs_visual_probability"] >= 0.5) == example["needs_visual"]
+        assert 0.0 <= prediction["intent_confidence"] <= 1.0
+
+def test_generalizes_to_similar_queries():
+    classifier = trained()
+    assert classifier.predict("Where is the printer?")["primary_intent"] == "where_is"
+    assert classifier.predict("hello")["needs_visual_probability"] < 0.5
+
+def test_save_load_round_trip(tmp_path):
+    classifier = trained()
+    path = tmp_path / "intent_model.json"
+    classifier.save(str(path))
+    loaded = IntentClassifier.load(str(path))
+    assert loaded.intents == classifier.intents
+    for example in EXAMPLES:
+        assert loaded.predict(example["text"]) == classifier.predict(example["text"])
+
+def test_training_is_reproducible():
+    assert trained().predict("How do I print?") == trained().predict("How do I print?")
+
+def test_unlabeled_intents_only_train_visual_head():
+    examples = EXAMPLES + [{"text": "Show me the dock", "intent": None, "needs_visual": True}]
+    classifier = IntentClassifier().train(examples, epochs=40)
+    assert classifier.intents == ["chat", "how_to", "where_is"]
+    report = evaluate(lambda text: dict(classifier.predict(text), needs_visual=True), examples)
+    assert report["count"] == len(examples)
+    assert report["intent_accuracy"] == 1.0  # Scored on the labeled turns only
+
+def test_needs_an_intent_label():
+    with pytest.raises(ValueError):
+        IntentClassifier().train([{"text": "Where is it?", "intent": None, "needs_visual": True}])
+
+def test_load_jsonl_keeps_partly_labeled_turns(tmp_path):
+    path = tmp_path / "turns.jsonl"
+    path.write_text('{"text": "Where is it?", "intent": null, "needs_visual": true}\n'
+                    '{"text": "hi", "intent": null, "needs_visual": null}\n'
+                    'not json\n'
+                    '{"text": "Thanks", "intent": "chat"}\n', encoding="utf-8")
+    assert [example["text"] for example in load_jsonl(str(path))] == ["Where is it?", "Thanks"]
@@ -0,0 +1,57 @@
+from keyword_matcher import KeywordMatcher
+
+UI_ELEMENTS = ["dock", "menu bar", "folder", "window", "button", "icon"]
+
+def element_matcher():
+    matcher = KeywordMatcher()
+    for priority, element in enumerate(UI_ELEMENTS):
+        matcher.add(element, "element", element, priority, plural=True)
+    return matcher
+
+def test_plural_elements_match():
+    matches = element_matcher().match("what are the icons in this window")
+    assert sorted(matches["element"]) == ["icon", "window"]
+
+def test_plural_only_query_finds_element():
+    for query, element in [("show me the buttons", "button"), ("where are my folders", "folder"),
+                           ("close all windows", "window"), ("what are these menu bars", "menu bar")]:
+        assert element_matcher().match(query).get("element") == [element]
+
+def test_es_plural_matches():
+    matcher = KeywordMatcher()
+    matcher.add("box", "element", plural=True)
+    assert matcher.match("tick the boxes")["element"] == ["box"]
+
+def test_plural_match_spans_suffix():
+    assert element_matcher().find_all("icons") == [(0, 5, "element", "icon", 5)]
+
+def test_whole_word_still_rejects_other_suffixes():
+    assert element_matcher().match("windowsill dockyard iconic") == {}
+
+def test_plural_off_by_default():
+    matcher = KeywordMatcher()
+    matcher.add("icon", "element")
+    assert matcher.match("icons") == {}
+    assert matcher.match("an icon")["element"] == ["icon"]
+
+def intent_matcher():
+    matcher = KeywordMatcher()
+    matcher.add("where is", "intent", "where_is", 0, inflect=True)
+    matcher.add("find", "intent", "where_is", 0, inflect=True)
+    matcher.add("locate", "intent", "where_is", 0, inflect=True)
+    matcher.add("explain", "intent", "what_is", 1, inflect=True)
+    matcher.add("hi", "intent", "chat", 2)
+    return matcher
+
+def test_inflected_intent_verbs_match():
+    for query, intent in [("I am finding it hard", "where_is"), ("where is it located", "where_is"),
+                          ("it finds nothing", "where_is"), ("can you locate the printer", "where_is"),
+                          ("I'm locating my files", "where_is"), ("explaining the dock", "what_is"),
+                          ("he explained it", "what_is"), ("explains", "what_is")]:
+        assert intent_matcher().match(query).get("intent") == [intent], query
+
+def test_inflected_match_keeps_base_value():
+    assert intent_matcher().find_all("located") == [(0, 7, "intent", "where_is", 0)]
+
+def test_inflection_is_not_substring_matching():
+    assert intent_matcher().match("his finder unexplainable relocate") == {}
@@ -0,0 +1,64 @@
+import speech_backends
+import speech_output
+from speech_backends import SpeechBackendSelector, TextToSpeechBackend, EspeakTTS, TTS_SPEED
+from speech_output import TTSPipeline
+
+class FakeTTS(TextToSpeechBackend):
+    def __init__(self, name, is_local, quality, latency_overhead, fail=False):
+        super().__init__()
+        self.name = name
+        self.is_local = is_local
+        self.quality = quality
+        self.latency_overhead = latency_overhead
+        self.latency_per_unit = 0.002
+        self.fail = fail
+        self.sentences = []
+
+    def synthesize(self, text, voice):
+        if self.fail:
+            raise RuntimeError("synthesis failed")
+        self.sentences.append(text)
+        return b"\0\0" * 10
+
+class SilentPlayback:
+    active = True
+
+    def enqueue(self, pcm_bytes):
+        pass
+
+def speak(monkeypatch, backends, text):
+    selector = SpeechBackendSelector(stt_backends=[], tts_backends=backends)
+    selector.online, selector.online_checked_at = True, float("inf")
+    monkeypatch.setattr(speech_output, "get_speech_backends", lambda: selector)
+    pipeline = TTSPipeline(playback=SilentPlayback(), use_cache=False)
+    pipeline.speak(text)
+    pipeline.wait(5)
+    return pipeline
+
+LONG_ANSWER = ("Open the Mail app first. " + "Then look for the long list of folders on the left side " * 8 +
+               "and pick one. Finally click Send.")
+
+def test_backend_is_pinned_for_the_whole_response(monkeypatch):
+    hosted, local = FakeTTS("hosted", False, 3, 0.5), FakeTTS("local", True, 1, 0.1)
+    pipeline = speak(monkeypatch, [hosted, local], LONG_ANSWER)
+    assert pipeline.backend is hosted
+    assert len(hosted.sentences) == 3  # Even the sentence over the latency budget
+    assert local.sentences == []
+
+def test_falls_back_only_when_synthesis_fails(monkeypatch):
+    hosted, local = FakeTTS("hosted", False, 3, 0.5, fail=True), FakeTTS("local", True, 1, 0.1)
+    speak(monkeypatch, [hosted, local], LONG_ANSWER)
+    assert len(local.sentences) == 3
+
+def test_espeak_applies_speed_and_ends_options(monkeypatch):
+    calls = []
+
+    class Result:
+        stdout = b""
+
+    monkeypatch.setattr(speech_backends.subprocess, "run", lambda command, **kwargs: calls.append(command) or Result())
+    monkeypatch.setattr(speech_backends, "audio_to_pcm", lambda audio_bytes: b"")
+    backend = EspeakTTS()
+    backend.command = "espeak-ng"
+    backend.synthesize("-5 degrees outside", "alloy")
+    assert calls == [["espeak-ng", "--stdout", "-s", str(int(175 * TTS_SPEED)), "--", "-5 degrees outside"]]
@@ -1,20 +1,35 @@
 import tkinter as tk
 from PIL import Image, ImageDraw, ImageFont
 import io
+import os
 import uuid
 import time
-from threading import Thread
+import threading
 import platform
 import pyautogui
 import mss
 import mss.tools
+import numpy as np
+
+from element_index import ElementIndex, create_element_provider
+from spatial_index import SpatialIndex
+from coordinates import CoordinateTransform
+from action_engine import Action, perform_action, CLICK, DOUBLE_CLICK, RIGHT_CLICK
 
 # Constants for visual feedback
 GRID_COLOR = "#FF0000"  # Red
 HIGHLIGHT_COLOR = "#FF3366"  # Pink-red
 HIGHLIGHT_THICKNESS = 3
 FLASH_ITERATIONS = 5
-FLASH_DELAY = 0.1
+FLASH_DELAY = 100  # ms between flash toggles
+HIGHLIGHT_DURATION = 2500  # ms a highlight stays up by default
+ANIMATION_INTERVAL = 33  # ms per animation tick, the same frame budget as the Qt overlay
+
+# Multi-monitor capture: "active" (the monitor under the pointer), "primary" or "all"
+CAPTURE_MONITOR = os.getenv("CAPTURE_MONITOR", "active").lower()
+VIRTUAL_DESKTOP_MAX_SIDE = 2560  # A stitched desktop is downscaled to this longest side before upload
+# Upload HiDPI captures at their logical size (e.g. 1440x900 for a 2880x1800 Retina frame), or "physical"
+CAPTURE_SCALE = os.getenv("CAPTURE_SCALE", "logical").lower()
 
 class VisualManager:
     def __init__(self, root=None):
@@ -24,7 +39,14 @@ class VisualManager:
         self.grid_rows = 10  # Default grid size
         self.grid_cols = 10
         self.highlight_canvas = None
-        self.current_highlights = []  # List to track active highlights
+        self.canvas_origin = (0, 0)  # Screen coordinates of the highlight canvas's top-left
+        self.last_frame = None  # Pixels of the last capture (H x W x 4 BGRA array)
+        self.last_transform = None  # Where the last capture sits on the desktop (CoordinateTransform)
+        self.capture_mode = CAPTURE_MONITOR
+        self.current_highlights = {}  # Highlight tag -> animation state
+        self.highlight_index = SpatialIndex()  # Highlight tag -> box, for hit-testing
+        self.highlight_sequence = 0  # Creation order of highlights, newest on top
+        self.animation_job = None  # Pending root.after id of the shared animation tick
         
         # Platform-specific adjustments
         self.is_mac = platform.system() == "Darwin"
@@ -34,23 +56,95 @@ class VisualManager:
         # MSS screen capture instance
         self.sct = mss.mss()
         
+        # Accessibility index of on-screen elements (None when no provider is available)
+        provider = create_element_provider()
+        self.element_index = ElementIndex(provider) if provider else None
+        if self.element_index:
+            threading.Thread(target=self.element_index.refresh, kwargs={'force': True}, daemon=True).start()
+        
+    def locate_element(self, name):
+        """
+        Find a named element (e.g. "Safari", "menu bar") in the accessibility index
+        Returns its ScreenElement in screen coordinates, or None
+        """
+        if not self.element_index:
+            return None
+        try:
+            self.element_index.refresh()
+            return self.element_index.find(name)
+        except Exception as e:
+            print(f"Error querying element index: {e}")
+            return None
+    
     def toggle_grid_mode(self):
         """Toggle between grid mode and direct mode"""
         self.grid_mode = not self.grid_mode
         return self.grid_mode
     
+    def select_monitor(self):
+        """
+        mss index of the monitor to capture: 0 is the stitched virtual desktop,
+        1 the primary monitor. With one monitor it is always the primary.
+        """
+        monitors = self.sct.monitors
+        if len(monitors) <= 2 or self.capture_mode == "primary":
+            return 1
+        if self.capture_mode == "all":
+            return 0
+        try:
+            x, y = pyautogui.position()
+        except Exception:
+            return 1
+        for index, monitor in enumerate(monitors[1:], 1):
+            if (monitor['left'] <= x < monitor['left'] + monitor['width'] and
+                    monitor['top'] <= y < monitor['top'] + monitor['height']):
+                return index
+        return 1
+    
+    def capture_area(self):
+        """(left, top, width, height) of the last capture in screen coordinates (the primary screen before one)"""
+        if self.last_transform is None:
+            width, height = pyautogui.size()
+            return 0, 0, width, height
+        transform = self.last_transform
+        return transform.left, transform.top, transform.width, transform.height
+    
     def capture_screen(self, draw_grid=True):
         """Capture screen and optionally overlay grid"""
-        # Get primary monitor
-        monitor = self.sct.monitors[1]  # Primary monitor in MSS
+        # Only the monitor the user is working on, unless configured otherwise
+        index = self.select_monitor()
+        monitor = self.sct.monitors[index]
         
         # Capture screenshot
         sct_img = self.sct.grab(monitor)
-        img_bytes = mss.tools.to_png(sct_img.rgb, sct_img.size)
         
-        # Get actual dimensions
-        actual_width = sct_img.width
-        actual_height = sct_img.height
+        # Keep the raw pixels (BGRA, no copy) for local box refinement
+        self.last_frame = np.frombuffer(sct_img.bgra, dtype=np.uint8).reshape(sct_img.height, sct_img.width, 4)
+        self.last_transform = CoordinateTransform.for_frame(monitor, sct_img.width, sct_img.height, index)
+        
+        # Physical pixels of a HiDPI monitor add upload time but no detail the model needs;
+        # clicks are unaffected since boxes are mapped back through the transform
+        upload_width, upload_height = sct_img.size
+        if CAPTURE_SCALE == "logical":
+            upload_width, upload_height = min(upload_width, monitor['width']), min(upload_height, monitor['height'])
+        if index == 0 and max(upload_width, upload_height) > VIRTUAL_DESKTOP_MAX_SIDE:
+            # Every monitor at full resolution would be a large, slow upload
+            factor = VIRTUAL_DESKTOP_MAX_SIDE / max(upload_width, upload_height)
+            upload_width, upload_height = int(upload_width * factor), int(upload_height * factor)
+        if (upload_width, upload_height) != sct_img.size:
+            image = Image.frombytes("RGB", sct_img.size, sct_img.rgb)
+            factor = sct_img.width // upload_width
+            if factor > 1 and sct_img.width == upload_width * factor and sct_img.height == upload_height * factor:
+                image = image.reduce(factor)  # Whole factors (Retina) are a fast box filter
+            else:
+                image = image.resize((upload_width, upload_height), Image.BILINEAR, reducing_gap=2.0)
+            output = io.BytesIO()
+            image.save(output, format='PNG')
+            img_bytes = output.getvalue()
+        else:
+            img_bytes = mss.tools.to_png(sct_img.rgb, sct_img.size)
+        actual_width, actual_height = upload_width, upload_height
+        self.last_transform.upload_width, self.last_transform.upload_height = upload_width, upload_height
         
         # Calculate grid dimensions based on screen size
         # Aim for reasonable cell size (e.g. ~80px)
@@ -113,7 +207,51 @@ class VisualManager:
             print(f"Error adding grid to image: {e}")
             return image_bytes  # Return original if error
     
-    def highlight_area(self, x, y, width, height, message=None, flash=True):
+    def _ensure_highlight_canvas(self):
+        """
+        Create the highlight window and canvas on first use. The window covers the whole
+        virtual desktop (every monitor), so highlights in global screen coordinates are
+        drawn at their offset from the desktop's top-left (which can be negative).
+        """
+        if self.highlight_canvas is not None:
+            return
+        highlight_window = tk.Toplevel(self.root)
+        highlight_window.attributes("-topmost", True)
+        highlight_window.attributes("-alpha", 0.7)
+        highlight_window.overrideredirect(True)  # No window decorations
+        
+        # Make window as large as the virtual desktop
+        desktop = self.sct.monitors[0]
+        screen_width, screen_height = desktop['width'], desktop['height']
+        self.canvas_origin = (desktop['left'], desktop['top'])
+        highlight_window.geometry(f"{screen_width}x{screen_height}+{desktop['left']}+{desktop['top']}")
+        
+        # On macOS, set window to allow clicks to pass through
+        if self.is_mac:
+            try:
+                highlight_window.attributes("-transparent", True)
+            except:
+                pass
+        
+        # Create canvas for drawing
+        self.highlight_canvas = tk.Canvas(
+            highlight_window, 
+            width=screen_width, 
+            height=screen_height,
+            highlightthickness=0,
+            bg=""  # Transparent background
+        )
+        self.highlight_canvas.pack(fill=tk.BOTH, expand=True)
+    
+    def _run_on_ui(self, callback, *args):
+        """Run a callback on the Tk thread (Tk must not be touched from other threads)"""
+        if threading.current_thread() is threading.main_thread():
+            callback(*args)
+        else:
+            self.root.after(0, callback, *args)
+    
+    def highlight_area(self, x, y, width, height, message=None, flash=True,
+                       show_click=False, duration=HIGHLIGHT_DURATION, group=None):
         """
         Create a visual highlight on the screen at specified coordinates
         
@@ -122,104 +260,146 @@ class VisualManager:
             width, height: Size of highlight
             message: Optional message to display
             flash: Whether to flash the highlight
+            show_click: Whether to show "CLICK HERE" text
+            duration: Milliseconds until the highlight is removed (None keeps it)
+            group: Optional group name, for removing related highlights together
         """
         if self.root is None:
             print("Cannot highlight without Tkinter root")
             return
             
-        # Create a new toplevel window if needed
-        if self.highlight_canvas is None:
-            highlight_window = tk.Toplevel(self.root)
-            highlight_window.attributes("-topmost", True)
-            highlight_window.attributes("-alpha", 0.7)
-            highlight_window.overrideredirect(True)  # No window decorations
-            
-            # Make window as large as screen
-            screen_width = self.root.winfo_screenwidth()
-            screen_height = self.root.winfo_screenheight()
-            highlight_window.geometry(f"{screen_width}x{screen_height}+0+0")
-            
-            # On macOS, set window to allow clicks to pass through
-            if self.is_mac:
-                try:
-                    highlight_window.attributes("-transparent", True)
-                except:
-                    pass
-            
-            # Create canvas for drawing
-            self.highlight_canvas = tk.Canvas(
-                highlight_window, 
-                width=screen_width, 
-                height=screen_height,
-                highlightthickness=0,
-                bg=""  # Transparent background
-            )
-            self.highlight_canvas.pack(fill=tk.BOTH, expand=True)
-            
         # Generate a unique tag for this highlight
         highlight_id = f"highlight_{uuid.uuid4().hex}"
+        spec = dict(x=x, y=y, width=width, height=height, message=message, flash=flash,
+                    show_click=show_click, duration=duration, group=group)
+        self._run_on_ui(self._add_highlights, [(highlight_id, spec)])
+        return highlight_id
+    
+    def highlight_areas(self, highlights, group=None):
+        """
+        Create several highlights in one canvas update
         
-        # Draw rectangle
-        rect_id = self.highlight_canvas.create_rectangle(
-            x, y, x + width, y + height,
-            outline=HIGHLIGHT_COLOR,
-            width=HIGHLIGHT_THICKNESS,
-            tags=(highlight_id,)
-        )
-        
-        # Add optional message
-        text_id = None
-        if message:
-            text_id = self.highlight_canvas.create_text(
-                x + width//2, y - 10,
-                text=message,
-                fill=HIGHLIGHT_COLOR,
-                font=("Arial", 12, "bold"),
+        Args:
+            highlights: Iterable of dicts with highlight_area keyword arguments
+            group: Group applied to highlights that don't name one
+            
+        Returns:
+            list: Tags of the new highlights
+        """
+        if self.root is None:
+            print("Cannot highlight without Tkinter root")
+            return []
+        batch = [(f"highlight_{uuid.uuid4().hex}", dict({'group': group}, **spec)) for spec in highlights]
+        self._run_on_ui(self._add_highlights, batch)
+        return [highlight_id for highlight_id, _ in batch]
+    
+    def _add_highlights(self, batch):
+        """Draw a batch of highlights and hand their animation to the shared scheduler"""
+        self._ensure_highlight_canvas()
+        now = time.monotonic() * 1000
+        origin_x, origin_y = self.canvas_origin
+        for highlight_id, spec in batch:
+            width, height = spec['width'], spec['height']
+            x, y = spec['x'] - origin_x, spec['y'] - origin_y  # Screen -> canvas coordinates
+            
+            # Draw rectangle
+            self.highlight_canvas.create_rectangle(
+                x, y, x + width, y + height,
+                outline=HIGHLIGHT_COLOR,
+                width=HIGHLIGHT_THICKNESS,
                 tags=(highlight_id,)
             )
-        
-        # Start flashing in a separate thread if requested
-        if flash:
-            self.current_highlights.append(highlight_id)
-            Thread(target=self._flash_highlight, args=(highlight_id, rect_id, text_id)).start()
-        
-        return highlight_id
-        
-    def _flash_highlight(self, highlight_id, rect_id, text_id=None):
-        """Flash a highlight by toggling visibility"""
-        try:
-            for _ in range(FLASH_ITERATIONS):
-                # Toggle visibility
-                self.highlight_canvas.itemconfig(rect_id, state=tk.HIDDEN)
-                if text_id:
-                    self.highlight_canvas.itemconfig(text_id, state=tk.HIDDEN)
-                time.sleep(FLASH_DELAY)
-                
-                self.highlight_canvas.itemconfig(rect_id, state=tk.NORMAL)
-                if text_id:
-                    self.highlight_canvas.itemconfig(text_id, state=tk.NORMAL)
-                time.sleep(FLASH_DELAY)
-                
-            # Remove from tracking after done flashing
-            if highlight_id in self.current_highlights:
-                self.current_highlights.remove(highlight_id)
-                
-            # If no more highlights, hide canvas after a delay
-            if not self.current_highlights:
-                self.root.after(500, self._hide_highlight_canvas)
-        except Exception as e:
-            print(f"Error during highlight flashing: {e}")
+            
+            # Add optional message
+            if spec.get('message'):
+                self.highlight_canvas.create_text(
+                    x + width//2, y - 10,
+                    text=spec['message'],
+                    fill=HIGHLIGHT_COLOR,
+                    font=("Arial", 12, "bold"),
+                    tags=(highlight_id,)
+                )
+            
+            # Add optional "CLICK HERE" indicator
+            if spec.get('show_click'):
+                self.highlight_canvas.create_text(
+                    x + width//2, y + height//2,
+                    text="CLICK HERE",
+                    fill=HIGHLIGHT_COLOR,
+                    font=("Arial", 14, "bold"),
+                    tags=(highlight_id,)
+                )
+            
+            duration = spec.get('duration')
+            self.current_highlights[highlight_id] = {
+                'group': spec.get('group'),
+                'sequence': self.highlight_sequence,
+                'visible': True,
+                'flash_toggles': FLASH_ITERATIONS * 2 if spec.get('flash', True) else 0,
+                'next_toggle': now + FLASH_DELAY,
+                'expires_at': now + duration if duration is not None else None,
+            }
+            self.highlight_sequence += 1
+            self.highlight_index.insert(highlight_id, spec['x'], spec['y'], width, height)
+        self._schedule_animation()
     
-    def _hide_highlight_canvas(self):
-        """Hide the highlight canvas if no active highlights"""
-        if self.highlight_canvas and not self.current_highlights:
-            self.highlight_canvas.delete("all")
+    def _schedule_animation(self):
+        """Start the shared animation tick if it isn't running"""
+        if self.animation_job is None:
+            self.animation_job = self.root.after(ANIMATION_INTERVAL, self._animate)
+    
+    def _animate(self):
+        """
+        Shared animation tick on the Tk event loop
+        Every flash toggle and expiry due in this frame is applied before Tk redraws once at idle
+        """
+        self.animation_job = None
+        if self.highlight_canvas is None:
+            return
+        now = time.monotonic() * 1000
+        animating = False
+        for highlight_id, state in list(self.current_highlights.items()):
+            if state['expires_at'] is not None and now >= state['expires_at']:
+                self.highlight_canvas.delete(highlight_id)
+                del self.current_highlights[highlight_id]
+                self.highlight_index.remove(highlight_id)
+                continue
+            if state['flash_toggles'] and now >= state['next_toggle']:
+                state['visible'] = not state['visible']
+                state['flash_toggles'] -= 1
+                state['next_toggle'] = now + FLASH_DELAY
+                self.highlight_canvas.itemconfig(highlight_id, state=tk.NORMAL if state['visible'] else tk.HIDDEN)
+            if state['flash_toggles'] or state['expires_at'] is not None:
+                animating = True
+        if animating:
+            self._schedule_animation()
+    
+    def remove_highlight(self, highlight_id):
+        """Remove a specific highlight"""
+        self._run_on_ui(self._remove_highlights, [highlight_id])
+    
+    def remove_group(self, group):
+        """Remove every highlight in a group"""
+        self._run_on_ui(lambda: self._remove_highlights(
+            [tag for tag, state in self.current_highlights.items() if state['group'] == group]))
+    
+    def _remove_highlights(self, highlight_ids):
+        for highlight_id in highlight_ids:
+            self.highlight_index.remove(highlight_id)
+            if self.current_highlights.pop(highlight_id, None) is not None and self.highlight_canvas:
+                self.highlight_canvas.delete(highlight_id)
     
     def clear_highlights(self):
         """Clear all highlights"""
         if self.highlight_canvas:
             self.highlight_canvas.delete("all")
-            self.current_highlights = []
+        self.current_highlights.clear()
+        self.highlight_index.clear()
+    
+    def highlight_at(self, x, y):
+        """Tag of the most recent highlight containing a point, or None"""
+        hits = [tag for tag in self.highlight_index.query_point(x, y) if tag in self.current_highlights]
+        return max(hits, key=lambda tag: self.current_highlights[tag]['sequence'], default=None)
     
     def highlight_grid_cell(self, row, col, message=None):
         """Highlight a specific grid cell"""
@@ -227,17 +407,16 @@ class VisualManager:
             print("Cannot highlight grid cell when not in grid mode")
             return
             
-        # Calculate screen dimensions
-        screen_width = self.root.winfo_screenwidth()
-        screen_height = self.root.winfo_screenheight()
+        # The grid was drawn over the captured area
+        left, top, width, height = self.capture_area()
         
         # Calculate cell dimensions
-        cell_width = screen_width / self.grid_cols
-        cell_height = screen_height / self.grid_rows
+        cell_width = width / self.grid_cols
+        cell_height = height / self.grid_rows
         
         # Calculate cell position
-        x = col * cell_width
-        y = row * cell_height
+        x = left + col * cell_width
+        y = top + row * cell_height
         
         # Highlight the cell
         return self.highlight_area(x, y, cell_width, cell_height, message, flash=True)
@@ -276,17 +455,16 @@ class VisualManager:
                 
                 row = int(row_part) - 1  # Convert to 0-based
             
-            # Calculate screen dimensions
-            screen_width = self.root.winfo_screenwidth()
-            screen_height = self.root.winfo_screenheight()
+            # The grid was drawn over the captured area
+            left, top, width, height = self.capture_area()
             
             # Calculate cell dimensions
-            cell_width = screen_width / self.grid_cols
-            cell_height = screen_height / self.grid_rows
+            cell_width = width / self.grid_cols
+            cell_height = height / self.grid_rows
             
             # Calculate cell position
-            x = col * cell_width
-            y = row * cell_height
+            x = left + col * cell_width
+            y = top + row * cell_height
             
             return (x, y, cell_width, cell_height)
         except Exception as e:
@@ -296,17 +474,14 @@ class VisualManager:
     def click_at_position(self, x, y, right_click=False, double_click=False):
         """Perform a click at specified coordinates"""
         try:
-            # Move mouse to position
-            pyautogui.moveTo(x, y, duration=0.5)
-            
-            # Perform click action
-            if right_click:
-                pyautogui.rightClick()
-            elif double_click:
-                pyautogui.doubleClick()
-            else:
-                pyautogui.click()
+            # Move and click with the configured motion profile
+            kind = RIGHT_CLICK if right_click else DOUBLE_CLICK if double_click else CLICK
+            perform_action(Action(kind, x=x, y=y))
             
+            # The highlight that pointed here has done its job
+            clicked = self.highlight_at(x, y)
+            if clicked:
+                self._run_on_ui(self._remove_highlights, [clicked])
             return True
         except Exception as e:
             print(f"Error performing click: {e}")